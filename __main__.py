@@ -1,5 +1,6 @@
 import asyncio
 from fuseMod_py.FuseModManager import FuseModManager
+from fuseMod_py.FuseModCluster import FuseModCluster
 from fuseMod_py.VF_Tui import Panel
 from fuseMod_py.tui_menu import register_menu
 import fuseMod_py.register_module as register_module
@@ -37,7 +38,8 @@ async def main() -> None:
 
 
 
-    Manager = FuseModManager(config_dir, data_dir, debug)
+    # 配置了 shards.json 时按模块分片到多个 FUSE 模块进程
+    Manager = FuseModCluster.from_config(config_dir, data_dir, debug) or FuseModManager(config_dir, data_dir, debug)
 
     await Manager.init(sys.argv[1])
     register_module.register_modules(Manager, Manager.get_global_table())
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import signal
+import zlib
+from typing import Any, Dict, List, Optional
+from .FuseModManager import FuseModManager
+from .VF_Module import VF_Module
+from .VF_Snapshot import SnapshotStore
+from .VF_Defined import SHARD_CONFIG_NAME, SHARD_DIR_SUFFIX, SNAPSHOT_DIR
+
+
+class FuseModCluster():
+    """分片管理器
+
+    每个分片是一个 FuseModManager，有自己的 helper 进程、管道和挂载点，所有分片在同一个事件循环中运行。
+    分片 0 使用指定的目录（与单个管理器相同的布局），分片 k 使用同级的 <目录>.shards/k。
+    顶层模块按 assignment 指定的分片分配，未指定的按模块名的 CRC32 分配。"""
+
+    def __init__(self, config_dir, data_dir, enableDebug, shards: int,
+                 assignment: Optional[Dict[str, int]] = None, **kwargs) -> None:
+        self.debug_mode = enableDebug
+        self.assignment = assignment or {}
+        self.shards: List[FuseModManager] = []
+        for index in range(max(1, shards)):
+            shard = FuseModManager(config_dir, data_dir, enableDebug, **kwargs)
+            shard.cluster = self
+            # 各分片的快照分开保存，与挂载目录的布局相同
+            if index > 0 and shard.snapshot is not None:
+                shard.snapshot = SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR + SHARD_DIR_SUFFIX, str(index)))
+            self.shards.append(shard)
+
+    @classmethod
+    def from_config(cls, config_dir, data_dir, enableDebug, **kwargs) -> "Optional[FuseModCluster]":
+        """按 config_dir/shards.json 创建，文件不存在或分片数小于 2 时返回 None"""
+        try:
+            with open(os.path.join(config_dir, f"{SHARD_CONFIG_NAME}.json"), "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        shards = int(config.get("shards", 1))
+        if shards < 2:
+            return None
+        return cls(config_dir, data_dir, enableDebug, shards, config.get("assignment"), **kwargs)
+
+    def get_global_table(self) -> Dict[str, Any]:
+        return self.shards[0].get_global_table()
+
+    def shard_of(self, name: str) -> int:
+        """顶层模块所在的分片"""
+        shard = self.assignment.get(name)
+        if shard is not None and 0 <= shard < len(self.shards):
+            return shard
+        return zlib.crc32(name.encode()) % len(self.shards)
+
+    def register_module(self, name: str, module: VF_Module) -> None:
+        """注册顶层模块到其所在的分片"""
+        self.shards[self.shard_of(name)].register_module(name, module)
+
+    @staticmethod
+    def shard_mount_point(mount_point: str, index: int) -> str:
+        if index == 0:
+            return mount_point
+        return os.path.join(os.path.normpath(mount_point) + SHARD_DIR_SUFFIX, str(index))
+
+    async def init(self, mount_point) -> "Optional[FuseModCluster]":
+        """并发启动所有分片，任一分片启动失败时返回 None"""
+        mount_points = [self.shard_mount_point(mount_point, index) for index in range(len(self.shards))]
+        for path in mount_points:
+            os.makedirs(path, exist_ok=True)
+
+        results = await asyncio.gather(*(shard.init(path) for shard, path in zip(self.shards, mount_points)))
+        if any(result is None for result in results):
+            return None
+        return self
+
+    async def run(self) -> None:
+        """运行所有分片，SIGHUP 时重新加载所有分片的模块配置"""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.reload_modules()))
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        await asyncio.gather(*(shard.run() for shard in self.shards))
+
+    async def reload_modules(self) -> None:
+        await asyncio.gather(*(shard.reload_modules() for shard in self.shards))
+
+    def status(self) -> Dict[str, Any]:
+        """各分片的运行状态，以及文件数、任务、推送和写入统计的合计"""
+        shards = [shard.status() for shard in self.shards]
+        total: Dict[str, Any] = {
+            "live_files": sum(status["live_files"] for status in shards),
+            "send_queue": sum(status["send_queue"] for status in shards),
+            "pending_requests": sum(status["pending_requests"] for status in shards),
+        }
+        for group in ("tasks", "push", "writes"):
+            total[group] = {key: sum(status[group][key] for status in shards) for key in shards[0][group]}
+        return {"shards": shards, "total": total}
+
+    async def cleanup(self) -> None:
+        """清理所有分片并退出进程"""
+        for shard in self.shards:
+            await shard.cleanup(exit_process=False)
+
+        os._exit(1)
+
+    def set_debug_mode(self, enabled: bool) -> None:
+        self.debug_mode = enabled
+        for shard in self.shards:
+            shard.set_debug_mode(enabled)
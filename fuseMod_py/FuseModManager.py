@@ -1,40 +1,167 @@
 import asyncio
+import hashlib
+import mmap
 from logging import config
-import aiofiles
 import struct
 import os
-from typing import Optional, Dict, Any
+import signal
+import time
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Iterable, Set, Tuple
 from .VF_Module import VF_Module
 from .VF_File import VF_File
-from .VF_Tools import crc16_ccitt
-from .VF_Defined import ERR_ALREADY_EXISTS, ERR_NOT_FOUND, ERR_INVALID_OPERATION, PACKET_HEADER, PACKET_TAIL, PACKET_MAX_SIZE, PACKET_MIN_SIZE
+from .VF_Tools import CRC16_IMPL
+from .VF_Pipe import open_pipes, ensure_fifo, release_pipe_opens
+from .VF_Codec import FrameDecoder, FrameEncoder, content_parts, patch_parts, truncate_payload, create_payload, shm_content_payload, decode_write, decode_shm_write
+from .VF_Shm import ShmRing
+from .VF_Supervisor import TaskSupervisor, WriteQueue
+from .VF_Diff import diff_ranges
+from .VF_Policy import LatestValue
+from .VF_Index import PathIndex
+from .VF_Snapshot import SnapshotStore
+from .VF_Metrics import MetricsRegistry, StatsModule
+
+if TYPE_CHECKING:
+    from .FuseModCluster import FuseModCluster
+from .VF_Defined import ERR_ALREADY_EXISTS, ERR_NOT_FOUND, ERR_INVALID_OPERATION, PACKET_HEADER, PACKET_HEADER_V2, PACKET_TAIL, PACKET_MAX_SIZE, PACKET_MIN_SIZE, PACKET_MIN_SIZE_V2, PACKET_MAX_FRAME_LIMIT, PROTOCOL_VERSION, NEGOTIATE_FLAG_TRUSTED, BATCH_MAX_OPS, WRITE_FLAG_FIRST, WRITE_FLAG_LAST, PENDING_WRITE_TIMEOUT, PENDING_WRITE_MAX, PACKET_TYPE_SHM, DEFAULT_SHM_SIZE, PIPE_READ_SIZE, REQUEST_ID_MAX, DEFAULT_MAX_INFLIGHT, DEFAULT_SEND_QUEUE_SIZE, SEND_BATCH_MAX, REQUEST_TIMEOUT, HELLO_TIMEOUT, HELLO_CAP_SHM, HELLO_CAP_PATCH, PATCH_MIN_SIZE, PATCH_MAX_RATIO, PUSH_DIGEST_SIZE, HELLO_CAP_LAZY, HELLO_CAP_WRITE_HOLD, ERR_IO_ERROR, DEFAULT_CONFIG_WATCH_INTERVAL, WRITE_DRAIN_TIMEOUT, FILE_EVENT_RELEASE, SPILL_THRESHOLD, SPILL_MEMORY_BUDGET, SNAPSHOT_DIR, DEFAULT_SNAPSHOT_INTERVAL, STATS_MODULE_NAME, DEFAULT_METRICS_INTERVAL
 
 class FuseModManager(VF_Module):
     """FUSE 模块管理器"""
     
-    def __init__(self, config_dir, data_dir, enableDebug) -> None:
+    def __init__(self, config_dir, data_dir, enableDebug, max_inflight: int = DEFAULT_MAX_INFLIGHT, use_aiofiles: bool = False,
+                 max_frame_size: int = PACKET_MAX_FRAME_LIMIT, shm_size: int = DEFAULT_SHM_SIZE,
+                 trusted_pipe: bool = False, crc_sample: int = 0, send_queue_size: int = DEFAULT_SEND_QUEUE_SIZE,
+                 config_watch_interval: float = DEFAULT_CONFIG_WATCH_INTERVAL,
+                 content_threshold: int = SPILL_THRESHOLD, content_budget: int = SPILL_MEMORY_BUDGET,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL, metrics_interval: float = DEFAULT_METRICS_INTERVAL) -> None:
         global_table = {
             "config_dir": config_dir,
-            "data_dir": data_dir
+            "data_dir": data_dir,
+            # 模块共享的内容存储 (get_content_store) 的参数
+            "content_threshold": content_threshold,
+            "content_budget": content_budget,
         }
 
         super().__init__(global_table, enableDebug)
-        self.file_cache_table: Dict[str, VF_File] = {}
+
+        # 路径索引: 完整路径 -> (所属模块, 文件, 是否已在 FUSE 模块中创建)，模块注册到管理器下时加入
+        self.index = PathIndex()
+        self.index.add_module("", self)
         self.debug_mode = False
         self.pipe_in = None
         self.pipe_out = None
         self.process: Optional[asyncio.subprocess.Process] = None
         self.running = False
+        self.use_aiofiles = use_aiofiles
         self.pending_requests: Dict[int, asyncio.Future] = {}
         self.request_id = 0
+        self.request_timeout = REQUEST_TIMEOUT
+
+        # 在途请求窗口：最多 max_inflight 个请求已发送但未收到确认
+        self.max_inflight = max_inflight
+        self.inflight_window = asyncio.Semaphore(max_inflight)
+
+        # 所有发出的包经有界队列交给唯一的写任务，队列满时发送方等待
+        self.send_queue: asyncio.Queue = asyncio.Queue(send_queue_size)
+        self.writer_task: Optional[asyncio.Task] = None
+
+        self.decoder = FrameDecoder()
+        self.encoder = FrameEncoder()
+
+        # 协商前使用版本 1 格式（16 位长度，3KB 分包），requested_max_frame_size 为希望协商的最大包长
+        self.protocol_version = 1
+        self.max_frame_size = PACKET_MAX_SIZE
+        self.requested_max_frame_size = max_frame_size
+
+        # 可信本地管道模式，协商成功后生效，每 crc_sample 个包计算一次 CRC，其余填 0
+        self.trusted_pipe = trusted_pipe
+        self.crc_sample = crc_sample
+        self.crc_trusted = False
+
+        # 就绪包和启动耗时，helper_capabilities 为 None 表示未收到就绪包
+        self.hello: Optional[asyncio.Future] = None
+        self.helper_capabilities: Optional[int] = None
+        self.startup_started = time.perf_counter()
+        self.startup_times: Dict[str, float] = {}
+
+        # 正在重组的分片写入: write_id -> (path, offset, buffer, 收到首片的时间)，按收到首片的顺序排列
+        # 缺少最后一片的写入超时或超出数量上限时丢弃，丢弃数记在 write_incomplete
+        self.pending_writes: Dict[int, Tuple[str, int, bytearray, float]] = {}
+        self.write_incomplete = 0
+
+        # 共享内存数据通道，shm_in 为 Python -> helper，shm_out 为 helper -> Python，挂载失败时为 None
+        # shm_lock 保证内容按分配顺序写入共享内存并发出描述符
+        self.shm_size = shm_size
+        self.shm_in: Optional[ShmRing] = None
+        self.shm_out: Optional[ShmRing] = None
+        self.shm_lock = asyncio.Lock()
+
+        # 按路径跟踪数据接收任务和在途请求，删除文件时取消任务并等待请求完成
+        self.supervisor = TaskSupervisor()
+
+        # 上次完整推送给 FUSE 模块的内容，用于计算局部修改，只保存较大的只读文件
+        # 不会再被修改的内容（bytes、ContentStore 的只读视图）只保存引用，不复制
+        self.pushed_content: Dict[str, Any] = {}
+
+        # 上次设置的内容的 (长度, 摘要)，内容未变化时跳过推送，并统计跳过的次数和字节数
+        self.pushed_digest: Dict[str, Tuple[int, bytes]] = {}
+        self.push_skipped = 0
+        self.push_bytes_saved = 0
+        self.push_superseded = 0
+
+        # 每个文件的写入队列，删除文件和关闭时等待其完成
+        # 排队的写入过多时由 FUSE 模块暂停该文件的写入: write_hold 为最新的状态，write_hold_sent 为已发出的状态；
+        # FUSE 模块不支持暂停时 write_room 被清除，监听循环在下一个写入通知前等待，read_held 为排队过多的文件
+        self.write_queues: Dict[str, WriteQueue] = {}
+        self.write_hold: Dict[str, bool] = {}
+        self.write_hold_sent: Dict[str, bool] = {}
+        self.read_held: Set[str] = set()
+        self.write_room = asyncio.Event()
+        self.write_room.set()
+        self.write_failed = 0
+
+        # 启动快照: 推送成功的内容记在 snapshot_dirty 中（None 表示删除），每 snapshot_interval 秒写入一次，
+        # 启动时先把快照中的内容设置到新创建的文件，模块再在后台更新
+        self.snapshot_interval = snapshot_interval
+        self.snapshot = SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR)) if snapshot_interval > 0 else None
+        self.snapshot_dirty: Dict[str, Any] = {}
+        self.snapshot_lock = asyncio.Lock()
+        self.snapshot_replayed = 0
+
+        # 管道协议、推送和模块读写的计数与延迟，每 metrics_interval 秒输出到挂载点下 .fusemod 目录中的统计文件
+        self.metrics = MetricsRegistry()
+        self.metrics.add_gauges(self.metrics_gauges)
+        self.metrics.add_info("crc_info", self.crc_info)
+        self.metrics_interval = metrics_interval
+
+        # 正在获取按需内容的文件
+        self.fetching: Set[str] = set()
+
+        # 重新加载配置: 收到 SIGHUP 或配置目录中的 json 文件变化时进行，reload_lock 使其与启动时的创建互斥
+        self.config_watch_interval = config_watch_interval
+        self.reload_lock = asyncio.Lock()
+
+        # 挂载目录，分片模式下所属的 FuseModCluster
+        self.mount_point: Optional[str] = None
+        self.cluster: "Optional[FuseModCluster]" = None
+        self.closed = False
+        self.cleanup_task: Optional[asyncio.Future] = None
+        # FUSE helper 程序，默认为本py文件同目录下的fuseMod
+        self.helper_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fuseMod")
+        # run() 已遍历模块树，之后批量注册的文件由 files_registered 创建
+        self.tree_started = False
     
     async def init(self, mount_point) -> "Optional[FuseModManager]":
         """初始化方法"""
+        self.mount_point = mount_point
         # 如果不存在 mount_point/modules 则创建
         mod_dir = os.path.join(mount_point, "modules")
         pipe_in_path = os.path.join(mount_point, "FuseModPipeIn")
         pipe_out_path = os.path.join(mount_point, "FuseModPipeOut")
-        fusemod_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fuseMod")
+        fusemod_path = self.helper_path
+
+        # fuseMod 不随源码提交，需与当前协议的源码一起编译
+        if not os.path.exists(fusemod_path):
+            raise FileNotFoundError(f"FUSE helper {fusemod_path} not found, build it with `make` in {os.path.dirname(fusemod_path)}")
 
         try:
             os.makedirs(mod_dir, exist_ok=True)
@@ -42,181 +169,688 @@ class FuseModManager(VF_Module):
             if self.debug_mode:
                 print(f"Error creating modules directory {mod_dir}: {e}")
 
-        # 启动子进程，使用本py文件同目录下的fuseMod
-        self.process = await asyncio.create_subprocess_exec(fusemod_path, pipe_in_path, pipe_out_path, mod_dir, "-f")
+        if self.debug_mode:
+            print(f"CRC16 implementation: {CRC16_IMPL}")
+
+        # 命名管道由本进程预先创建，打开时阻塞到 helper 打开另一端，不需要固定等待
+        ensure_fifo(pipe_in_path)
+        ensure_fifo(pipe_out_path)
+
+        # 共享内存 fd 由子进程继承
+        self.create_shm()
+        shm_fds = [ring.fd for ring in (self.shm_in, self.shm_out) if ring is not None]
 
-        # 等待管道创建
-        await asyncio.sleep(1)
+        # 启动子进程
+        self.startup_times = {}
+        self.startup_started = time.perf_counter()
+        self.process = await asyncio.create_subprocess_exec(fusemod_path, pipe_in_path, pipe_out_path, mod_dir, "-f",
+                                                            pass_fds=shm_fds)
+        self.mark_startup("spawn")
 
-        # 异步打开命名管道，使用mount_point路径
-        self.pipe_in = await aiofiles.open(pipe_in_path, "wb")
-        self.pipe_out = await aiofiles.open(pipe_out_path, "rb")
+        # 异步打开命名管道，helper 提前退出或超时都视为启动失败
+        open_task = asyncio.ensure_future(open_pipes(pipe_in_path, pipe_out_path, self.use_aiofiles))
+        exit_task = asyncio.ensure_future(self.process.wait())
+        done, _ = await asyncio.wait({open_task, exit_task}, timeout=HELLO_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+        exit_task.cancel()
+        if open_task not in done:
+            open_task.cancel()
+            await release_pipe_opens(pipe_in_path, pipe_out_path)
+            if self.debug_mode:
+                print("FUSE helper did not open the pipes")
+            await self.cleanup()
+            return None
+
+        self.pipe_in, self.pipe_out = open_task.result()
         self.running = True
+        self.writer_task = asyncio.create_task(self.writer())
+        self.mark_startup("pipes")
+
+        await self.wait_hello()
+        await self.negotiate()
+        await self.attach_shm()
+        self.mark_startup("negotiated")
         return self
+
+    def mark_startup(self, stage: str) -> None:
+        """记录启动阶段距启动子进程的时间，每个阶段只记录第一次"""
+        if stage in self.startup_times:
+            return
+        self.startup_times[stage] = time.perf_counter() - self.startup_started
+        if self.debug_mode:
+            print(f"Startup {stage}: {self.startup_times[stage] * 1000:.1f} ms")
+
+    def startup_latency(self) -> Dict[str, float]:
+        """各启动阶段的耗时（秒）: spawn pipes hello negotiated first_file snapshot"""
+        return dict(self.startup_times)
+
+    async def pump_until(self, future: asyncio.Future, timeout: float, intercept_type: Optional[int] = None) -> None:
+        """在监听循环启动前读取并处理包，直到 future 完成、超时或管道关闭
+
+        intercept_type 类型的响应直接完成对应请求，带错误码时不按普通错误响应退出。"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        try:
+            while not future.done():
+                chunk = await asyncio.wait_for(self.pipe_out.read1(PIPE_READ_SIZE), timeout=max(deadline - loop.time(), 0)) # type: ignore
+                if not chunk:
+                    break
+                self.decoder.feed(chunk)
+                for version, type_byte, req_id, payload in self.decoder.frames():
+                    if type_byte == intercept_type:
+                        pending = self.pending_requests.pop(req_id, None)
+                        if pending is not None and not pending.done():
+                            pending.set_result(payload.tobytes())
+                        continue
+                    await self.handle_packet(version, type_byte, req_id, payload)
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_hello(self) -> None:
+        """等待 FUSE 模块挂载完成后发出的就绪包: version(2) max_frame_size(4) capabilities(4)
+
+        超时未收到时按旧版本模块继续启动。"""
+        self.hello = asyncio.get_running_loop().create_future()
+        await self.pump_until(self.hello, HELLO_TIMEOUT)
+
+        if not self.hello.done():
+            self.hello.cancel()
+            if self.debug_mode:
+                print("No hello from FUSE helper, continuing without it")
+            return
+
+        version, max_frame_size, self.helper_capabilities = struct.unpack_from("<HII", self.hello.result(), 0)
+        self.mark_startup("hello")
+        if self.debug_mode:
+            print(f"FUSE helper ready: version {version}, max frame size {max_frame_size}, "
+                  f"capabilities {self.helper_capabilities:#x}")
+
+    async def request_before_listen(self, type: int, data: bytes) -> Optional[bytes]:
+        """在监听循环启动前发送一个请求并直接读取响应，超时或出错时返回 None
+
+        响应带错误码时不按普通错误响应退出，由调用方判断。"""
+        future = await self.fuse_mod_send(type, data)
+        request_id = self.request_id
+
+        await self.pump_until(future, self.request_timeout, type)
+
+        if not future.done():
+            # 未收到响应，取消请求以释放窗口
+            self.pending_requests.pop(request_id, None)
+            future.cancel()
+
+        if future.cancelled() or future.exception() is not None or not future.result():
+            return None
+        return future.result()
+
+    async def negotiate(self) -> None:
+        """与 FUSE 模块协商协议版本和最大包长，失败时保持版本 1 格式"""
+        flags = NEGOTIATE_FLAG_TRUSTED if self.trusted_pipe else 0
+        response = await self.request_before_listen(0x09, struct.pack("<HIHH", PROTOCOL_VERSION, self.requested_max_frame_size,
+                                                                      flags, self.crc_sample))
+
+        if response is None or len(response) < 7 or response[0] != 0:
+            if self.debug_mode:
+                print("Protocol negotiation failed, using version 1 framing")
+            return
+
+        # 响应数据为: err(1) version(2) max_frame_size(4) [flags(2) crc_sample(2)]
+        version, max_frame_size = struct.unpack_from("<HI", response, 1)
+        if version >= 2:
+            self.protocol_version = version
+            self.max_frame_size = max_frame_size
+            self.encoder.version = version
+
+        if len(response) >= 11:
+            flags, self.crc_sample = struct.unpack_from("<HH", response, 7)
+            self.crc_trusted = bool(flags & NEGOTIATE_FLAG_TRUSTED)
+            self.decoder.trusted = self.crc_trusted
+            self.encoder.trusted = self.crc_trusted
+            self.encoder.crc_sample = self.crc_sample
+
+        if self.debug_mode:
+            print(f"Protocol version {self.protocol_version}, max frame size {self.max_frame_size}, "
+                  f"crc {'trusted, sample ' + str(self.crc_sample) if self.crc_trusted else 'full'}")
+
+    def create_shm(self) -> None:
+        """创建两个方向的共享内存环形缓冲区，需在启动子进程前调用以便子进程继承 fd"""
+        if self.shm_size <= 0 or not hasattr(os, "memfd_create"):
+            return
+
+        try:
+            self.shm_in = ShmRing(self.shm_size, "fuseModIn")
+            self.shm_out = ShmRing(self.shm_size, "fuseModOut")
+        except OSError as e:
+            if self.debug_mode:
+                print(f"Shared memory unavailable: {e}")
+            self.close_shm()
+
+    def close_shm(self) -> None:
+        for ring in (self.shm_in, self.shm_out):
+            if ring is not None:
+                ring.close()
+        self.shm_in = None
+        self.shm_out = None
+
+    async def attach_shm(self) -> None:
+        """通知 FUSE 模块挂载共享内存，失败时关闭共享内存，之后只使用管道"""
+        if self.shm_in is None or self.shm_out is None:
+            return
+
+        if self.helper_capabilities is not None and not self.helper_capabilities & HELLO_CAP_SHM:
+            self.close_shm()
+            return
+
+        response = await self.request_before_listen(0x0A, struct.pack("<IIII",
+            self.shm_in.fd, self.shm_in.size, self.shm_out.fd, self.shm_out.size))
+
+        if response is None or response[0] != 0:
+            if self.debug_mode:
+                print("Shared memory attach failed, using pipe only")
+            self.close_shm()
+            return
+
+        if self.debug_mode:
+            print(f"Shared memory attached, {self.shm_size} bytes per direction")
+
+    def frame_overhead(self) -> int:
+        """当前协议下包头、CRC 和包尾的总长度"""
+        return PACKET_MIN_SIZE_V2 if self.protocol_version >= 2 else PACKET_MIN_SIZE
+
+    def content_chunk_size(self, path_bytes: bytes) -> int:
+        """单个 path_len(2) path content_len content 包中 content 的最大长度"""
+        len_size = 4 if self.protocol_version >= 2 else 2
+        return self.max_frame_size - self.frame_overhead() - 2 - len(path_bytes) - len_size
+
     
-    async def fuse_mod_input(self, type: int, data: bytes) -> bool:
-        """发送数据到 FUSE 模块"""
+    def next_request_id(self) -> int:
+        """分配请求ID，跳过 0 和仍在途的ID"""
+        while True:
+            self.request_id = self.request_id % REQUEST_ID_MAX + 1
+            if self.request_id not in self.pending_requests:
+                return self.request_id
+
+    async def fuse_mod_send(self, type: int, *parts) -> asyncio.Future:
+        """发送数据包但不等待响应，返回该请求ID对应的 future
+
+        数据可以分成多段传入，内容段不会被复制，由写任务用 writev 直接写出。
+        在途请求数受 max_inflight 限制，窗口满时在此等待。"""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
 
         if not self.running:
-            return False
+            future.set_result(False)
+            return future
 
-        # 构建数据包
-        header = PACKET_HEADER
-        size = len(data)
-        size_bytes = struct.pack("<H", size)
-        packet_without_crc = header + struct.pack("<H", type) + size_bytes + data
-        crc = crc16_ccitt(packet_without_crc)
-        
-        crc_bytes = struct.pack("<H", crc)
-        packet = packet_without_crc + crc_bytes + PACKET_TAIL
+        await self.inflight_window.acquire()
+        future.add_done_callback(lambda _: self.inflight_window.release())
+
+        request_id = self.next_request_id()
+        self.pending_requests[request_id] = future
+
+        # 按协商的版本编码为分段列表
+        frame = self.encoder.encode_parts(type, request_id, parts)
+
+        # 共享内存通道的包与普通包按同一类型统计
+        packet_type = f"0x{type & ~PACKET_TYPE_SHM:02x}"
+        self.metrics.inc("frames_sent_total", type=packet_type)
+        self.metrics.inc("bytes_sent_total", sum(len(part) for part in frame))
+        sent = loop.time()
+        future.add_done_callback(lambda done: self.observe_ack(packet_type, sent, done))
 
         if self.debug_mode:
-            print(f"py send: {packet.hex()}, crc: {crc}, hex: {hex(crc)}")
-        
-        try:
-            # 写入数据
-            await self.pipe_in.write(packet) # type: ignore
-            await self.pipe_in.flush() # type: ignore
-            
-            # 创建等待响应的事件
-            request_id = self.request_id
-            self.request_id += 1
-            future = asyncio.Future()
-            self.pending_requests[request_id] = future
-            
-            # 等待响应或超时
+            print(f"py send: {b''.join(frame).hex()}, id: {request_id}")
+
+        # 交给写任务按顺序写出，队列满时在此等待
+        await self.send_queue.put((frame, request_id, future))
+        return future
+
+    def observe_ack(self, packet_type: str, sent: float, future: asyncio.Future) -> None:
+        """记录从发出请求到收到确认的时间"""
+        if not future.cancelled() and future.exception() is None:
+            self.metrics.observe("ack_latency_seconds", asyncio.get_running_loop().time() - sent, type=packet_type)
+
+    def send_queue_depth(self) -> int:
+        """发送队列中等待写出的包数"""
+        return self.send_queue.qsize()
+
+    async def writer(self) -> None:
+        """写任务，唯一写入 pipe_in 的协程
+
+        每次取出队列中已有的全部包（最多 SEND_BATCH_MAX 个），整批用一次 writev 写出
+        （aiofiles 时拼接后写出并只 flush 一次）。"""
+        while True:
+            batch = [await self.send_queue.get()]
+            while len(batch) < SEND_BATCH_MAX and not self.send_queue.empty():
+                batch.append(self.send_queue.get_nowait())
+
             try:
-                await asyncio.wait_for(future, timeout=3.0)
-                return True
-            except asyncio.TimeoutError:
-                if self.debug_mode:
-                    print(f"Timeout waiting for response to type {type}")
-                await self.cleanup()
-                return False
+                if hasattr(self.pipe_in, "writev"):
+                    await self.pipe_in.writev([part for frame, _, _ in batch for part in frame]) # type: ignore
+                else:
+                    await self.pipe_in.write(b"".join(part for frame, _, _ in batch for part in frame)) # type: ignore
+                    await self.pipe_in.flush() # type: ignore
             except Exception as e:
-                print(e)
-                raise e
-                
+                for _, request_id, future in batch:
+                    self.pending_requests.pop(request_id, None)
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def wait_response(self, futures: List[asyncio.Future]) -> bool:
+        """等待一组请求全部确认，超时按单个请求计算"""
+        ok = True
+        try:
+            # 响应按发送顺序返回，逐个等待使每个请求都有完整的超时时间
+            # 等待方被取消时请求仍在途中，shield 使请求的 future 保持到收到响应
+            for future in futures:
+                if await asyncio.wait_for(asyncio.shield(future), timeout=self.request_timeout) is False:
+                    ok = False
+            return ok
+        except asyncio.TimeoutError:
+            self.metrics.inc("request_timeouts_total")
+            if self.debug_mode:
+                print(f"Timeout waiting for {len(futures)} response(s)")
+            await self.cleanup()
+            return False
         except Exception as e:
             if self.debug_mode:
-                print(f"Error writing to pipe: {e}")
+                print(f"Error waiting for response: {e}")
             await self.cleanup()
             return False
+
+    async def fuse_mod_input(self, type: int, data: bytes) -> bool:
+        """发送数据到 FUSE 模块并等待确认"""
+        future = await self.fuse_mod_send(type, data)
+        return await self.wait_response([future])
     
     async def listen(self) -> None:
         """监听来自 FUSE 模块的数据"""
         while self.running:
             try:
-                # 读取包头
-                header = await self.pipe_out.read(6) # type: ignore
-                if len(header) < 6:
+                # 一次读取尽量多的数据，由解码器切分出其中所有完整的包
+                chunk = await self.pipe_out.read1(PIPE_READ_SIZE) # type: ignore
+                if not chunk:
                     await asyncio.sleep(0.1)
                     continue
 
-                if header[0:2] != b"\x54\x02":
-                    # 无效包头，跳过
-                    continue
-
-                type_byte, size = struct.unpack("<HH", header[2:6])
+                self.decoder.feed(chunk)
 
-                # 读取数据
-                data = await self.pipe_out.read(size) # type: ignore
-                if len(data) < size:
-                    # 数据不足，跳过
-                    continue
-                
-                # 读取CRC和尾部
-                crc_data = await self.pipe_out.read(4) # type: ignore
-                if len(crc_data) < 4:
-                    # 数据不足，跳过
-                    continue
-                
-                crc_received = struct.unpack("<H", crc_data[0:2])[0]
-                tail = crc_data[2:4]
-                
-                if tail != PACKET_TAIL:
-                    # 无效尾部，跳过
-                    continue
-                
-                # 验证CRC
-                packet_without_crc = header + data
-                crc_calculated = crc16_ccitt(packet_without_crc)
-
-                if self.debug_mode:
-                    print(f"py recv: {(header + data + crc_data).hex()}")
-
-                if crc_received != crc_calculated:
-                    # CRC 不匹配，跳过
-                    continue
-
-                if type_byte == 0x07:
-                    # 文件写入请求
-                    await self.handle_file_write_request(data)
-                else:
-                    if len(data) < 1:
-                        continue
-
-                    err = data[0]
-
-                    # 错误响应，清理并退出
-                    if err != 0:
-                        await self.cleanup()
+                for version, type_byte, req_id, data in self.decoder.frames():
+                    if type_byte & ~PACKET_TYPE_SHM == 0x07 and not self.write_room.is_set():
+                        # FUSE 模块不能暂停写入，停止读取写入通知直到排队的写入减少
+                        await self.write_room.wait()
+                    if not await self.handle_packet(version, type_byte, req_id, data):
                         return
-                    
-                    # 普通响应，唤醒等待的请求
-                    for req_id, future in self.pending_requests.items():
-                        if not future.done():
-                            future.set_result(True)
-                            del self.pending_requests[req_id]
-                            break
                 
             except Exception as e:
                 if self.debug_mode:
                     print(f"Error reading from pipe: {e}")
                 await asyncio.sleep(0.1)
+
+    async def handle_packet(self, version: int, type_byte: int, req_id: int, data: memoryview) -> bool:
+        """处理一个来自 FUSE 模块的包，返回 False 表示停止监听"""
+        if self.debug_mode:
+            print(f"py recv: version {version}, type {type_byte}, id {req_id}, data {data.hex()}")
+        self.metrics.inc("frames_received_total", type=f"0x{type_byte & ~PACKET_TYPE_SHM:02x}")
+        self.metrics.inc("bytes_received_total", len(data))
+
+        if type_byte == 0x07:
+            # 文件写入请求
+            await self.handle_file_write_request(data, version)
+            return True
+
+        if type_byte == 0x0F:
+            # FUSE 模块就绪
+            if self.hello is not None and not self.hello.done():
+                self.hello.set_result(data.tobytes())
+            return True
+
+        if type_byte == 0x0E:
+            # 以写方式打开的文件 flush、fsync 或关闭
+            self.handle_file_event(data)
+            return True
+
+        if type_byte == 0x0D and req_id == 0:
+            # 按需内容的文件被打开或读取
+            self.handle_content_needed(data)
+            return True
+
+        if type_byte == 0x07 | PACKET_TYPE_SHM:
+            # 文件写入请求，内容在共享内存中
+            self.handle_shm_write_request(data)
+            return True
+
+        if len(data) < 1:
+            return True
+
+        err = data[0]
+
+        # 局部修改和截断失败时 FUSE 模块不退出，请求按失败完成，由 push_content 改为完整设置
+        if err != 0 and type_byte in (0x0B, 0x0C):
+            self.metrics.inc("error_responses_total", code=err)
+            future = self.pending_requests.pop(req_id, None)
+            if future is not None and not future.done():
+                future.set_result(False)
+            return True
+
+        # 错误响应，清理并退出
+        if err != 0:
+            self.metrics.inc("error_responses_total", code=err)
+            await self.cleanup()
+            return False
+        
+        # 普通响应，按请求ID唤醒对应的请求，结果为响应数据
+        future = self.pending_requests.pop(req_id, None)
+        if future is not None and not future.done():
+            future.set_result(data.tobytes())
+
+        return True
     
-    async def handle_file_write_request(self, data: bytes) -> None:
-        """处理文件写入请求"""
+    def handle_content_needed(self, data: memoryview) -> None:
+        """处理 0x0D 内容获取通知，data 为 path，同一文件同时只获取一次"""
+        path = str(data, "utf-8")
+        file = self.index.live(path)
+        if file is None:
+            # 文件已删除，通知 FUSE 模块获取失败以唤醒等待者
+            self.supervisor.track(path, self.fuse_mod_input(0x0D, bytes([ERR_NOT_FOUND]) + data.tobytes()))
+            return
+        if path in self.fetching:
+            return
+        self.fetching.add(path)
+        self.supervisor.spawn(path, self.file_fetch(path, file))
+
+    async def file_fetch(self, path: str, file: VF_File) -> None:
+        """获取按需内容并推送，然后通知 FUSE 模块获取完成: status(1) path"""
+        status = 0
+        path_bytes = path.encode()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
         try:
-            # 解析数据
-            path_len = struct.unpack("<H", data[0:2])[0]
-            path = data[2:2+path_len].decode()
-            context_len = struct.unpack("<H", data[2+path_len:4+path_len])[0]
-            context = data[4+path_len:4+path_len+context_len]
-            offset = struct.unpack("<I", data[4+path_len+context_len:8+path_len+context_len])[0]
-            
-            # 调用文件写入
-            self.file_write(path, context, offset)
+            buffer = await file.fetch()
+            self.metrics.observe("module_fetch_seconds", loop.time() - started, module=self.module_name(path))
+            if not await self.push_content(path, path_bytes, file, buffer):
+                status = ERR_IO_ERROR
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = ERR_IO_ERROR
+            self.metrics.inc("module_errors_total", module=self.module_name(path), call="fetch")
+            if self.debug_mode:
+                print(f"Error in file_fetch for {path}: {e}")
+        finally:
+            self.fetching.discard(path)
+
+        await self.fuse_mod_input(0x0D, bytes([status]) + path_bytes)
+
+    async def handle_file_write_request(self, data: memoryview, version: int = 1) -> None:
+        """处理文件写入请求，data 为解码器缓冲区的视图，版本 2 的内容长度字段为 4 字节"""
+        try:
+            path, context, offset, trailer = decode_write(data, version)
+
+            # 不带 write_id 和标志的旧格式通知视为一次完整写入
+            if trailer is None:
+                self.file_write(path, context.tobytes(), offset)
+                return
+
+            write_id, flags = trailer
+            self.reassemble_write(path, context, offset, write_id, flags)
             
         except Exception as e:
             if self.debug_mode:
                 print(f"Error handling file write request: {e}")
-    
+
+    def handle_shm_write_request(self, data: memoryview) -> None:
+        """处理共享内存写入通知: path_len(2) path pos(8) length(4) offset(4) write_id(4) flags(1)"""
+        try:
+            path, pos, length, offset, write_id, flags = decode_shm_write(data)
+
+            content = self.shm_out.get(pos, length) if self.shm_out is not None else None
+            if content is None:
+                if self.debug_mode:
+                    print(f"Invalid shared memory write: {path} pos {pos} length {length}")
+                return
+
+            self.reassemble_write(path, content, offset, write_id, flags)
+
+        except Exception as e:
+            if self.debug_mode:
+                print(f"Error handling shared memory write request: {e}")
+
+    def reassemble_write(self, path: str, context, offset: int, write_id: int, flags: int) -> None:
+        """按 write_id 重组同一次内核写入的分片，收到最后一片时调用一次 file_write"""
+        if flags & WRITE_FLAG_FIRST:
+            if flags & WRITE_FLAG_LAST:
+                # 只有一片，模块可能保留数据，此处复制为 bytes
+                self.file_write(path, bytes(context), offset)
+                return
+            self.expire_pending_writes()
+            if self.pending_writes.pop(write_id, None) is not None:
+                self.write_incomplete += 1
+            self.pending_writes[write_id] = (path, offset, bytearray(context), time.monotonic())
+            return
+
+        pending = self.pending_writes.get(write_id)
+        if pending is None:
+            # 缺少首片，丢弃
+            if self.debug_mode:
+                print(f"Drop write chunk without first chunk: {path} id {write_id}")
+            return
+
+        start_path, start_offset, buffer, _ = pending
+        if start_path != path or start_offset + len(buffer) != offset:
+            # 分片不连续，丢弃整个写入
+            del self.pending_writes[write_id]
+            self.write_incomplete += 1
+            if self.debug_mode:
+                print(f"Drop discontinuous write: {path} id {write_id}")
+            return
+
+        buffer += context
+        if flags & WRITE_FLAG_LAST:
+            del self.pending_writes[write_id]
+            self.file_write(path, bytes(buffer), start_offset)
+
+    def expire_pending_writes(self) -> None:
+        """丢弃超时的分片写入，并为新的写入留出空位"""
+        deadline = time.monotonic() - PENDING_WRITE_TIMEOUT
+        while self.pending_writes:
+            write_id = next(iter(self.pending_writes))
+            if self.pending_writes[write_id][3] >= deadline and len(self.pending_writes) < PENDING_WRITE_MAX:
+                break
+            del self.pending_writes[write_id]
+            self.write_incomplete += 1
+
+    def drop_pending_writes(self, path: str) -> None:
+        """丢弃 path 正在重组的写入"""
+        for write_id in [write_id for write_id, pending in self.pending_writes.items() if pending[0] == path]:
+            del self.pending_writes[write_id]
+            self.write_incomplete += 1
+
+    async def fuse_mod_batch(self, ops: Iterable[Tuple[int, bytes]]) -> List[int]:
+        """批量发送 0x01/0x02/0x04 操作，返回与 ops 一一对应的结果码
+
+        操作按顺序打包进尽量少的 0x08 批量包，格式为: count(2) [type(2) size(2) data]..."""
+
+        max_payload = self.max_frame_size - self.frame_overhead()
+        frames: List[Tuple[int, bytes]] = []
+        parts: List[bytes] = []
+        payload_size = 2
+
+        for op_type, op_data in ops:
+            op_size = 4 + len(op_data)
+            if parts and (payload_size + op_size > max_payload or len(parts) >= BATCH_MAX_OPS):
+                frames.append((len(parts), struct.pack("<H", len(parts)) + b"".join(parts)))
+                parts = []
+                payload_size = 2
+            parts.append(struct.pack("<HH", op_type, len(op_data)) + op_data)
+            payload_size += op_size
+
+        if parts:
+            frames.append((len(parts), struct.pack("<H", len(parts)) + b"".join(parts)))
+
+        futures = []
+        for _, payload in frames:
+            futures.append(await self.fuse_mod_send(0x08, payload))
+
+        results: List[int] = []
+        if not await self.wait_response(futures):
+            for count, _ in frames:
+                results.extend([ERR_INVALID_OPERATION] * count)
+            return results
+
+        # 响应数据为: err(1) count(2) result(1)...
+        for (count, _), future in zip(frames, futures):
+            data = future.result()
+            results.extend(data[3:3+count])
+
+        return results
+
     async def mkdir(self, path: str) -> bool:
         """创建目录"""
         return await self.fuse_mod_input(0x1, path.encode())
+
+    async def mkdir_batch(self, paths: Iterable[str]) -> List[int]:
+        """批量创建目录"""
+        return await self.fuse_mod_batch((0x01, path.encode()) for path in paths)
+
+    def is_lazy(self, file: VF_File) -> bool:
+        """文件按需获取内容，FUSE 模块不支持时按普通文件推送"""
+        return (file.isLazy() and self.helper_capabilities is not None
+                and self.helper_capabilities & HELLO_CAP_LAZY != 0)
+
+    def create_payload(self, path: str, file: VF_File) -> bytes:
+        """构建创建文件的数据: flag(4) path_len(2) path [ttl_ms(4)]"""
+        if self.is_lazy(file):
+            return create_payload(path.encode(), file.getFlag(), int(file.getTTL() * 1000))
+        return create_payload(path.encode(), file.getFlag() & ~VF_File.FLAG_LAZY)
+
+    def start_file_tasks(self, path: str, file: VF_File) -> None:
+        """如果文件可读，创建数据接收任务，按需获取内容的文件在被打开或读取时才获取"""
+        if file.isAvailableRead() and not self.is_lazy(file):
+            latest = LatestValue()
+            self.supervisor.spawn(path, self.file_receive_data(path, file, latest))
+            self.supervisor.spawn(path, self.file_push_data(path, file, latest))
+            self.supervisor.spawn(path, self.file_receive_data_append(path, file))
     
     def internal_create(self, path: str, file: VF_File):
-        if path in self.file_cache_table:
+        if self.index.is_live(path):
             return ERR_ALREADY_EXISTS
         
-        path_bytes = path.encode()
-        flag_bytes = struct.pack("<I", file.getFlag())
-        path_len_bytes = struct.pack("<H", len(path_bytes))
-        payload = flag_bytes + path_len_bytes + path_bytes
-        asyncio.create_task(self.fuse_mod_input(0x02, payload))
-        self.file_cache_table[path] = file
-
-        # 如果文件可读，创建数据接收任务
-        if file.isAvailableRead():
-            asyncio.create_task(self.file_receive_data(path, file))
-            asyncio.create_task(self.file_receive_data_append(path, file))
+        self.supervisor.track(path, self.internal_create_request(path, file))
+        self.index.set_live(path, file)
+        self.start_file_tasks(path, file)
         
         return 0
+
+    async def internal_create_request(self, path: str, file: VF_File) -> None:
+        if await self.fuse_mod_input(0x02, self.create_payload(path, file)):
+            self.mark_startup("first_file")
+
+    async def internal_create_batch(self, items: Iterable[Tuple[str, VF_File]], warm: bool = False) -> List[int]:
+        """批量创建文件，返回与 items 一一对应的结果码，warm 为 True 时在启动数据接收任务前设置快照中的内容"""
+        results: List[int] = []
+        pending: List[Tuple[int, str, VF_File]] = []
+
+        for path, file in items:
+            if self.index.is_live(path):
+                results.append(ERR_ALREADY_EXISTS)
+                continue
+            self.index.set_live(path, file)
+            pending.append((len(results), path, file))
+            results.append(0)
+
+        # 创建请求完成前删除这些文件时需要等待批量包
+        batch = asyncio.ensure_future(self.fuse_mod_batch((0x02, self.create_payload(path, file)) for _, path, file in pending))
+        for _, path, _ in pending:
+            self.supervisor.track(path, batch)
+        codes = await batch
+
+        created: List[Tuple[str, VF_File]] = []
+        for (index, path, file), code in zip(pending, codes):
+            results[index] = code
+            if code == 0:
+                self.mark_startup("first_file")
+                created.append((path, file))
+            else:
+                self.index.clear_live(path)
+
+        if warm:
+            await self.replay_snapshot(created)
+        for path, file in created:
+            self.start_file_tasks(path, file)
+
+        return results
+
+    async def replay_snapshot(self, files: List[Tuple[str, VF_File]]) -> int:
+        """把快照中的内容并发设置到 files 中的可读文件，返回设置成功的文件数
+
+        按需获取内容的文件不设置；快照中已不在路径索引里的文件删除其快照。"""
+        if self.snapshot is None:
+            return 0
+
+        entries = await asyncio.get_running_loop().run_in_executor(None, lambda: list(self.snapshot.load())) # type: ignore
+        targets = dict(files)
+        paths: List[str] = []
+        pushes = []
+        for path, _, content in entries:
+            file = targets.get(path)
+            if file is None:
+                if self.index.get(path) is None:
+                    self.snapshot_dirty[path] = None
+                continue
+            if not file.isAvailableRead() or self.is_lazy(file):
+                continue
+            paths.append(path)
+            pushes.append(self.push_content(path, path.encode(), file, content))
+
+        results = await asyncio.gather(*pushes, return_exceptions=True)
+        replayed = 0
+        for path, ok in zip(paths, results):
+            # 设置的就是快照中的内容，不需要再写回
+            self.snapshot_dirty.pop(path, None)
+            if ok is True:
+                replayed += 1
+
+        self.snapshot_replayed += replayed
+        self.mark_startup("snapshot")
+        return replayed
+
+    async def create_files(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """批量创建文件，items 为 (path, kwargs)，返回与 items 一一对应的结果码"""
+        results: List[int] = []
+        files: List[Tuple[str, VF_File]] = []
+        indexes: List[int] = []
+
+        for path, kwargs in items:
+            exists = self.index.is_live(path)
+            file = None if exists else VF_Module.create(self, path, kwargs)
+            if file is None:
+                results.append(ERR_ALREADY_EXISTS if exists else ERR_NOT_FOUND)
+                continue
+            indexes.append(len(results))
+            files.append((path, file))
+            results.append(0)
+
+        for index, code in zip(indexes, await self.internal_create_batch(files)):
+            results[index] = code
+
+        return results
         
+    def files_registered(self, files: List[Tuple[str, VF_File]]) -> None:
+        """运行中批量注册的文件，在启动创建完成后用一组批量包创建"""
+        if not self.tree_started or not files:
+            return
+
+        async def create_registered():
+            async with self.reload_lock:
+                await self.internal_create_batch(files)
+
+        asyncio.create_task(create_registered())
+
     def create(self, path: str, kwargs: Dict[str, Any] = {}) -> int:
         """创建文件"""
-        if path in self.file_cache_table:
+        if self.index.is_live(path):
             return ERR_ALREADY_EXISTS
         
         file = super().create(path, kwargs)
@@ -227,16 +861,28 @@ class FuseModManager(VF_Module):
     
     async def rm(self, path: str) -> int:
         """删除文件"""
-        if path not in self.file_cache_table:
+        if not self.index.is_live(path):
             return ERR_NOT_FOUND
         
-        file = self.file_cache_table[path]
+        # 先从索引中删除，之后的写入通知和重复删除不再作用于该文件
+        entry = self.index.remove_file(path)
+        file = entry.file
+        if entry.registered and entry.module is not None:
+            name = PathIndex.split(path)[1]
+            if entry.module.register_file_table.get(name) is file:
+                del entry.module.register_file_table[name]
+        self.pushed_content.pop(path, None)
+        self.pushed_digest.pop(path, None)
+        self.drop_pending_writes(path)
+        if self.snapshot is not None:
+            self.snapshot_dirty[path] = None
         
-        # 取消数据接收任务（在实际实现中需要更复杂的任务管理）
-        # 这里简化处理
-        
-        # 等待文件写入完成（在实际实现中需要跟踪写入任务）
-        await asyncio.sleep(0.1)
+        # 取消数据接收任务，并等待已发出的创建和内容请求、已提交的写入完成
+        await self.supervisor.remove(path, self.request_timeout)
+        queue = self.write_queues.pop(path, None)
+        if queue is not None:
+            await queue.close(WRITE_DRAIN_TIMEOUT)
+        self.write_hold_sent.pop(path, None)
         
         # 调用文件的删除方法
         await file.rm()
@@ -244,62 +890,330 @@ class FuseModManager(VF_Module):
         # 通知 FUSE 模块
         await self.fuse_mod_input(0x04, path.encode())
         
-        # 从缓存中删除
-        del self.file_cache_table[path]
-        
         return 0
+
+    def status(self) -> Dict[str, Any]:
+        """运行状态: 挂载目录、helper 进程、文件数、任务和推送统计、CRC 实现"""
+        return {
+            "mount_point": self.mount_point,
+            "pid": self.process.pid if self.process is not None else None,
+            "running": self.running,
+            "modules": list(self.register_module_table),
+            "live_files": sum(1 for entry in self.index.files.values() if entry.live),
+            "send_queue": self.send_queue_depth(),
+            "pending_requests": len(self.pending_requests),
+            "tasks": self.task_stats(),
+            "push": self.push_stats(),
+            "writes": self.write_stats(),
+            "crc": self.crc_info(),
+            "content": self.content_stats(),
+            "snapshot": {"pending": len(self.snapshot_dirty), "replayed": self.snapshot_replayed},
+        }
+
+    def crc_info(self) -> Dict[str, Any]:
+        """当前使用的 CRC16 实现和校验模式，可信管道模式下每 sample 个包计算一次 CRC"""
+        return {"impl": CRC16_IMPL, "mode": "trusted" if self.crc_trusted else "full",
+                "sample": self.crc_sample if self.crc_trusted else 0}
+
+    def content_stats(self) -> Dict[str, int]:
+        """模块共享的内容存储的统计，未使用时为空"""
+        store = self.get_global_table().get("content_store")
+        return store.stats() if store is not None else {}
+
+    @staticmethod
+    def module_name(path: str) -> str:
+        """路径所属的顶层模块名"""
+        return path.split("/", 2)[1]
+
+    def metrics_gauges(self) -> Dict[str, float]:
+        """统计文件中的瞬时值"""
+        gauges: Dict[str, float] = {
+            "live_files": sum(1 for entry in self.index.files.values() if entry.live),
+            "send_queue": self.send_queue_depth(),
+            "pending_requests": len(self.pending_requests),
+            "frame_resyncs": self.decoder.resync_count,
+        }
+        for group, values in (("tasks", self.task_stats()), ("push", self.push_stats()), ("writes", self.write_stats()),
+                              ("content", self.content_stats())):
+            for key, value in values.items():
+                gauges[f"{group}_{key}"] = value
+        gauges["snapshot_pending"] = len(self.snapshot_dirty)
+        return gauges
+
+    def task_stats(self) -> Dict[str, int]:
+        """后台任务统计: 涉及的路径数、数据接收任务数、在途请求数"""
+        return self.supervisor.stats()
     
     def file_write(self, path: str, buffer: bytes, offset: int) -> None:
-        """文件写入"""
-        if path in self.file_cache_table:
-            self.file_cache_table[path].write(buffer, offset)
+        """文件写入，提交到文件的写入队列后立即返回
+
+        不在此等待，监听循环继续读取其他文件的响应；排队的写入过多时暂停该文件的写入。"""
+        # 内核写入后 FUSE 模块中的内容已改变，下次读取的内容即使与上次相同也要推送
+        self.pushed_digest.pop(path, None)
+        file = self.index.live(path)
+        if file is None:
+            return
+
+        self.write_queue(path, file).write(buffer, offset)
+
+    def handle_file_event(self, data: memoryview) -> None:
+        """处理 0x0E 文件事件通知: event(1) path
+
+        事件提交到文件的写入队列，在此前的写入都完成后调用 on_flush 或 on_close。"""
+        if len(data) < 2:
+            return
+        event = data[0]
+        path = str(data[1:], "utf-8")
+        file = self.index.live(path)
+        if file is None:
+            return
+
+        self.write_queue(path, file).submit(self.run_file_event, path, file, event)
+
+    async def run_file_event(self, path: str, file: VF_File, event: int) -> None:
+        try:
+            if event == FILE_EVENT_RELEASE:
+                await file.on_close()
+            else:
+                await file.on_flush()
+        except Exception as e:
+            self.write_failed += 1
+            if self.debug_mode:
+                print(f"Error handling file event {event} for {path}: {e}")
+
+    def write_queue(self, path: str, file: VF_File) -> WriteQueue:
+        queue = self.write_queues.get(path)
+        if queue is None:
+            queue = self.write_queues[path] = WriteQueue(file.getMaxQueuedWrites(),
+                                                         lambda buffer, offset: self.run_write(path, file, buffer, offset),
+                                                         lambda hold: self.hold_writes(path, hold),
+                                                         file.getCoalesceWrites())
+        return queue
+
+    def hold_writes(self, path: str, hold: bool) -> None:
+        """暂停或恢复 path 的写入，FUSE 模块不支持暂停时停止读取写入通知"""
+        if self.helper_capabilities is None or not self.helper_capabilities & HELLO_CAP_WRITE_HOLD:
+            if hold:
+                self.read_held.add(path)
+                self.write_room.clear()
+            else:
+                self.read_held.discard(path)
+                if not self.read_held:
+                    self.write_room.set()
+            return
+
+        sending = path in self.write_hold
+        self.write_hold[path] = hold
+        if not sending:
+            self.supervisor.track(path, self.send_write_hold(path))
+
+    async def send_write_hold(self, path: str) -> None:
+        """发出 0x10 hold(1) path，直到 FUSE 模块的状态与最新的状态一致，同一文件同时只有一个在发送"""
+        try:
+            while self.running and self.write_hold[path] != self.write_hold_sent.get(path, False):
+                hold = self.write_hold[path]
+                self.write_hold_sent[path] = hold
+                await self.fuse_mod_input(0x10, bytes([hold]) + path.encode())
+        finally:
+            del self.write_hold[path]
+
+    async def run_write(self, path: str, file: VF_File, buffer: bytes, offset: int) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        module = self.module_name(path)
+        try:
+            await file.awrite(buffer, offset)
+            self.metrics.observe("module_write_seconds", loop.time() - started, module=module)
+            self.metrics.inc("module_write_bytes_total", len(buffer), module=module)
+        except Exception as e:
+            self.write_failed += 1
+            self.metrics.inc("module_errors_total", module=module, call="write")
+            if self.debug_mode:
+                print(f"Error writing {path}: {e}")
+
+    def write_stats(self) -> Dict[str, int]:
+        """写入统计: 未完成的写入数、暂停写入的文件数和次数、合并的写入数、失败次数、正在重组和因缺少分片丢弃的写入数"""
+        return {
+            "pending": sum(queue.pending() for queue in self.write_queues.values()),
+            "held": sum(queue.held for queue in self.write_queues.values()),
+            "holds": sum(queue.holds for queue in self.write_queues.values()),
+            "merged": sum(queue.merged for queue in self.write_queues.values()),
+            "failed": self.write_failed,
+            "reassembling": len(self.pending_writes),
+            "incomplete": self.write_incomplete,
+        }
     
-    async def file_receive_data(self, path: str, file: VF_File) -> None:
-        """接收文件数据，分批处理，使用memoryview优化，发送格式为: path_len(2) path path_len(2) context"""
+    async def send_content(self, path: str, path_bytes: bytes, buffer: bytes, type: int) -> bool:
+        """发送文件内容，首片使用 type（0x05 设置或 0x06 追加），其余分片追加
+
+        共享内存可用时内容写入共享内存，管道只传 path_len(2) path pos(8) length(4) 描述符；
+        共享内存空间不足时先等待已发送的分片确认，仍不足则改用管道分片发送。
+        发出的请求记录在 supervisor 中，删除文件时等待其完成。"""
+        mv = memoryview(buffer)
+        total = len(mv)
+        offset = 0
+        futures: List[asyncio.Future] = []
+
+        ring = self.shm_in
+        while ring is not None and offset < total:
+            chunk = mv[offset:offset + ring.size // 2]
+            async with self.shm_lock:
+                pos = ring.put(chunk)
+                if pos is not None:
+                    payload = shm_content_payload(path_bytes, pos, len(chunk))
+                    futures.append(self.supervisor.track(path, await self.fuse_mod_send(type | PACKET_TYPE_SHM, payload)))
+            if pos is None:
+                if not futures:
+                    break
+                # helper 处理完已发送的分片后会回收空间
+                if not await self.wait_response(futures):
+                    return False
+                futures = []
+                continue
+            offset += len(chunk)
+            type = 0x06
+
+        if total == 0:
+            # 空内容也需要发出一个包，把文件设置为空
+            futures.append(self.supervisor.track(path, await self.fuse_mod_send(type, *content_parts(path_bytes, b"", self.protocol_version))))
+
+        chunk_size = self.content_chunk_size(path_bytes)
+        while offset < total:
+            chunk = mv[offset:offset+chunk_size]
+
+            # 分片按顺序流水发送，最后统一等待确认，内容段直接引用原缓冲区
+            futures.append(self.supervisor.track(path, await self.fuse_mod_send(type, *content_parts(path_bytes, chunk, self.protocol_version))))
+            offset += chunk_size
+            type = 0x06
+
+        return await self.wait_response(futures)
+
+    def patch_plan(self, path_bytes: bytes, old: bytes, new) -> Optional[List[Tuple[int, int]]]:
+        """计算局部修改的区间，不值得局部修改时返回 None"""
+        ranges = diff_ranges(old, new)
+        overhead = self.frame_overhead() + 4 + 2 + len(path_bytes) + (4 if self.protocol_version >= 2 else 2)
+        cost = sum(end - start + overhead for start, end in ranges)
+        if cost > len(new) * PATCH_MAX_RATIO:
+            return None
+        return ranges
+
+    async def send_patch(self, path: str, path_bytes: bytes, buffer, ranges: List[Tuple[int, int]], old_size: int) -> bool:
+        """按区间发送局部修改，新内容更短时先截断"""
+        mv = memoryview(buffer)
+        futures: List[asyncio.Future] = []
+
+        if len(mv) < old_size:
+            futures.append(self.supervisor.track(path, await self.fuse_mod_send(0x0C, truncate_payload(path_bytes, len(mv)))))
+
+        chunk_size = self.content_chunk_size(path_bytes) - 4
+        for start, end in ranges:
+            for offset in range(start, end, chunk_size):
+                chunk = mv[offset:min(offset + chunk_size, end)]
+                futures.append(self.supervisor.track(path, await self.fuse_mod_send(0x0B, *patch_parts(path_bytes, offset, chunk, self.protocol_version))))
+
+        return await self.wait_response(futures)
+
+    async def push_content(self, path: str, path_bytes: bytes, file: VF_File, buffer) -> bool:
+        """设置文件内容，与上次推送的内容相同时跳过，变化较小时只发送变化的区间"""
+        digest = (len(buffer), hashlib.blake2b(buffer, digest_size=PUSH_DIGEST_SIZE).digest())
+        if self.pushed_digest.get(path) == digest:
+            self.push_skipped += 1
+            self.push_bytes_saved += len(buffer)
+            self.metrics.inc("pushes_total", result="skipped")
+            return True
+        self.pushed_digest[path] = digest
+
+        old = self.pushed_content.pop(path, None)
+        ranges = None if old is None else self.patch_plan(path_bytes, old, buffer)
+
+        # 发送前记录新基准，发送期间的追加会清除它；可写文件的内容可能被内核写入修改，不作为基准
+        if (len(buffer) >= PATCH_MIN_SIZE and not file.isAvailableWrite()
+                and self.helper_capabilities is not None and self.helper_capabilities & HELLO_CAP_PATCH):
+            self.pushed_content[path] = buffer if self.immutable(buffer) else bytes(buffer)
+
+        result = "full"
+        if ranges is not None:
+            ok = await self.send_patch(path, path_bytes, buffer, ranges, len(old))
+            sent = sum(end - start for start, end in ranges)
+            result = "patch"
+            if not ok and self.running and self.index.is_live(path):
+                # FUSE 模块拒绝了局部修改（内容与基准不一致），改为完整设置
+                ok = await self.send_content(path, path_bytes, buffer, 0x05)
+                sent += len(buffer)
+                result = "patch_fallback"
+        else:
+            ok = await self.send_content(path, path_bytes, buffer, 0x05)
+            sent = len(buffer)
+        self.metrics.inc("pushes_total", result=result if ok else "failed")
+        self.metrics.inc("content_bytes_total", sent, module=self.module_name(path))
+
+        if not ok or not self.index.is_live(path):
+            self.pushed_content.pop(path, None)
+            self.pushed_digest.pop(path, None)
+        elif self.snapshot is not None and self.module_name(path) != STATS_MODULE_NAME:
+            # 统计文件每次启动重新生成，不写入快照
+            self.snapshot_dirty[path] = buffer if self.immutable(buffer) else bytes(buffer)
+        return ok
+
+    @staticmethod
+    def immutable(buffer) -> bool:
+        """内容不会再被修改: bytes，或 bytes 与只读映射（如 ContentStore 的内容）的只读视图"""
+        if isinstance(buffer, bytes):
+            return True
+        return isinstance(buffer, memoryview) and buffer.readonly and isinstance(buffer.obj, (bytes, mmap.mmap))
+
+    def push_stats(self) -> Dict[str, int]:
+        """内容未变化而跳过的推送次数和节省的字节数，以及推送前被新版本覆盖而丢弃的版本数"""
+        return {"skipped": self.push_skipped, "bytes_saved": self.push_bytes_saved, "superseded": self.push_superseded}
+
+    async def file_receive_data(self, path: str, file: VF_File, latest: LatestValue) -> None:
+        """接收文件数据交给 file_push_data，尚未推送的旧版本直接被新版本覆盖"""
         try:
-            path_bytes = path.encode()
-            path_len_bytes = struct.pack("<H", len(path_bytes))
-            while self.running and path in self.file_cache_table:
+            while self.running and self.index.is_live(path):
                 buffer = await file.read()
-                if buffer:
-                    mv = memoryview(buffer)
-                    total = len(mv)
-                    offset = 0
-                    chunk_size = PACKET_MAX_SIZE - PACKET_MIN_SIZE - 2
-                    first = True
-                    while offset < total:
-                        chunk = mv[offset:offset+chunk_size]
-                        context_len_bytes = struct.pack("<H", len(chunk))
-                        payload = path_len_bytes + path_bytes + context_len_bytes + chunk.tobytes()
-
-                        if first:
-                            await self.fuse_mod_input(0x05, payload)
-                            first = False
-                        else:
-                            await self.fuse_mod_input(0x06, payload)
-                        offset += chunk_size
+                self.metrics.inc("module_reads_total", module=self.module_name(path))
+                if buffer and latest.put(buffer):
+                    self.push_superseded += 1
         except Exception as e:
             if self.debug_mode:
                 print(f"Error in file_receive_data for {path}: {e}")
+
+    async def file_push_data(self, path: str, file: VF_File, latest: LatestValue) -> None:
+        """按文件的推送策略（未设置时使用管理器的策略）推送最新版本的内容"""
+        loop = asyncio.get_running_loop()
+        last_push = float("-inf")
+        try:
+            path_bytes = path.encode()
+            while self.running and self.index.is_live(path):
+                await latest.wait()
+                # 重新加载配置可能更换策略，每次推送前重新取
+                policy = file.update_policy or self.update_policy
+                if policy is not None:
+                    # 等待期间到达的新版本会推迟 debounce，但不超过 max_latency
+                    delay = policy.delay(loop.time(), latest.first, latest.updated, last_push)
+                    while delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = policy.delay(loop.time(), latest.first, latest.updated, last_push)
+                buffer = latest.take()
+                last_push = loop.time()
+                await self.push_content(path, path_bytes, file, buffer)
+        except Exception as e:
+            if self.debug_mode:
+                print(f"Error in file_push_data for {path}: {e}")
     
     async def file_receive_data_append(self, path: str, file: VF_File) -> None:
-        """接收文件追加数据，分批处理，使用memoryview优化，发送格式为: path_len(2) path context_len(2) context"""
+        """接收文件追加数据，全部分片追加"""
         try:
             path_bytes = path.encode()
-            path_len_bytes = struct.pack("<H", len(path_bytes))
-            while self.running and path in self.file_cache_table:
+            while self.running and self.index.is_live(path):
                 buffer = await file.readAppend()
                 if buffer:
-                    mv = memoryview(buffer)
-                    total = len(mv)
-                    offset = 0
-                    chunk_size = PACKET_MAX_SIZE - PACKET_MIN_SIZE - 2
-                    while offset < total:
-                        chunk = mv[offset:offset+chunk_size]
-                        context_len_bytes = struct.pack("<H", len(chunk))
-                        payload = path_len_bytes + path_bytes + context_len_bytes + chunk.tobytes()
-                        await self.fuse_mod_input(0x06, payload)
-                        offset += chunk_size
+                    # 追加后内容与基准和快照都不一致，下次完整推送
+                    self.pushed_content.pop(path, None)
+                    self.pushed_digest.pop(path, None)
+                    if self.snapshot is not None:
+                        self.snapshot_dirty[path] = None
+                    await self.send_content(path, path_bytes, buffer, 0x06)
 
         except Exception as e:
             if self.debug_mode:
@@ -308,28 +1222,133 @@ class FuseModManager(VF_Module):
     async def run(self) -> None:
         """运行管理器"""
 
-        # 遍历模块树并创建目录
-        def mkdir_callback(path: str, module: VF_Module):
-            asyncio.create_task(self.mkdir(path))
+        # 统计文件随其他文件一起创建
+        if self.metrics_interval > 0 and STATS_MODULE_NAME not in self.register_module_table:
+            self.register_module(STATS_MODULE_NAME, StatsModule(self.global_table, self.metrics, self.metrics_interval))
 
-        def file_create_callback(path: str, file: VF_File):
-            self.internal_create(path, file)
-        
-        self.tree_module(callback=mkdir_callback)
-        self.tree_file(callback=file_create_callback)
+        # 遍历模块树，用批量包创建目录和文件
+        module_list: List[Tuple[str, VF_Module]] = []
+        file_list: List[Tuple[str, VF_File]] = []
+        self.tree_module(module_list)
+        self.tree_file(file_list)
+        self.tree_started = True
+
+        async def bootstrap():
+            async with self.reload_lock:
+                await self.mkdir_batch(path for path, _ in module_list)
+                await self.internal_create_batch(file_list, warm=True)
+
+        asyncio.create_task(bootstrap())
+        if self.snapshot is not None:
+            asyncio.create_task(self.snapshot_writer())
+
+        # 分片模式下由 FuseModCluster 统一处理 SIGHUP
+        if self.cluster is None:
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.reload_modules()))
+            except (NotImplementedError, RuntimeError):
+                pass
+        if self.config_watch_interval > 0:
+            asyncio.create_task(self.watch_config())
 
         # 开始监听
         await self.listen()
     
-    async def cleanup(self) -> None:
-        """清理资源"""
+    async def snapshot_writer(self) -> None:
+        """定期把推送成功的内容写入快照"""
+        while self.running:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.flush_snapshot()
+
+    async def flush_snapshot(self) -> None:
+        """在线程中写入或删除有变化的快照"""
+        if self.snapshot is None:
+            return
+        async with self.snapshot_lock:
+            if not self.snapshot_dirty:
+                return
+            entries, self.snapshot_dirty = self.snapshot_dirty, {}
+            failed = await asyncio.get_running_loop().run_in_executor(None, self.snapshot.save_all, entries)
+            if failed and self.debug_mode:
+                print(f"Failed to save {failed} snapshot entries")
+
+    async def reload_modules(self) -> Tuple[int, int]:
+        """重新读取各模块的配置，只删除和创建有变化的文件，返回 (创建的文件数, 删除的文件数)"""
+        async with self.reload_lock:
+            module_list: List[Tuple[str, VF_Module]] = [("", self)]
+            self.tree_module(module_list)
+
+            created: List[Tuple[str, VF_File]] = []
+            removed = 0
+            for prefix, module in module_list:
+                try:
+                    added, gone = module.reload_config()
+                except Exception as e:
+                    # 配置可能正在被写入，保留原状态，下次变化时再加载
+                    if self.debug_mode:
+                        print(f"Error reloading config for {prefix or '/'}: {e}")
+                    continue
+
+                # reload_config 只更新模块的 register_file_table，这里同步路径索引
+                for name in gone:
+                    if await self.rm(f"{prefix}/{name}") == 0:
+                        removed += 1
+                    self.index.remove_file(f"{prefix}/{name}")
+                for name, file in added:
+                    self.index.add_file(f"{prefix}/{name}", module, file)
+                    created.append((f"{prefix}/{name}", file))
+
+            results = await self.internal_create_batch(created)
+            count = sum(1 for code in results if code == 0)
+
+        if self.debug_mode:
+            print(f"Config reloaded: {count} created, {removed} removed")
+        return count, removed
+
+    def config_signature(self) -> Tuple[Tuple[str, int, int], ...]:
+        """配置目录中 json 文件的 (文件名, 修改时间, 大小)"""
+        config_dir = self.get_global_table()["config_dir"]
+        try:
+            entries = [entry for entry in os.scandir(config_dir) if entry.name.endswith(".json")]
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in entries))
+        except OSError:
+            return ()
+
+    async def watch_config(self) -> None:
+        """定期检查配置目录，json 文件变化时重新加载"""
+        signature = self.config_signature()
+        while self.running:
+            await asyncio.sleep(self.config_watch_interval)
+            current = self.config_signature()
+            if current != signature:
+                signature = current
+                await self.reload_modules()
+
+    async def cleanup(self, exit_process: bool = True) -> None:
+        """清理资源，exit_process 为 True 时最后退出进程（分片模式下先清理其他分片）
+
+        调用方可能是随后被取消的数据接收任务，关闭和退出在单独的任务中进行，不受调用方取消的影响。"""
+        if self.closed:
+            return
+        self.closed = True
         self.running = False
-        
+        self.cleanup_task = asyncio.ensure_future(self.teardown(exit_process))
+        await asyncio.shield(self.cleanup_task)
+
+    async def teardown(self, exit_process: bool) -> None:
         # 取消所有待处理的请求
         for future in self.pending_requests.values():
             if not future.done():
                 future.set_exception(Exception("Cleanup"))
         
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+        self.supervisor.cancel_all()
+
+        # 等待已提交的写入完成，保存快照
+        await asyncio.gather(*(queue.close(WRITE_DRAIN_TIMEOUT) for queue in self.write_queues.values()))
+        await self.flush_snapshot()
+
         # 关闭管道
         if self.pipe_in:
             await self.pipe_in.close()
@@ -348,7 +1367,10 @@ class FuseModManager(VF_Module):
             print("Cleanup completed")
         
         # 退出进程
-        os._exit(1)
+        if exit_process:
+            if self.cluster is not None:
+                await self.cluster.cleanup()
+            os._exit(1)
     
     def set_debug_mode(self, enabled: bool) -> None:
         """设置调试模式"""
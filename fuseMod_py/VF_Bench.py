@@ -0,0 +1,246 @@
+"""性能基准测试
+
+用法: python -m fuseMod_py.VF_Bench [名称...]
+不带参数时运行全部基准。"""
+
+import asyncio
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict
+
+from .VF_Tools import crc16_ccitt
+from .VF_Crc import CRC16_IMPL, available_crc16
+from .VF_Pipe import open_pipes
+from .VF_Codec import FrameEncoder
+from .VF_Buffer import FileBuffer
+from .VF_Defined import PACKET_HEADER, PACKET_RESPONSE_HEADER, PACKET_TAIL, PACKET_HEADER_SIZE
+
+
+def build_packet(header: bytes, type: int, request_id: int, data: bytes) -> bytes:
+    packet = header + struct.pack("<HHH", type, request_id, len(data)) + data
+    return packet + struct.pack("<H", crc16_ccitt(packet)) + PACKET_TAIL
+
+
+def drain_fifo(path: str, total: int) -> None:
+    """模拟 helper 读端：尽快读走 total 字节"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        while total > 0:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            total -= len(data)
+    finally:
+        os.close(fd)
+
+
+def fill_fifo(path: str, data: bytes) -> None:
+    """模拟 helper 写端：一次性写入全部响应"""
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+async def pipe_round(use_aiofiles: bool, count: int, payload_size: int):
+    directory = tempfile.mkdtemp()
+    pipe_in_path = os.path.join(directory, "FuseModPipeIn")
+    pipe_out_path = os.path.join(directory, "FuseModPipeOut")
+    os.mkfifo(pipe_in_path)
+    os.mkfifo(pipe_out_path)
+
+    request = build_packet(PACKET_HEADER, 0x06, 1, b"\0" * payload_size)
+    response = build_packet(PACKET_RESPONSE_HEADER, 0x06, 1, b"\0")
+
+    drain = threading.Thread(target=drain_fifo, args=(pipe_in_path, len(request) * count))
+    fill = threading.Thread(target=fill_fifo, args=(pipe_out_path, response * count))
+    drain.start()
+    fill.start()
+
+    pipe_in, pipe_out = await open_pipes(pipe_in_path, pipe_out_path, use_aiofiles)
+
+    # 发送：每包 write + flush，与 fuse_mod_send 一致
+    start = time.perf_counter()
+    for _ in range(count):
+        await pipe_in.write(request)
+        await pipe_in.flush()
+    send_time = time.perf_counter() - start
+
+    # 接收：包头、数据、CRC+包尾分三次读取，与 listen 一致
+    start = time.perf_counter()
+    for _ in range(count):
+        header = await pipe_out.read(PACKET_HEADER_SIZE)
+        size = struct.unpack("<H", header[6:8])[0]
+        await pipe_out.read(size)
+        await pipe_out.read(4)
+    recv_time = time.perf_counter() - start
+
+    await pipe_in.close()
+    await pipe_out.close()
+    drain.join()
+    fill.join()
+    os.unlink(pipe_in_path)
+    os.unlink(pipe_out_path)
+    os.rmdir(directory)
+
+    return count / send_time, count / recv_time
+
+
+def bench_pipe(count: int = 20000, payload_size: int = 64) -> None:
+    """管道收发吞吐: aiofiles 与 asyncio 原生管道传输对比"""
+    for name, use_aiofiles in (("aiofiles", True), ("transport", False)):
+        try:
+            send_rate, recv_rate = asyncio.run(pipe_round(use_aiofiles, count, payload_size))
+        except ImportError as e:
+            print(f"pipe/{name}: skipped ({e})")
+            continue
+        print(f"pipe/{name}: send {send_rate:,.0f} packets/s, recv {recv_rate:,.0f} packets/s")
+
+
+def bench_crc(size: int = 1 << 20, seconds: float = 0.5) -> None:
+    """CRC16 各实现每 MB 的耗时"""
+    data = os.urandom(size)
+    for name, function in available_crc16().items():
+        count = 0
+        start = time.perf_counter()
+        while True:
+            function(data)
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                break
+        per_mb = elapsed / count / (size / (1 << 20))
+        active = " (active)" if name == CRC16_IMPL else ""
+        print(f"crc/{name}{active}: {per_mb * 1e3:.3f} ms/MB, {1 / per_mb:,.0f} MB/s")
+
+
+async def startup_round(mount_point: str) -> Dict[str, float]:
+    from .FuseModManager import FuseModManager
+    from .VF_File import VF_File
+
+    manager = FuseModManager(mount_point, mount_point, False)
+    await manager.init(mount_point)
+    listen = asyncio.create_task(manager.listen())
+
+    # 从启动子进程到文件在挂载点可见
+    manager.internal_create("/bench", VF_File(VF_File.FLAG_READ))
+    path = os.path.join(mount_point, "modules", "bench")
+    while not os.path.exists(path):
+        await asyncio.sleep(0.001)
+    latency = manager.startup_latency()
+    latency["visible"] = time.perf_counter() - manager.startup_started
+
+    listen.cancel()
+    if manager.process is not None:
+        manager.process.terminate()
+        await manager.process.wait()
+    return latency
+
+
+def bench_startup(rounds: int = 5) -> None:
+    """启动耗时: 从启动 fuseMod 到第一个文件在挂载点可见，需要可用的 FUSE"""
+    helper = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fuseMod")
+    if not os.access(helper, os.X_OK) or not os.path.exists("/dev/fuse"):
+        print("startup: skipped (fuseMod or /dev/fuse not available)")
+        return
+
+    for _ in range(rounds):
+        mount_point = tempfile.mkdtemp()
+        latency = asyncio.run(startup_round(mount_point))
+        print("startup: " + ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in latency.items()))
+
+
+def bench_codec(count: int = 20000, payload_sizes=(3000, 64 << 10)) -> None:
+    """帧编码: 拼接 bytes 与 encode_parts 对比，分别测完整 CRC 和可信管道（不计算 CRC）"""
+    path_bytes = b"/module/file"
+
+    for payload_size in payload_sizes:
+        content = memoryview(os.urandom(payload_size))
+        prefix = struct.pack("<H", len(path_bytes)) + path_bytes + struct.pack("<I", len(content))
+        rounds = max(count * 3000 // payload_size, 100)
+
+        for trusted in (False, True):
+            encoder = FrameEncoder(version=2)
+            encoder.trusted = trusted
+
+            def concat():
+                payload = prefix + content.tobytes()
+                packet = PACKET_HEADER + struct.pack("<HHI", 6, 1, len(payload)) + payload
+                return packet + struct.pack("<H", 0 if trusted else crc16_ccitt(packet)) + PACKET_TAIL
+
+            cases = (
+                ("concat", concat),
+                ("encode_parts", lambda: encoder.encode_parts(6, 1, (prefix, content))),
+            )
+            for name, function in cases:
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    function()
+                elapsed = time.perf_counter() - start
+                print(f"codec/{name}: {rounds / elapsed:,.0f} frames/s ({payload_size} byte payload, "
+                      f"crc {'trusted' if trusted else 'full'})")
+
+
+class ConcatBuffer():
+    """原 SimpleFile 的写入方式: 每次写入切片拼接出新的 bytes，作为对照"""
+
+    def __init__(self) -> None:
+        self.content = b""
+
+    def write(self, buffer: bytes, offset: int) -> None:
+        if offset + len(buffer) > len(self.content):
+            self.content += b"\0" * (offset + len(buffer) - len(self.content))
+        self.content = self.content[:offset] + buffer + self.content[offset + len(buffer):]
+
+    def getvalue(self) -> bytes:
+        return self.content
+
+
+def bench_buffer(size: int = 4 << 20, chunk: int = 4096) -> None:
+    """可写文件内容: 顺序写入和随机写入，切片拼接与 FileBuffer 对比"""
+    data = os.urandom(chunk)
+    count = size // chunk
+    random_offsets = [int.from_bytes(os.urandom(4), "little") % (size - chunk) for _ in range(count)]
+    patterns = (
+        ("sequential", [index * chunk for index in range(count)]),
+        # 先顺序写满，再随机覆盖
+        ("random", [index * chunk for index in range(count)] + random_offsets),
+    )
+
+    for pattern, offsets in patterns:
+        results = {}
+        for name, factory in (("concat", ConcatBuffer), ("FileBuffer", FileBuffer)):
+            buffer = factory()
+            start = time.perf_counter()
+            for offset in offsets:
+                buffer.write(data, offset)
+            elapsed = time.perf_counter() - start
+            results[name] = buffer.getvalue()
+            print(f"buffer/{pattern}/{name}: {len(offsets)} writes of {chunk} bytes to {size >> 20} MiB, "
+                  f"{elapsed * 1000:.1f} ms, {len(offsets) * chunk / elapsed / (1 << 20):,.0f} MB/s")
+        assert results["concat"] == results["FileBuffer"]
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "pipe": bench_pipe,
+    "crc": bench_crc,
+    "startup": bench_startup,
+    "codec": bench_codec,
+    "buffer": bench_buffer,
+}
+
+
+def main(names) -> None:
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Optional
+from .VF_File import VF_File
+
+
+class FileBuffer():
+    """可写文件的内存内容
+
+    内容保存在一个 bytearray 中，写入范围内的部分原地覆盖，超出末尾的部分追加（bytearray 按比例预留空间，
+    顺序写入为均摊 O(1)）；写入位置超过末尾时中间的空洞补 0。
+    view 返回的 memoryview 不复制内容，在下一次写入前有效。"""
+
+    def __init__(self, content: bytes = b"") -> None:
+        self.data = bytearray(content)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def write(self, buffer, offset: int) -> int:
+        """在 offset 处写入 buffer，返回写入后的长度"""
+        try:
+            self.splice(buffer, offset)
+        except BufferError:
+            # 仍有 view 返回的视图引用内容，不能改变长度，复制后再写入，旧视图保持原内容
+            self.data = bytearray(self.data)
+            self.splice(buffer, offset)
+        return len(self.data)
+
+    def splice(self, buffer, offset: int) -> None:
+        size = len(self.data)
+        if offset > size:
+            self.data.extend(bytes(offset - size))
+        self.data[offset:offset + len(buffer)] = buffer
+
+    def truncate(self, size: int) -> None:
+        """截断或补 0 到 size 字节"""
+        if size >= len(self.data):
+            self.write(b"", size)
+            return
+        try:
+            del self.data[size:]
+        except BufferError:
+            self.data = self.data[:size]
+
+    def view(self, offset: int = 0, size: Optional[int] = None) -> memoryview:
+        """读取 [offset, offset+size) 的视图，size 为 None 时读到末尾"""
+        end = len(self.data) if size is None else min(offset + size, len(self.data))
+        return memoryview(self.data)[offset:end]
+
+    def getvalue(self) -> bytes:
+        """当前内容的快照"""
+        return bytes(self.data)
+
+    def clear(self) -> None:
+        self.data = bytearray()
+
+
+class BufferedVF_File(VF_File):
+    """内容保存在 FileBuffer 中的可写文件基类
+
+    写入直接修改缓冲区，read 在内容变化后返回内容快照，由管理器推送给 FUSE 模块。"""
+
+    def __init__(self, flag=VF_File.FLAG_READ | VF_File.FLAG_WRITE, content: bytes = b"", **kwargs) -> None:
+        super().__init__(flag, **kwargs)
+        self.buffer = FileBuffer(content)
+        self.changed = asyncio.Event()
+        if content:
+            self.changed.set()
+
+    def write(self, buffer: bytes, offset: int) -> None:
+        self.buffer.write(buffer, offset)
+        self.changed.set()
+
+    async def read(self) -> bytes:
+        await self.changed.wait()
+        self.changed.clear()
+        return self.buffer.getvalue()
+
+    async def rm(self) -> None:
+        self.buffer.clear()
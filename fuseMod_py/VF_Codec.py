@@ -0,0 +1,232 @@
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+from .VF_Tools import crc16_ccitt
+from .VF_Defined import PACKET_HEADER, PACKET_HEADER_V2, PACKET_RESPONSE_HEADER, PACKET_RESPONSE_HEADER_V2, PACKET_TAIL, PACKET_HEADER_SIZE, PACKET_HEADER_SIZE_V2, PACKET_MAX_SIZE, PACKET_MAX_FRAME_LIMIT
+
+# 与 fuseMod_tools.c 中 create_response_packet / get_packet_size 的布局一致，所有字段为小端
+# 包头中 header(2) 之后的字段，版本 1: type(2) id(2) size(2)，版本 2: type(2) id(2) size(4)
+FRAME_FIELDS = struct.Struct("<HHH")
+FRAME_FIELDS_V2 = struct.Struct("<HHI")
+FRAME_CRC = struct.Struct("<H")
+
+# 完整包头和包尾: header(2) type(2) id(2) size，crc(2) tail(2)
+FRAME_HEADER = struct.Struct("<2sHHH")
+FRAME_HEADER_V2 = struct.Struct("<2sHHI")
+FRAME_TRAILER = struct.Struct("<H2s")
+
+# 数据中的字段
+PATH_LEN = struct.Struct("<H")
+CONTENT_LEN = struct.Struct("<H")
+CONTENT_LEN_V2 = struct.Struct("<I")
+CREATE_FIELDS = struct.Struct("<IH")
+SHM_DESCRIPTOR = struct.Struct("<QI")
+WRITE_TRAILER = struct.Struct("<IB")
+SHM_WRITE_FIELDS = struct.Struct("<QIIIB")
+PATCH_OFFSET = struct.Struct("<I")
+TTL_MS = struct.Struct("<I")
+
+
+class FrameEncoder():
+    """帧编码器
+
+    数据以若干段 (parts) 传入，CRC 分段计算，内容不需要先拼接成一个 bytes。
+    encode_parts 返回可直接交给 os.writev 的分段列表。
+    可信本地管道模式下每 crc_sample 个包计算一次 CRC，其余填 0。"""
+
+    def __init__(self, header: bytes = PACKET_HEADER, header_v2: bytes = PACKET_HEADER_V2, version: int = 1) -> None:
+        self.headers = {1: header, 2: header_v2}
+        self.version = version
+        self.trusted = False
+        self.crc_sample = 0
+        self.crc_counter = 0
+
+    def header_struct(self) -> struct.Struct:
+        return FRAME_HEADER_V2 if self.version >= 2 else FRAME_HEADER
+
+    def frame_size(self, data_size: int) -> int:
+        """数据长度为 data_size 的包的总长度"""
+        return self.header_struct().size + data_size + FRAME_TRAILER.size
+
+    def frame_crc(self, header: bytes, parts: Sequence) -> int:
+        if self.trusted:
+            self.crc_counter += 1
+            if not self.crc_sample or self.crc_counter % self.crc_sample:
+                return 0
+        crc = crc16_ccitt(header)
+        for part in parts:
+            crc = crc16_ccitt(part, crc)
+        return crc
+
+    def encode_parts(self, type: int, request_id: int, parts: Sequence) -> List:
+        """编码为分段列表: [包头, *parts, 包尾]，parts 不会被复制"""
+        header = self.header_struct().pack(self.headers[2 if self.version >= 2 else 1], type, request_id,
+                                           sum(len(part) for part in parts))
+        trailer = FRAME_TRAILER.pack(self.frame_crc(header, parts), PACKET_TAIL)
+        return [header, *parts, trailer]
+
+
+def path_parts(path_bytes: bytes) -> bytes:
+    """path_len(2) path"""
+    return PATH_LEN.pack(len(path_bytes)) + path_bytes
+
+
+def content_parts(path_bytes: bytes, content, version: int) -> List:
+    """0x05/0x06 数据: path_len(2) path content_len content，版本 2 的 content_len 为 4 字节"""
+    content_len = CONTENT_LEN_V2 if version >= 2 else CONTENT_LEN
+    return [path_parts(path_bytes) + content_len.pack(len(content)), content]
+
+
+def patch_parts(path_bytes: bytes, offset: int, content, version: int) -> List:
+    """0x0B 数据: offset(4) path_len(2) path content_len content"""
+    content_len = CONTENT_LEN_V2 if version >= 2 else CONTENT_LEN
+    return [PATCH_OFFSET.pack(offset) + path_parts(path_bytes) + content_len.pack(len(content)), content]
+
+
+def truncate_payload(path_bytes: bytes, size: int) -> bytes:
+    """0x0C 数据: size(4) path_len(2) path"""
+    return CREATE_FIELDS.pack(size, len(path_bytes)) + path_bytes
+
+
+def create_payload(path_bytes: bytes, flag: int, ttl_ms: Optional[int] = None) -> bytes:
+    """0x02 数据: flag(4) path_len(2) path，按需内容的文件再带 ttl_ms(4)"""
+    payload = CREATE_FIELDS.pack(flag, len(path_bytes)) + path_bytes
+    if ttl_ms is not None:
+        payload += TTL_MS.pack(ttl_ms)
+    return payload
+
+
+def shm_content_payload(path_bytes: bytes, pos: int, length: int) -> bytes:
+    """0x05/0x06 共享内存描述符: path_len(2) path pos(8) length(4)"""
+    return path_parts(path_bytes) + SHM_DESCRIPTOR.pack(pos, length)
+
+
+def decode_write(data: memoryview, version: int) -> Tuple[str, memoryview, int, Optional[Tuple[int, int]]]:
+    """解析 0x07 写入通知: path_len(2) path content_len content offset(4) [write_id(4) flags(1)]
+
+    返回 (path, content, offset, (write_id, flags))，旧格式没有 write_id 时最后一项为 None"""
+    content_len = CONTENT_LEN_V2 if version >= 2 else CONTENT_LEN
+    path_len = PATH_LEN.unpack_from(data, 0)[0]
+    path = str(data[2:2 + path_len], "utf-8")
+    position = 2 + path_len
+    size = content_len.unpack_from(data, position)[0]
+    position += content_len.size
+    content = data[position:position + size]
+    position += size
+    offset = CONTENT_LEN_V2.unpack_from(data, position)[0]
+    position += 4
+    if len(data) < position + WRITE_TRAILER.size:
+        return path, content, offset, None
+    return path, content, offset, WRITE_TRAILER.unpack_from(data, position)
+
+
+def decode_shm_write(data: memoryview) -> Tuple[str, int, int, int, int, int]:
+    """解析共享内存写入通知: path_len(2) path pos(8) length(4) offset(4) write_id(4) flags(1)
+
+    返回 (path, pos, length, offset, write_id, flags)"""
+    path_len = PATH_LEN.unpack_from(data, 0)[0]
+    path = str(data[2:2 + path_len], "utf-8")
+    return (path, *SHM_WRITE_FIELDS.unpack_from(data, 2 + path_len))
+
+
+class FrameDecoder():
+    """增量帧解码器
+
+    在一个不断增长的 bytearray 上解析数据包，一次读取可以解出多个包。
+    按包头魔数区分版本 1 和版本 2 格式，两种格式可以混合出现。
+    包头、包尾、长度或 CRC 不合法时向后扫描到下一个包头重新同步。
+    返回的数据是指向内部缓冲区的 memoryview，只在下一次 feed 之前有效，
+    需要保留的数据由调用方自行复制。"""
+
+    def __init__(self, header: bytes = PACKET_RESPONSE_HEADER, header_v2: bytes = PACKET_RESPONSE_HEADER_V2,
+                 max_size: int = PACKET_MAX_FRAME_LIMIT) -> None:
+        # 两个版本的包头首字节相同，用首字节扫描，用第二个字节区分版本
+        self.magic = header[0:1]
+        self.versions = {header[1]: 1, header_v2[1]: 2}
+        self.max_size = max_size
+        self.buffer = bytearray()
+        self.start = 0
+
+        # 可信本地管道模式下 CRC 为 0 表示发送方未计算，跳过校验
+        self.trusted = False
+
+        # 统计重新同步的次数和丢弃的字节数
+        self.resync_count = 0
+        self.discarded_bytes = 0
+
+    def feed(self, data: bytes) -> None:
+        """追加读到的数据，并回收已解析的部分"""
+        if self.start:
+            try:
+                del self.buffer[:self.start]
+            except BufferError:
+                # 仍有调用方持有旧缓冲区的 memoryview，换一个新缓冲区，旧的由持有者保留
+                self.buffer = self.buffer[self.start:]
+            self.start = 0
+        self.buffer += data
+
+    def pending(self) -> int:
+        """尚未解析的字节数"""
+        return len(self.buffer) - self.start
+
+    def resync(self) -> None:
+        """丢弃当前位置，扫描到下一个可能的包头"""
+        buffer = self.buffer
+        index = buffer.find(self.magic, self.start + 1)
+        if index < 0:
+            index = len(buffer)
+        self.resync_count += 1
+        self.discarded_bytes += index - self.start
+        self.start = index
+
+    def frames(self) -> Iterator[Tuple[int, int, int, memoryview]]:
+        """依次返回缓冲区中完整的包: (version, type, request_id, payload)"""
+        buffer = self.buffer
+        view = memoryview(buffer)
+        magic = self.magic[0]
+
+        try:
+            while len(buffer) - self.start >= 2:
+                start = self.start
+
+                version = self.versions.get(buffer[start + 1]) if buffer[start] == magic else None
+                if version is None:
+                    self.resync()
+                    continue
+
+                if version == 1:
+                    header_size = PACKET_HEADER_SIZE
+                    max_size = PACKET_MAX_SIZE
+                    fields = FRAME_FIELDS
+                else:
+                    header_size = PACKET_HEADER_SIZE_V2
+                    max_size = self.max_size
+                    fields = FRAME_FIELDS_V2
+
+                if len(buffer) - start < header_size:
+                    # 包头不完整，等待更多数据
+                    return
+
+                type, request_id, size = fields.unpack_from(buffer, start + 2)
+                if size > max_size - header_size - 4:
+                    self.resync()
+                    continue
+
+                body_end = start + header_size + size
+                end = body_end + 4
+                if end > len(buffer):
+                    # 包不完整，等待更多数据
+                    return
+
+                if buffer[end - 2:end] != PACKET_TAIL:
+                    self.resync()
+                    continue
+
+                crc = FRAME_CRC.unpack_from(buffer, body_end)[0]
+                if not (crc == 0 and self.trusted) and crc != crc16_ccitt(view[start:body_end]):
+                    self.resync()
+                    continue
+
+                self.start = end
+                yield version, type, request_id, view[start + header_size:body_end]
+        finally:
+            view.release()
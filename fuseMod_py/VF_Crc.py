@@ -0,0 +1,64 @@
+import binascii
+from typing import Callable, Dict, List, Tuple
+
+# CRC16-CCITT (XModem): 多项式 0x1021，初值 0，不反转，不异或输出
+# 各实现在导入时用标准校验值验证，选择第一个通过验证的实现
+# 所有实现都接受 crc 参数，可以分段计算: crc16(b, crc16(a)) == crc16(a + b)
+CRC16_CHECK_INPUT = b"123456789"
+CRC16_CHECK_VALUE = 0x31C3
+
+
+def make_crc16_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+
+CRC16_TABLE = make_crc16_table()
+
+
+def crc16_binascii(data, crc: int = 0) -> int:
+    """标准库 C 实现"""
+    return binascii.crc_hqx(data, crc)
+
+
+def crc16_python(data, crc: int = 0) -> int:
+    """纯 Python 查表实现，只作为最后的回退"""
+    table = CRC16_TABLE
+    for byte in bytes(data):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def available_crc16() -> Dict[str, Callable[..., int]]:
+    """按优先级返回可用的实现: 名称 -> 函数"""
+    implementations: Dict[str, Callable[..., int]] = {"binascii": crc16_binascii}
+
+    try:
+        import crcmod
+        implementations["crcmod"] = crcmod.mkCrcFun(0x11021, rev=False, initCrc=0, xorOut=0)
+    except ImportError:
+        pass
+
+    implementations["python"] = crc16_python
+    return implementations
+
+
+def select_crc16() -> Tuple[str, Callable[..., int]]:
+    """选择第一个通过校验值验证的实现"""
+    for name, function in available_crc16().items():
+        try:
+            if (function(CRC16_CHECK_INPUT) == CRC16_CHECK_VALUE
+                    and function(memoryview(CRC16_CHECK_INPUT)) == CRC16_CHECK_VALUE
+                    and function(CRC16_CHECK_INPUT[4:], function(CRC16_CHECK_INPUT[:4])) == CRC16_CHECK_VALUE):
+                return name, function
+        except Exception:
+            continue
+    return "python", crc16_python
+
+
+CRC16_IMPL, crc16_ccitt = select_crc16()
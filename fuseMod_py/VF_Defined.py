@@ -9,7 +9,118 @@ ERR_INVALID_PACKET = 6
 ERR_TIMEOUT = 7
 
 PACKET_HEADER = b"\x54\x32"
+PACKET_RESPONSE_HEADER = b"\x54\x02"
 PACKET_TAIL = b"\x23\x45"
 
+# 包头: header(2) type(2) id(2) size(2)
+PACKET_HEADER_SIZE = 8
 PACKET_MAX_SIZE = 3072
-PACKET_MIN_SIZE = 10
+PACKET_MIN_SIZE = 12
+
+# 协议版本 2: 包头 0x5433（响应 0x5403），长度字段为 32 位，包头共 10 字节
+# 启动时双方使用版本 1 格式，由 0x09 协商包决定是否切换，版本 1 作为回退
+PROTOCOL_VERSION = 2
+PACKET_HEADER_V2 = b"\x54\x33"
+PACKET_RESPONSE_HEADER_V2 = b"\x54\x03"
+PACKET_HEADER_SIZE_V2 = 10
+PACKET_MIN_SIZE_V2 = 14
+PACKET_MAX_FRAME_LIMIT = 1 << 20
+
+# 协商标志: 可信本地管道，CRC 为 0 的包跳过校验，发送方每 crc_sample 个包计算一次 CRC（0 为不计算）
+NEGOTIATE_FLAG_TRUSTED = 1 << 0
+
+# 单个批量包最多包含的子操作数
+BATCH_MAX_OPS = 1024
+
+# 0x07 写入通知的分片标志，同一次内核写入的分片共用一个 write_id
+WRITE_FLAG_FIRST = 1 << 0
+WRITE_FLAG_LAST = 1 << 1
+# 未收到最后一片的写入保留 PENDING_WRITE_TIMEOUT 秒，同时重组的写入最多 PENDING_WRITE_MAX 个，超出时丢弃最早的
+PENDING_WRITE_TIMEOUT = 30.0
+PENDING_WRITE_MAX = 64
+
+# 共享内存数据通道: 包类型带上 PACKET_TYPE_SHM 时，内容在共享内存中，包内只有 pos(8) length(4) 描述符
+# 每个方向一个环形缓冲区，区域开头 SHM_HEADER_SIZE 字节为头部，DEFAULT_SHM_SIZE 为数据区大小，0 表示不使用
+PACKET_TYPE_SHM = 0x8000
+SHM_HEADER_SIZE = 64
+DEFAULT_SHM_SIZE = 16 << 20
+
+# 监听循环每次从管道读取的最大字节数
+PIPE_READ_SIZE = 65536
+
+# 请求ID为 16 位，0 保留给 helper 主动发出的通知
+REQUEST_ID_MAX = 0xFFFF
+
+# 默认允许同时在途（已发送未确认）的请求数
+DEFAULT_MAX_INFLIGHT = 16
+
+# 发送队列最多缓存的包数，写任务每批最多写出的包数
+DEFAULT_SEND_QUEUE_SIZE = 64
+SEND_BATCH_MAX = 64
+REQUEST_TIMEOUT = 3.0
+
+# FUSE 模块挂载完成后发出就绪包 0x0F: version(2) max_frame_size(4) capabilities(4)
+# HELLO_TIMEOUT 为启动时等待打开管道和就绪包的最长时间
+HELLO_TIMEOUT = 10.0
+HELLO_CAP_BATCH = 1 << 0
+HELLO_CAP_SHM = 1 << 1
+HELLO_CAP_TRUSTED_CRC = 1 << 2
+HELLO_CAP_WRITE_ID = 1 << 3
+HELLO_CAP_PATCH = 1 << 4
+
+# 局部修改: 0x0B offset(4) path_len(2) path content_len content，0x0C size(4) path_len(2) path
+# 不小于 PATCH_MIN_SIZE 的只读文件保留上次推送的内容，下次推送时按 PATCH_SCAN_SIZE / PATCH_BLOCK_SIZE 比较，
+# 需要发送的字节数（含每个区间的包开销）超过新内容的 PATCH_MAX_RATIO 时仍完整推送
+PATCH_MIN_SIZE = 4096
+PATCH_SCAN_SIZE = 4096
+PATCH_BLOCK_SIZE = 64
+PATCH_MAX_RATIO = 0.5
+
+# 跳过未变化内容的推送时使用的摘要长度（blake2b）
+PUSH_DIGEST_SIZE = 16
+HELLO_CAP_LAZY = 1 << 5
+HELLO_CAP_FILE_EVENTS = 1 << 6
+HELLO_CAP_WRITE_HOLD = 1 << 7
+
+# 0x0E 文件事件通知: event(1) path，只对以写方式打开的文件发出
+FILE_EVENT_FLUSH = 1
+FILE_EVENT_RELEASE = 2
+FILE_EVENT_FSYNC = 3
+
+# 按需内容 (VF_File.FLAG_LAZY) 的默认有效期（秒），超过后打开或读取时返回旧内容并在后台更新
+DEFAULT_LAZY_TTL = 60.0
+
+# 检查配置目录中 json 文件是否变化的间隔（秒），变化后重新加载模块配置，0 为只在收到 SIGHUP 时重新加载
+DEFAULT_CONFIG_WATCH_INTERVAL = 2.0
+
+# 分片配置文件 config_dir/shards.json: {"shards": 分片数, "assignment": {顶层模块名: 分片序号}}
+# 分片 0 挂载在指定的目录，分片 k 挂载在同级的 <目录>.shards/k（不能放在分片 0 的挂载目录内），
+# 未指定的模块按模块名的 CRC32 分配
+SHARD_CONFIG_NAME = "shards"
+SHARD_DIR_SUFFIX = ".shards"
+
+# 同一文件的写入按顺序逐个执行，每个文件排队的写入达到此数后暂停该文件的写入（0x10 hold(1) path），
+# 排队的写入减少到一半后恢复；FUSE 模块不支持暂停时停止读取管道，直到排队的写入减少到一半
+DEFAULT_MAX_QUEUED_WRITES = 8
+# 选择合并写入的文件，与队尾相接或重叠的写入合并后不超过此字节数
+WRITE_MERGE_MAX = 1 << 20
+# 关闭时等待未完成写入的最长时间（秒）
+WRITE_DRAIN_TIMEOUT = 5.0
+
+# 模块共享的内容存储 (VF_Store.ContentStore)，目录为 data_dir/spill
+# 不小于 SPILL_THRESHOLD 字节的内容直接映射到磁盘，内存中的内容超过 SPILL_MEMORY_BUDGET 字节时换出最久未使用的
+SPILL_DIR = "spill"
+SPILL_THRESHOLD = 1 << 20
+SPILL_MEMORY_BUDGET = 64 << 20
+
+# 启动快照 (VF_Snapshot.SnapshotStore)，目录为 data_dir/snapshot，分片 k 为 data_dir/snapshot.shards/k
+# 推送成功的内容每 DEFAULT_SNAPSHOT_INTERVAL 秒写入一次，0 为不保存快照
+SNAPSHOT_DIR = "snapshot"
+DEFAULT_SNAPSHOT_INTERVAL = 5.0
+
+# 管理器自身的统计，在挂载点下的 .fusemod 目录中: stats 为 JSON，metrics 为 Prometheus 文本格式
+# 每 DEFAULT_METRICS_INTERVAL 秒更新一次，0 为不创建统计文件（计数仍然进行）
+STATS_MODULE_NAME = ".fusemod"
+DEFAULT_METRICS_INTERVAL = 5.0
+# 延迟直方图的桶上限（秒）
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
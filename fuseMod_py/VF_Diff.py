@@ -0,0 +1,32 @@
+from typing import List, Tuple
+from .VF_Defined import PATCH_BLOCK_SIZE, PATCH_SCAN_SIZE
+
+
+def diff_ranges(old, new, block: int = PATCH_BLOCK_SIZE, scan: int = PATCH_SCAN_SIZE) -> List[Tuple[int, int]]:
+    """比较两段内容，返回 new 中需要写入的区间 [(start, end)]，按偏移升序
+
+    先按 scan 大小的段比较，只在不同的段内再按 block 大小细分，相邻的不同块合并为一个区间。
+    new 比 old 长出的部分并入最后一个区间；new 比 old 短时由调用方先截断。"""
+    common = min(len(old), len(new))
+    ranges: List[List[int]] = []
+
+    for start in range(0, common, scan):
+        stop = min(start + scan, common)
+        if old[start:stop] == new[start:stop]:
+            continue
+        for pos in range(start, stop, block):
+            end = min(pos + block, stop)
+            if old[pos:end] == new[pos:end]:
+                continue
+            if ranges and ranges[-1][1] == pos:
+                ranges[-1][1] = end
+            else:
+                ranges.append([pos, end])
+
+    if len(new) > common:
+        if ranges and ranges[-1][1] == common:
+            ranges[-1][1] = len(new)
+        else:
+            ranges.append([common, len(new)])
+
+    return [(start, end) for start, end in ranges]
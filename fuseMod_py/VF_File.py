@@ -1,5 +1,7 @@
 import asyncio
-
+from typing import Optional
+from .VF_Defined import DEFAULT_LAZY_TTL, DEFAULT_MAX_QUEUED_WRITES
+from .VF_Policy import UpdatePolicy
 
 
 class VF_File():
@@ -8,13 +10,26 @@ class VF_File():
     FLAG_READ = (1 << 0)
     FLAG_WRITE = (1 << 1)
     FLAG_COPY_ON_WRITE = (1 << 3)
+    FLAG_LAZY = (1 << 4)
 
-    def __init__(self, flag) -> None:
+    def __init__(self, flag, ttl: float = DEFAULT_LAZY_TTL, max_queued_writes: int = DEFAULT_MAX_QUEUED_WRITES,
+                 coalesce_writes: bool = False) -> None:
         self.Flag = flag
+        self.TTL = ttl
+        self.MaxQueuedWrites = max_queued_writes
+        self.CoalesceWrites = coalesce_writes
+        # 推送策略，为 None 时由所属模块在注册时设置
+        self.update_policy: Optional[UpdatePolicy] = None
 
     def write(self, buffer: bytes, offset: int) -> None:
-        """写入文件"""
+        """写入文件，每次内核写入调用一次，buffer 为完整的写入内容"""
         pass
+
+    async def awrite(self, buffer: bytes, offset: int) -> None:
+        """异步写入文件，管理器等待其完成，默认调用 write
+
+        同一文件的写入按顺序逐个执行，不应等待 FUSE 模块的响应"""
+        self.write(buffer, offset)
     
     async def read(self) -> bytes:
         """读取文件，默认永久阻塞"""
@@ -26,6 +41,18 @@ class VF_File():
         await asyncio.Event().wait()
         return b''
     
+    async def fetch(self) -> bytes:
+        """按需读取文件内容，带 FLAG_LAZY 的文件被打开或读取时调用，默认调用 read"""
+        return await self.read()
+    
+    async def on_flush(self) -> None:
+        """以写方式打开的文件被 flush 或 fsync 时调用，此前的写入都已完成，默认不处理"""
+        pass
+
+    async def on_close(self) -> None:
+        """以写方式打开的文件被关闭（最后一个引用释放）时调用，此前的写入都已完成，默认不处理"""
+        pass
+
     async def rm(self) -> None:
         """删除文件"""
         pass
@@ -40,7 +67,23 @@ class VF_File():
 
     def isCopyOnWrite(self) -> bool:
         return self.Flag & self.FLAG_COPY_ON_WRITE != 0
+
+    def isLazy(self) -> bool:
+        """检查是否按需获取内容"""
+        return self.Flag & self.FLAG_LAZY != 0
+
+    def getTTL(self) -> float:
+        """按需内容的有效期（秒）"""
+        return self.TTL
     
+    def getMaxQueuedWrites(self) -> int:
+        """排队等待执行的写入达到此数后暂停该文件的写入，直到排队的写入减少到一半"""
+        return self.MaxQueuedWrites
+
+    def getCoalesceWrites(self) -> bool:
+        """排队的写入中与队尾相接或重叠的是否合并为一次 awrite，默认每次内核写入调用一次"""
+        return self.CoalesceWrites
+
     def getFlag(self) -> int:
         """获取文件标志"""
         return self.Flag
\ No newline at end of file
@@ -0,0 +1,126 @@
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from .VF_File import VF_File
+
+if TYPE_CHECKING:
+    from .VF_Module import VF_Module
+
+
+class PathEntry():
+    """索引中的一个文件
+
+    module: 所属模块，registered: 是否在模块的 register_file_table 中（否则为运行时创建），
+    live: 是否已在 FUSE 模块中创建"""
+
+    __slots__ = ("module", "file", "registered", "live")
+
+    def __init__(self, module: "Optional[VF_Module]", file: VF_File, registered: bool) -> None:
+        self.module = module
+        self.file = file
+        self.registered = registered
+        self.live = False
+
+
+class PathIndex():
+    """完整路径索引，由根模块持有，模块挂到根模块下后注册、创建、删除都同步更新
+
+    files 和 modules 按完整路径查找，根模块的路径为 ""；
+    children 按目录记录子项名（dict 作为有序集合），用于列举目录和按注册顺序遍历子树。"""
+
+    def __init__(self) -> None:
+        self.files: Dict[str, PathEntry] = {}
+        self.modules: Dict[str, "VF_Module"] = {}
+        self.children: Dict[str, Dict[str, None]] = {}
+
+    @staticmethod
+    def split(path: str) -> Tuple[str, str]:
+        """拆分为 (父目录路径, 名称)，根目录下的项的父目录路径为空字符串"""
+        index = path.rfind("/")
+        return path[:index], path[index + 1:]
+
+    def add_module(self, path: str, module: "VF_Module") -> None:
+        self.modules[path] = module
+        self.children.setdefault(path, {})
+        if path:
+            parent, name = self.split(path)
+            self.children.setdefault(parent, {})[name] = None
+
+    def add_file(self, path: str, module: "Optional[VF_Module]", file: VF_File, registered: bool = True) -> PathEntry:
+        entry = PathEntry(module, file, registered)
+        self.files[path] = entry
+        parent, name = self.split(path)
+        self.children.setdefault(parent, {})[name] = None
+        return entry
+
+    def remove_file(self, path: str) -> Optional[PathEntry]:
+        entry = self.files.pop(path, None)
+        if entry is not None:
+            parent, name = self.split(path)
+            siblings = self.children.get(parent)
+            if siblings is not None:
+                siblings.pop(name, None)
+        return entry
+
+    def get(self, path: str) -> Optional[PathEntry]:
+        return self.files.get(path)
+
+    def module(self, path: str) -> "Optional[VF_Module]":
+        return self.modules.get(path)
+
+    def live(self, path: str) -> Optional[VF_File]:
+        """已在 FUSE 模块中创建的文件"""
+        entry = self.files.get(path)
+        return entry.file if entry is not None and entry.live else None
+
+    def is_live(self, path: str) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry.live
+
+    def set_live(self, path: str, file: VF_File) -> PathEntry:
+        """标记为已创建，运行时创建的文件在此加入索引，所属模块为父目录对应的模块"""
+        entry = self.files.get(path)
+        if entry is None or entry.file is not file:
+            entry = self.add_file(path, self.modules.get(self.split(path)[0]), file, registered=False)
+        entry.live = True
+        return entry
+
+    def clear_live(self, path: str) -> None:
+        """创建失败，注册的文件恢复为未创建，运行时创建的文件移出索引"""
+        entry = self.files.get(path)
+        if entry is None:
+            return
+        if entry.registered:
+            entry.live = False
+        else:
+            self.remove_file(path)
+
+    def list(self, path: str) -> List[str]:
+        """列举目录下的子项名"""
+        return list(self.children.get(path, ()))
+
+    def walk_modules(self, prefix: str = "") -> Iterator[Tuple[str, "VF_Module"]]:
+        """按注册顺序先序遍历 prefix 下的模块（不含 prefix 本身），父模块在子模块之前"""
+        for name in list(self.children.get(prefix, ())):
+            path = f"{prefix}/{name}"
+            module = self.modules.get(path)
+            if module is not None:
+                yield path, module
+                yield from self.walk_modules(path)
+
+    def walk_files(self, prefix: str = "", registered_only: bool = True) -> Iterator[Tuple[str, PathEntry]]:
+        """遍历 prefix 下的文件，registered_only 为 True 时跳过运行时创建的文件
+
+        prefix 为 "" 时直接遍历全部文件，否则只访问该子树"""
+        if prefix == "":
+            for path, entry in list(self.files.items()):
+                if entry.registered or not registered_only:
+                    yield path, entry
+            return
+
+        for name in list(self.children.get(prefix, ())):
+            path = f"{prefix}/{name}"
+            entry = self.files.get(path)
+            if entry is not None:
+                if entry.registered or not registered_only:
+                    yield path, entry
+            elif path in self.modules:
+                yield from self.walk_files(path, registered_only)
@@ -0,0 +1,168 @@
+import asyncio
+import json
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Tuple
+from .VF_File import VF_File
+from .VF_Module import VF_Module
+from .VF_Defined import METRICS_LATENCY_BUCKETS
+
+# 标签按名称排序后的 ((名称, 值), ...)，无标签时为 ()
+Labels = Tuple[Tuple[str, Any], ...]
+
+
+class Histogram():
+    """固定桶的直方图，counts[i] 为落在 (buckets[i-1], buckets[i]] 中的次数，最后一个为超出最大桶的次数"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """[(le, 不大于 le 的次数)]，最后一项为 +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class MetricsRegistry():
+    """计数器和延迟直方图
+
+    一个名称加一组标签定位一个序列，记录时只做字典查找和加法；
+    瞬时值（队列长度等）不记录，由 add_gauges 注册的回调在输出时提供；
+    运行配置（使用的实现、模式等）由 add_info 注册的回调提供标签，输出为值为 1 的序列。"""
+
+    def __init__(self, prefix: str = "fusemod", buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS) -> None:
+        self.prefix = prefix
+        self.buckets = buckets
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.gauges: List[Callable[[], Dict[str, float]]] = []
+        self.info: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        series = self.counters.get(name)
+        if series is None:
+            series = self.counters[name] = {}
+        key = tuple(sorted(labels.items())) if labels else ()
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self.histograms.get(name)
+        if series is None:
+            series = self.histograms[name] = {}
+        key = tuple(sorted(labels.items())) if labels else ()
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def add_gauges(self, callback: Callable[[], Dict[str, float]]) -> None:
+        """注册瞬时值回调，返回 {名称: 值}"""
+        self.gauges.append(callback)
+
+    def add_info(self, name: str, callback: Callable[[], Dict[str, Any]]) -> None:
+        """注册运行配置回调，返回 {标签: 值}"""
+        self.info[name] = callback
+
+    def collect_gauges(self) -> Dict[str, float]:
+        gauges: Dict[str, float] = {}
+        for callback in self.gauges:
+            gauges.update(callback())
+        return gauges
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                         for name, series in self.counters.items()},
+            "histograms": {name: [{"labels": dict(key), "count": histogram.count, "sum": histogram.sum,
+                                   "buckets": dict(histogram.cumulative())}
+                                  for key, histogram in series.items()]
+                           for name, series in self.histograms.items()},
+            "gauges": self.collect_gauges(),
+            "info": {name: callback() for name, callback in self.info.items()},
+        }
+
+    def to_json(self) -> bytes:
+        return json.dumps(self.to_dict(), indent=1, sort_keys=True).encode()
+
+    def to_prometheus(self) -> bytes:
+        """Prometheus 文本格式，名称加上 prefix_ 前缀"""
+        lines: List[str] = []
+        for name, series in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in series.items():
+                lines.append(f"{metric}{format_labels(key)} {value:g}")
+
+        for name, series in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for key, histogram in series.items():
+                for le, count in histogram.cumulative():
+                    lines.append(f"{metric}_bucket{format_labels(key + (('le', le),))} {count}")
+                lines.append(f"{metric}_sum{format_labels(key)} {histogram.sum:g}")
+                lines.append(f"{metric}_count{format_labels(key)} {histogram.count}")
+
+        for name, value in sorted(self.collect_gauges().items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+
+        for name, callback in sorted(self.info.items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{format_labels(tuple(sorted(callback().items())))} 1")
+
+        return ("\n".join(lines) + "\n").encode()
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        text = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f"{name}=\"{text}\"")
+    return "{" + ",".join(parts) + "}"
+
+
+class StatsFile(VF_File):
+    """只读的统计文件，首次读取立即生成内容，之后每 interval 秒生成一次，经普通的推送流程设置"""
+
+    def __init__(self, render: Callable[[], bytes], interval: float) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.render = render
+        self.interval = interval
+        self.rendered = False
+
+    async def read(self) -> bytes:
+        if self.rendered:
+            await asyncio.sleep(self.interval)
+        self.rendered = True
+        return self.render()
+
+
+class StatsModule(VF_Module):
+    """管理器自身的统计: stats 为 JSON，metrics 为 Prometheus 文本格式"""
+
+    def __init__(self, global_table: Dict, registry: MetricsRegistry, interval: float) -> None:
+        super().__init__(global_table)
+        self.registry = registry
+        self.interval = interval
+        self.register_files([("stats", {"format": "json"}), ("metrics", {"format": "prometheus"})])
+
+    def create_file(self, name: str, kwargs: Dict[str, Any]) -> VF_File:
+        render = self.registry.to_json if kwargs["format"] == "json" else self.registry.to_prometheus
+        return StatsFile(render, self.interval)
@@ -1,5 +1,9 @@
-from typing import Optional, List, Tuple, Dict, Any, Callable
+from typing import Optional, List, Tuple, Dict, Any, Callable, Iterable
 from .VF_File import VF_File
+from .VF_Policy import UpdatePolicy
+from .VF_Index import PathIndex
+from .VF_Store import ContentStore
+from .VF_Defined import SPILL_DIR, SPILL_THRESHOLD, SPILL_MEMORY_BUDGET
 from .VF_Tools import path_parse
 import json
 import os
@@ -12,6 +16,15 @@ class VF_Module():
         self.register_file_table: Dict[str, VF_File] = {}
         self.global_table = global_table
         self.debug_mode = enableDebug
+        # 本模块文件的推送策略，为 None 时文件变化立即推送
+        self.update_policy: Optional[UpdatePolicy] = None
+        # 由配置中的实例注册的文件: 文件名 -> 参数，重新加载配置时用于比较
+        self.instance_argv: Dict[str, Dict[str, Any]] = {}
+        # 实例单独配置的推送策略: 文件名 -> (updatePolicy 配置, 策略)，未配置的实例使用本模块的策略
+        self.instance_policy: Dict[str, Tuple[Dict[str, Any], UpdatePolicy]] = {}
+        # 挂到根模块下后共享根模块的路径索引，path 为本模块的完整路径（根模块为 ""）
+        self.index: Optional[PathIndex] = None
+        self.path = ""
 
     def get_global_table(self) -> Dict[str, Any]:
         return self.global_table
@@ -19,6 +32,15 @@ class VF_Module():
     def get_data_path(self, *paths):
         return os.path.join(self.get_global_table()["data_dir"], *paths)
     
+    def get_content_store(self) -> ContentStore:
+        """所有模块共享的内容存储，较大的内容映射到 data_dir/spill 下的临时文件，内存中的内容有总量上限"""
+        table = self.get_global_table()
+        store = table.get("content_store")
+        if store is None:
+            store = table["content_store"] = ContentStore(self.get_data_path(SPILL_DIR), table.get("content_threshold", SPILL_THRESHOLD),
+                                                          table.get("content_budget", SPILL_MEMORY_BUDGET))
+        return store
+
     def read_config(self, name):
         with open(os.path.join(self.get_global_table()["config_dir"], f"{name}.json"), "r", encoding="utf-8") as f:
             return json.load(f)
@@ -27,10 +49,55 @@ class VF_Module():
         with open(os.path.join(self.get_global_table()["config_dir"], f"{name}.json"), "w", encoding="utf-8") as f:
             json.dump(obj, f)
     
+    def load_update_policy(self, config: Dict[str, Any]) -> None:
+        """从模块配置的 updatePolicy 项读取推送策略，需在注册文件前调用
+
+        重新加载时，沿用模块策略的已注册文件同时改用新策略"""
+        old_policy = self.update_policy
+        self.update_policy = UpdatePolicy.from_config(config.get("updatePolicy"))
+        for file in self.register_file_table.values():
+            if file.update_policy is old_policy:
+                file.update_policy = self.update_policy
+
+    def set_instance_policy(self, name: str, config: Optional[Dict[str, Any]]) -> bool:
+        """记录实例配置中的 updatePolicy 项，返回 True 表示与之前的配置不同"""
+        old = self.instance_policy.get(name)
+        if (old[0] if old is not None else None) == (config or None):
+            return False
+        policy = UpdatePolicy.from_config(config)
+        if policy is None:
+            self.instance_policy.pop(name, None)
+        else:
+            self.instance_policy[name] = (config, policy)
+        return True
+
+    def policy_for(self, name: str) -> Optional[UpdatePolicy]:
+        """文件 name 的推送策略: 实例单独配置的策略，否则为本模块的策略"""
+        entry = self.instance_policy.get(name)
+        return entry[1] if entry is not None else self.update_policy
+
+    def apply_update_policy(self, file: VF_File, name: str = "") -> VF_File:
+        """文件未设置推送策略时使用实例或本模块的策略"""
+        if file.update_policy is None:
+            file.update_policy = self.policy_for(name)
+        return file
+
     def register_module(self, name: str, module: 'VF_Module') -> None:
         """注册模块"""
         self.register_module_table[name] = module
         module.debug_mode = self.debug_mode
+        if self.index is not None:
+            module.attach(self.index, f"{self.path}/{name}")
+
+    def attach(self, index: PathIndex, path: str) -> None:
+        """挂到根模块下，把本模块及其已注册的文件和子模块加入索引"""
+        self.index = index
+        self.path = path
+        index.add_module(path, self)
+        for name, file in self.register_file_table.items():
+            index.add_file(f"{path}/{name}", self, file)
+        for name, module in self.register_module_table.items():
+            module.attach(index, f"{path}/{name}")
 
     def register_file(self, name: str, kwargs: Dict[str, Any] = {}) -> None:
         """注册文件"""
@@ -38,14 +105,91 @@ class VF_Module():
         file = self.create_file(name, kwargs)
 
         if file is not None:
-            self.register_file_table[name] = file
+            self.register_file_table[name] = self.apply_update_policy(file, name)
+            if self.index is not None:
+                self.index.add_file(f"{self.path}/{name}", self, file)
         else:
             raise ValueError(f"Failed to create file: {name}")
 
+    def register_files(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """批量注册文件，items 为 (name, kwargs)
+
+        已挂到根模块下时交给根模块的 files_registered，管理器运行后注册的文件用批量包一起创建"""
+        files: List[Tuple[str, VF_File]] = []
+        for name, kwargs in items:
+            self.register_file(name, kwargs)
+            files.append((f"{self.path}/{name}", self.register_file_table[name]))
+
+        root = self.index.module("") if self.index is not None else None
+        if root is not None:
+            root.files_registered(files)
+
+    def files_registered(self, files: List[Tuple[str, VF_File]]) -> None:
+        """子树中批量注册了文件，files 为 (完整路径, 文件)，默认不处理"""
+        pass
+
+    def register_instances(self, instances: Iterable[Dict[str, Any]]) -> None:
+        """按配置的实例列表 [{"name": 文件名, "argv": 参数, "updatePolicy": 可选的推送策略}] 注册文件"""
+        instances = list(instances)
+        for instance in instances:
+            self.set_instance_policy(instance["name"], instance.get("updatePolicy"))
+        self.register_files((instance["name"], instance["argv"]) for instance in instances)
+        for instance in instances:
+            self.instance_argv[instance["name"]] = instance["argv"]
+
+    def reload_instances(self, instances: Iterable[Dict[str, Any]]) -> Tuple[List[Tuple[str, VF_File]], List[str]]:
+        """按新的实例列表更新已注册的文件，返回 (新创建的文件, 需要删除的文件名)
+
+        参数未变化的文件保持不变，只有推送策略变化时直接更换策略；参数变化的文件先删除再重新创建，两个列表中都会出现。
+        只更新 register_file_table，路径索引由管理器在删除和创建文件时更新。"""
+        new_argv = {instance["name"]: instance["argv"] for instance in instances}
+        new_policy = {instance["name"]: instance.get("updatePolicy") for instance in instances}
+
+        removed = [name for name, argv in self.instance_argv.items() if new_argv.get(name) != argv]
+        for name in removed:
+            del self.instance_argv[name]
+            self.instance_policy.pop(name, None)
+            self.register_file_table.pop(name, None)
+
+        for name in self.instance_argv:
+            old_policy = self.policy_for(name)
+            if self.set_instance_policy(name, new_policy[name]):
+                file = self.register_file_table.get(name)
+                if file is not None and file.update_policy is old_policy:
+                    file.update_policy = self.policy_for(name)
+
+        added: List[Tuple[str, VF_File]] = []
+        for name, argv in new_argv.items():
+            if name in self.instance_argv:
+                continue
+            self.set_instance_policy(name, new_policy[name])
+            file = self.create_file(name, argv)
+            if file is None:
+                continue
+            self.register_file_table[name] = self.apply_update_policy(file, name)
+            self.instance_argv[name] = argv
+            added.append((name, file))
+
+        return added, removed
+
+    def reload_config(self) -> Tuple[List[Tuple[str, VF_File]], List[str]]:
+        """重新读取配置，返回 (新创建的文件, 需要删除的文件名)，文件名相对于本模块，默认无变化"""
+        return [], []
+
     def tree_module(self, tree_list: Optional[List[Tuple[str, 'VF_Module']]] = None, 
              callback: Optional[Callable[[str, 'VF_Module'], None]] = None, 
              prefix: str = "") -> None:
-        """遍历模块树"""
+        """遍历模块树，已挂到根模块下时使用路径索引"""
+        if self.index is not None:
+            start = len(self.path)
+            for path, module in self.index.walk_modules(self.path):
+                full_path = prefix + path[start:]
+                if tree_list is not None:
+                    tree_list.append((full_path, module))
+                if callback is not None:
+                    callback(full_path, module)
+            return
+
         for k, v in self.register_module_table.items():
             full_path = f"{prefix}/{k}"
             
@@ -59,6 +203,16 @@ class VF_Module():
 
     def tree_file(self, tree_list: Optional[List[Tuple[str, VF_File]]] = None, 
              callback: Optional[Callable[[str, VF_File], None]] = None, prefix: str = "") -> None:
+        """遍历已注册的文件，已挂到根模块下时使用路径索引"""
+        if self.index is not None:
+            start = len(self.path)
+            for path, entry in self.index.walk_files(self.path):
+                full_path = prefix + path[start:]
+                if tree_list is not None:
+                    tree_list.append((full_path, entry.file))
+                if callback is not None:
+                    callback(full_path, entry.file)
+            return
 
         for k, v in self.register_file_table.items():
             full_path = f"{prefix}/{k}"
@@ -72,7 +226,19 @@ class VF_Module():
         self.tree_module(callback = lambda path, module: module.tree_file(tree_list, callback, path), prefix=prefix)
     
     def create(self, path: str, kwargs: Dict[str, Any] = {}) -> Optional[VF_File]:
-        """创建文件"""
+        """创建文件，已挂到根模块下时按路径索引直接找到父目录对应的模块"""
+        if self.index is not None:
+            if not path.startswith("/"):
+                return None
+            parent, name = PathIndex.split(self.path + path)
+            module = self.index.module(parent)
+            if module is None or not name:
+                return None
+            file = module.create_file(name, kwargs)
+            if file is not None:
+                module.apply_update_policy(file, name)
+            return file
+
         parsed = path_parse(path)
         if parsed is None:
             return None
@@ -81,6 +247,8 @@ class VF_Module():
         
         if subPath == "/":
             file = self.create_file(name, kwargs)
+            if file is not None:
+                self.apply_update_policy(file, name)
         else:
             if name not in self.register_module_table:
                 return None
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import stat
+from typing import Tuple, Any
+
+# 单次 writev 最多的分段数
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (ValueError, OSError):
+    IOV_MAX = 1024
+
+
+class PipeReader():
+    """基于 asyncio 管道传输的读端，接口与 aiofiles 文件对象一致"""
+
+    def __init__(self, reader: asyncio.StreamReader, transport: asyncio.ReadTransport) -> None:
+        self.reader = reader
+        self.transport = transport
+
+    async def read(self, size: int = -1) -> bytes:
+        """读取 size 字节，只有遇到 EOF 时才会返回更少的数据"""
+        if size < 0:
+            return await self.reader.read()
+        try:
+            return await self.reader.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    async def read1(self, size: int) -> bytes:
+        """读取当前可用的数据，最多 size 字节，只有遇到 EOF 时才会返回空"""
+        return await self.reader.read(size)
+
+    async def close(self) -> None:
+        self.transport.close()
+
+
+class PipeWriter():
+    """基于非阻塞 fd 的写端，接口与 aiofiles 文件对象一致
+
+    writev 用 os.writev 直接写出多个分段，数据不在用户态拼接或缓存；
+    管道满时等待可写，返回时数据已全部写入管道。"""
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+        os.set_blocking(fd, False)
+
+    async def wait_writable(self) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        loop.add_writer(self.fd, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            loop.remove_writer(self.fd)
+
+    async def writev(self, buffers) -> int:
+        views = [memoryview(buffer).cast("B") for buffer in buffers if len(buffer)]
+        total = sum(view.nbytes for view in views)
+        index = 0
+
+        while index < len(views):
+            try:
+                written = os.writev(self.fd, views[index:index + IOV_MAX])
+            except BlockingIOError:
+                written = 0
+
+            # 跳过已写完的分段，截掉部分写入的分段
+            while written and index < len(views):
+                size = views[index].nbytes
+                if written >= size:
+                    written -= size
+                    index += 1
+                else:
+                    views[index] = views[index][written:]
+                    written = 0
+
+            if index < len(views):
+                await self.wait_writable()
+
+        return total
+
+    async def write(self, data) -> int:
+        return await self.writev([data])
+
+    async def flush(self) -> None:
+        """writev 返回时数据已写入管道，无需 flush"""
+        pass
+
+    async def close(self) -> None:
+        os.close(self.fd)
+
+
+async def open_pipe_writer(path: str) -> PipeWriter:
+    loop = asyncio.get_running_loop()
+
+    # 打开 FIFO 写端会阻塞到读端打开为止，放到线程中执行
+    fd = await loop.run_in_executor(None, os.open, path, os.O_WRONLY)
+    return PipeWriter(fd)
+
+
+async def open_pipe_reader(path: str) -> PipeReader:
+    loop = asyncio.get_running_loop()
+
+    file = await loop.run_in_executor(None, open, path, "rb", 0)
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), file)
+    return PipeReader(reader, transport)
+
+
+def ensure_fifo(path: str) -> None:
+    """创建命名管道，已存在的普通文件（例如旧版本竞争时误建的）会被替换"""
+    try:
+        if stat.S_ISFIFO(os.stat(path).st_mode):
+            return
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    os.mkfifo(path, 0o666)
+
+
+async def release_pipe_opens(pipe_in_path: str, pipe_out_path: str) -> None:
+    """helper 未打开管道时，打开另一端让线程池中阻塞的 open 返回"""
+    fds = []
+    for path, flags in ((pipe_in_path, os.O_RDONLY), (pipe_out_path, os.O_WRONLY)):
+        try:
+            fds.append(os.open(path, flags | os.O_NONBLOCK))
+        except OSError:
+            # 没有阻塞在该管道上的 open
+            pass
+
+    await asyncio.sleep(0.1)
+    for fd in fds:
+        os.close(fd)
+
+
+async def open_pipes(pipe_in_path: str, pipe_out_path: str, use_aiofiles: bool = False) -> Tuple[Any, Any]:
+    """按 fuseMod 的打开顺序打开命名管道，返回 (pipe_in 写端, pipe_out 读端)
+
+    默认读端使用 asyncio 原生管道传输，写端使用非阻塞 fd + writev；
+    use_aiofiles 为 True 时使用 aiofiles（每次读写经过线程池）。"""
+
+    if use_aiofiles:
+        import aiofiles
+        pipe_in = await aiofiles.open(pipe_in_path, "wb")
+        pipe_out = await aiofiles.open(pipe_out_path, "rb")
+        return pipe_in, pipe_out
+
+    pipe_in = await open_pipe_writer(pipe_in_path)
+    pipe_out = await open_pipe_reader(pipe_out_path)
+    return pipe_in, pipe_out
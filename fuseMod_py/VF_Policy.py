@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class UpdatePolicy():
+    """可读文件的推送策略
+
+    min_interval: 两次推送之间的最小间隔（秒）
+    debounce: 内容停止变化 debounce 秒后才推送，0 为不等待
+    max_latency: 设置 debounce 时，新内容最多等待 max_latency 秒就推送，0 为不限制
+    推送前到达的新内容总是覆盖未推送的旧内容（latest-wins）。"""
+
+    def __init__(self, min_interval: float = 0.0, debounce: float = 0.0, max_latency: float = 0.0) -> None:
+        self.min_interval = min_interval
+        self.debounce = debounce
+        self.max_latency = max_latency
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "Optional[UpdatePolicy]":
+        """从配置读取，格式为 {"minInterval": 秒, "debounce": 秒, "maxLatency": 秒}，未配置时返回 None"""
+        if not config:
+            return None
+        return cls(float(config.get("minInterval", 0)), float(config.get("debounce", 0)), float(config.get("maxLatency", 0)))
+
+    def delay(self, now: float, first: float, updated: float, last_push: float) -> float:
+        """距离可以推送还需等待的秒数
+
+        first 为最早一个未推送版本到达的时间，updated 为最新版本到达的时间，last_push 为上次推送的时间"""
+        ready = updated + self.debounce
+        if self.debounce and self.max_latency:
+            ready = min(ready, first + self.max_latency)
+        ready = max(ready, last_push + self.min_interval)
+        return ready - now
+
+
+class LatestValue():
+    """只保留最新一个未取走的值，新值覆盖旧值"""
+
+    def __init__(self) -> None:
+        self.value: Any = None
+        self.pending = False
+        self.first = 0.0
+        self.updated = 0.0
+        self.event = asyncio.Event()
+
+    def put(self, value: Any) -> bool:
+        """放入新值，返回 True 表示覆盖了未取走的旧值"""
+        now = asyncio.get_running_loop().time()
+        superseded = self.pending
+        if not superseded:
+            self.first = now
+        self.value = value
+        self.pending = True
+        self.updated = now
+        self.event.set()
+        return superseded
+
+    async def wait(self) -> None:
+        """等待有未取走的值"""
+        while not self.pending:
+            self.event.clear()
+            await self.event.wait()
+
+    def take(self) -> Any:
+        value = self.value
+        self.value = None
+        self.pending = False
+        return value
@@ -0,0 +1,71 @@
+import mmap
+import os
+import struct
+from typing import Optional
+from .VF_Defined import SHM_HEADER_SIZE
+
+# 区域头部: tail(8)，由消费方写入已消费到的位置
+SHM_TAIL = struct.Struct("<Q")
+
+
+class ShmRing():
+    """基于 memfd 的单生产者单消费者环形缓冲区
+
+    区域开头 SHM_HEADER_SIZE 字节为头部，之后为数据区。
+    位置 pos 为单调递增的 64 位绝对位置，数据区偏移为 pos % size。
+    生产方在本地维护 head，消费方处理完一段数据后把 tail 更新为 pos + length。
+    一段数据总是连续存放，数据区末尾放不下时跳到开头，跳过的部分随下一段一起回收。"""
+
+    def __init__(self, size: int, name: str = "fuseMod") -> None:
+        self.size = size
+        self.head = 0
+        self.fd = os.memfd_create(name, 0)
+        try:
+            os.ftruncate(self.fd, SHM_HEADER_SIZE + size)
+            self.mm = mmap.mmap(self.fd, SHM_HEADER_SIZE + size)
+        except Exception:
+            os.close(self.fd)
+            raise
+        # 子进程需要继承该 fd
+        os.set_inheritable(self.fd, True)
+
+    def tail(self) -> int:
+        return SHM_TAIL.unpack_from(self.mm, 0)[0]
+
+    def free(self) -> int:
+        """当前可写入的字节数"""
+        return self.size - (self.head - self.tail())
+
+    def put(self, data) -> Optional[int]:
+        """生产方写入一段数据，返回其位置，空间不足时返回 None"""
+        length = len(data)
+        pos = self.head
+        offset = pos % self.size
+        if offset + length > self.size:
+            # 末尾放不下，从数据区开头写
+            pos += self.size - offset
+            offset = 0
+
+        if pos + length - self.tail() > self.size:
+            return None
+
+        start = SHM_HEADER_SIZE + offset
+        self.mm[start:start + length] = data
+        self.head = pos + length
+        return pos
+
+    def get(self, pos: int, length: int) -> Optional[bytes]:
+        """消费方按描述符复制出一段数据并回收到该位置，描述符不合法时返回 None"""
+        offset = pos % self.size
+        if length > self.size or offset + length > self.size:
+            return None
+
+        start = SHM_HEADER_SIZE + offset
+        data = self.mm[start:start + length]
+        if pos + length > self.tail():
+            SHM_TAIL.pack_into(self.mm, 0, pos + length)
+        return data
+
+    def close(self) -> None:
+        self.mm.close()
+        os.close(self.fd)
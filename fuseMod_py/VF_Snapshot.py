@@ -0,0 +1,86 @@
+import hashlib
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 快照文件: magic(4) saved_at(8) path_len(2) content_len(4) path content
+SNAPSHOT_MAGIC = b"FMS1"
+SNAPSHOT_HEADER = struct.Struct("<4sdHI")
+
+
+class SnapshotStore():
+    """最近推送的文件内容，下次启动时先把它们设置到 FUSE 模块中
+
+    每个路径一个文件，文件名为路径的摘要，写入临时文件后替换，写入中途退出不会留下损坏的快照。"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def file_path(self, path: str) -> str:
+        return os.path.join(self.directory, hashlib.blake2b(path.encode(), digest_size=16).hexdigest())
+
+    def save(self, path: str, content) -> None:
+        """保存 path 的内容，content 为 None 时删除"""
+        target = self.file_path(path)
+        if content is None:
+            try:
+                os.unlink(target)
+            except FileNotFoundError:
+                pass
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path_bytes = path.encode()
+        temp = target + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, time.time(), len(path_bytes), len(content)))
+            f.write(path_bytes)
+            f.write(content)
+        os.replace(temp, target)
+
+    def save_all(self, entries: Dict[str, Any]) -> int:
+        """保存一批内容，返回失败的数量"""
+        failed = 0
+        for path, content in entries.items():
+            try:
+                self.save(path, content)
+            except OSError:
+                failed += 1
+        return failed
+
+    def load(self) -> Iterator[Tuple[str, float, memoryview]]:
+        """读取全部快照，返回 (path, 保存时间, 内容)，内容为只读映射的视图，不复制"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            entry = self.read(os.path.join(self.directory, name))
+            if entry is not None:
+                yield entry
+
+    @staticmethod
+    def read(file_path: str) -> Optional[Tuple[str, float, memoryview]]:
+        try:
+            with open(file_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < SNAPSHOT_HEADER.size:
+                    return None
+                mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        magic, saved_at, path_len, content_len = SNAPSHOT_HEADER.unpack_from(mapped)
+        start = SNAPSHOT_HEADER.size + path_len
+        if magic != SNAPSHOT_MAGIC or start + content_len != size:
+            return None
+        try:
+            path = str(mapped[SNAPSHOT_HEADER.size:start], "utf-8")
+        except UnicodeDecodeError:
+            return None
+        return path, saved_at, memoryview(mapped)[start:]
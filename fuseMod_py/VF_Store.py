@@ -0,0 +1,121 @@
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Dict
+from .VF_Defined import SPILL_THRESHOLD, SPILL_MEMORY_BUDGET
+
+
+class Blob():
+    """一份不可变的文件内容，保存在内存中，或写入临时文件后只读映射
+
+    view 返回只读的 memoryview，不复制内容；换出到磁盘后已取出的视图仍引用原来的内存，释放后才回收。"""
+
+    __slots__ = ("store", "data", "spilled")
+
+    def __init__(self, store: "ContentStore", data: bytes) -> None:
+        self.store = store
+        self.data = data
+        self.spilled = False
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def view(self) -> memoryview:
+        self.store.touch(self)
+        return memoryview(self.data)
+
+    def getvalue(self) -> bytes:
+        return self.data[:] if self.spilled else self.data # type: ignore
+
+    def close(self) -> None:
+        """不再使用，从存储中移除，映射在最后一个视图释放后解除"""
+        self.store.discard(self)
+
+
+class ContentStore():
+    """模块共享的文件内容存储
+
+    不小于 threshold 字节的内容直接写入 directory 下的临时文件并只读映射，其余保存在内存中；
+    内存中的内容总量超过 budget 时，按最近最少使用的顺序换出到磁盘。
+    临时文件映射后立即删除，进程退出后不会残留。"""
+
+    def __init__(self, directory: str, threshold: int = SPILL_THRESHOLD, budget: int = SPILL_MEMORY_BUDGET) -> None:
+        self.directory = directory
+        self.threshold = threshold
+        self.budget = budget
+        # 内存中的内容，最久未使用的在前
+        self.resident: "OrderedDict[Blob, None]" = OrderedDict()
+        self.memory = 0
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+        self.spill_failed = 0
+
+    def put(self, content) -> Blob:
+        """保存一份内容，content 为 bytes 时不复制"""
+        blob = Blob(self, bytes(content))
+        if len(blob) >= self.threshold and self.spill(blob):
+            return blob
+        self.resident[blob] = None
+        self.memory += len(blob)
+        self.evict()
+        return blob
+
+    def touch(self, blob: Blob) -> None:
+        if blob in self.resident:
+            self.resident.move_to_end(blob)
+
+    def discard(self, blob: Blob) -> None:
+        if blob in self.resident:
+            del self.resident[blob]
+            self.memory -= len(blob)
+        elif blob.spilled:
+            self.spilled_count -= 1
+            self.spilled_bytes -= len(blob)
+            blob.spilled = False
+        blob.data = b""
+
+    def evict(self) -> None:
+        """内存超出预算时换出最久未使用的内容，换出失败的内容留在内存中"""
+        kept = []
+        while self.memory > self.budget and self.resident:
+            blob, _ = self.resident.popitem(last=False)
+            self.memory -= len(blob)
+            if len(blob) == 0 or not self.spill(blob):
+                kept.append(blob)
+        for blob in kept:
+            self.resident[blob] = None
+            self.memory += len(blob)
+
+    def spill(self, blob: Blob) -> bool:
+        """把内容写入临时文件并替换为只读映射"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=self.directory)
+            try:
+                os.unlink(path)
+                view = memoryview(blob.data)
+                while view:
+                    view = view[os.write(fd, view):]
+                mapped = mmap.mmap(fd, len(blob.data), access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+        except (OSError, ValueError):
+            self.spill_failed += 1
+            return False
+
+        blob.data = mapped # type: ignore
+        blob.spilled = True
+        self.spilled_count += 1
+        self.spilled_bytes += len(mapped)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """内存中和已换出的内容数量与字节数，以及换出失败的次数"""
+        return {
+            "resident": len(self.resident),
+            "memory": self.memory,
+            "spilled": self.spilled_count,
+            "spilled_bytes": self.spilled_bytes,
+            "spill_failed": self.spill_failed,
+        }
@@ -0,0 +1,204 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Coroutine, Deque, Dict, Optional, Set
+
+from .VF_Defined import WRITE_MERGE_MAX
+
+
+class TaskSupervisor():
+    """按文件路径跟踪后台任务
+
+    spawn 启动的是数据接收等常驻任务，删除文件时取消；
+    track 跟踪的是已发出的请求（创建文件、推送内容），删除文件时等待其完成而不取消，
+    避免 FUSE 模块收到针对不存在文件的请求。任务结束后自动移除，不会随文件增删累积。"""
+
+    def __init__(self) -> None:
+        self.tasks: Dict[str, Set[asyncio.Task]] = {}
+        self.inflight: Dict[str, Set[asyncio.Future]] = {}
+
+    def spawn(self, path: str, coro: Coroutine) -> asyncio.Task:
+        """启动一个属于 path 的常驻任务"""
+        task = asyncio.create_task(coro)
+        self.add(self.tasks, path, task)
+        return task
+
+    def track(self, path: str, awaitable: Awaitable) -> asyncio.Future:
+        """跟踪一个属于 path 的在途请求"""
+        future = asyncio.ensure_future(awaitable)
+        self.add(self.inflight, path, future)
+        return future
+
+    @staticmethod
+    def add(table: Dict[str, Set], path: str, future: asyncio.Future) -> None:
+        table.setdefault(path, set()).add(future)
+
+        def discard(done: asyncio.Future) -> None:
+            futures = table.get(path)
+            if futures is not None:
+                futures.discard(done)
+                if not futures:
+                    del table[path]
+
+        future.add_done_callback(discard)
+
+    async def cancel(self, path: str) -> None:
+        """取消 path 的常驻任务并等待其退出"""
+        tasks = self.tasks.pop(path, set())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def drain(self, path: str, timeout: Optional[float] = None) -> bool:
+        """等待 path 的在途请求全部完成，超时返回 False"""
+        futures = set(self.inflight.get(path, ()))
+        if not futures:
+            return True
+        _, pending = await asyncio.wait(futures, timeout=timeout)
+        return not pending
+
+    async def remove(self, path: str, timeout: Optional[float] = None) -> bool:
+        """删除文件前调用: 取消常驻任务，再等待在途请求完成"""
+        await self.cancel(path)
+        return await self.drain(path, timeout)
+
+    def cancel_all(self) -> None:
+        """取消全部常驻任务，不等待，调用方可能本身就是被取消的任务之一"""
+        for tasks in self.tasks.values():
+            for task in tasks:
+                task.cancel()
+
+    def count(self, path: Optional[str] = None) -> int:
+        """常驻任务数，path 为 None 时统计全部"""
+        if path is not None:
+            return len(self.tasks.get(path, ()))
+        return sum(len(tasks) for tasks in self.tasks.values())
+
+    def inflight_count(self, path: Optional[str] = None) -> int:
+        """在途请求数，path 为 None 时统计全部"""
+        if path is not None:
+            return len(self.inflight.get(path, ()))
+        return sum(len(futures) for futures in self.inflight.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "paths": len(self.tasks.keys() | self.inflight.keys()),
+            "tasks": self.count(),
+            "inflight": self.inflight_count(),
+        }
+
+
+class WriteEntry():
+    """写入队列中尚未执行的一次写入，合并后 data 为 bytearray"""
+
+    __slots__ = ("offset", "data")
+
+    def __init__(self, offset: int, data) -> None:
+        self.offset = offset
+        self.data = data
+
+    def end(self) -> int:
+        return self.offset + len(self.data)
+
+    def merge(self, buffer, offset: int) -> None:
+        """在 offset 处写入 buffer，offset 需在 [self.offset, self.end()] 内"""
+        if not isinstance(self.data, bytearray):
+            self.data = bytearray(self.data)
+        start = offset - self.offset
+        self.data[start:start + len(buffer)] = buffer
+
+
+class WriteQueue():
+    """一个文件的写入队列
+
+    提交立即返回，不等待，监听循环不会因某个文件写入慢而停止读取其他文件的响应；
+    写入和其他调用（如文件事件）在一个任务中按提交顺序逐个执行，同一文件同时只有一个 awrite。
+    排队的项达到 limit 时调用 hold(True) 暂停该文件的写入，减少到 limit 的一半时调用 hold(False) 恢复，
+    暂停生效前已发出的写入仍然入队。coalesce 为 True 时与队尾相接或重叠的写入按 offset 覆盖合并进队尾，
+    合并后不超过 WRITE_MERGE_MAX 字节；否则每次写入都单独执行。关闭后不再接受新的提交。"""
+
+    def __init__(self, limit: int, write: Callable[[bytes, int], Awaitable[Any]], hold: Callable[[bool], None],
+                 coalesce: bool = False) -> None:
+        self.limit = max(1, limit)
+        self.write_func = write
+        self.hold_func = hold
+        self.coalesce = coalesce
+        # 积压的项: WriteEntry 为写入，(func, args) 为其他调用
+        self.backlog: Deque[Any] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.held = False
+        self.holds = 0
+        self.merged = 0
+
+    def full(self) -> bool:
+        return len(self.backlog) >= self.limit
+
+    def pending(self) -> int:
+        """尚未完成的项数，包括正在执行的"""
+        return len(self.backlog) + (self.task is not None)
+
+    def write(self, buffer, offset: int) -> bool:
+        """提交一次写入，队列已关闭时返回 False"""
+        if self.closed:
+            return False
+        tail = self.backlog[-1] if self.backlog else None
+        if (self.coalesce and isinstance(tail, WriteEntry) and tail.offset <= offset <= tail.end()
+                and max(tail.end(), offset + len(buffer)) - tail.offset <= WRITE_MERGE_MAX):
+            tail.merge(buffer, offset)
+            self.merged += 1
+            return True
+        self.append(WriteEntry(offset, buffer))
+        return True
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args) -> bool:
+        """提交 func(*args)，在此前提交的写入完成后执行，队列已关闭时返回 False"""
+        if self.closed:
+            return False
+        self.append((func, args))
+        return True
+
+    def append(self, entry: Any) -> None:
+        self.backlog.append(entry)
+        if not self.held and self.full():
+            self.held = True
+            self.holds += 1
+            self.hold_func(True)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self.hold_func(False)
+
+    async def run(self) -> None:
+        try:
+            while self.backlog:
+                entry = self.backlog.popleft()
+                # 在执行这一项前恢复，暂停的写入与模块的写入同时进行
+                if len(self.backlog) <= self.limit // 2:
+                    self.release()
+                if isinstance(entry, WriteEntry):
+                    # 合并过的内容复制为 bytes，模块可能保留数据
+                    data = bytes(entry.data) if isinstance(entry.data, bytearray) else entry.data
+                    await self.write_func(data, entry.offset)
+                else:
+                    func, args = entry
+                    await func(*args)
+        finally:
+            self.task = None
+
+    async def close(self, timeout: Optional[float] = None) -> bool:
+        """关闭队列并等待已提交的写入完成，之后不再暂停该文件的写入"""
+        self.closed = True
+        drained = await self.drain(timeout)
+        self.release()
+        return drained
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的项全部完成，超时返回 False"""
+        task = self.task
+        if task is None:
+            return True
+        _, pending = await asyncio.wait({task}, timeout=timeout)
+        return not pending
@@ -1,8 +1,7 @@
-import crcmod
 from typing import Optional, Tuple
 
-# CRC16-CCITT 计算函数
-crc16_ccitt = crcmod.mkCrcFun(0x11021, rev=False, initCrc=0, xorOut=0)
+# CRC16-CCITT 计算函数，具体实现见 VF_Crc
+from .VF_Crc import crc16_ccitt, CRC16_IMPL
 
 def path_parse(path: str) -> Optional[Tuple[str, str]]:
     """
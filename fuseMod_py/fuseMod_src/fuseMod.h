@@ -10,6 +10,7 @@
 #include <sys/stat.h>
 #include <sys/types.h>
 #include <sys/time.h>
+#include <time.h>
 #include <errno.h>
 #include <pthread.h>
 #include <stdint.h>
@@ -29,13 +30,61 @@
 // 包格式常量
 #define PACKET_HEADER 0x5432
 #define PACKET_TRAILER 0x2345
-#define PACKET_MIN_SIZE 10
+#define PACKET_HEADER_SIZE 8
+#define PACKET_MIN_SIZE 12
 #define PACKET_MAX_SIZE 3072
 
+// 协议版本 2: 包头 0x5433（响应 0x5403），长度字段为 32 位，包头共 10 字节
+#define PROTOCOL_VERSION 2
+#define PACKET_HEADER_SIZE_V2 10
+#define PACKET_MIN_SIZE_V2 14
+#define PACKET_MAX_FRAME_LIMIT (1 << 20)
+
+// 单个批量包最多包含的子操作数
+#define BATCH_MAX_OPS 1024
+
+// 协商标志: 可信本地管道，CRC 为 0 的包跳过校验
+#define NEGOTIATE_FLAG_TRUSTED (1 << 0)
+
+// 挂载完成后发出的就绪包 0x0F: version(2) max_frame_size(4) capabilities(4)
+#define HELLO_CAP_BATCH (1 << 0)
+#define HELLO_CAP_SHM (1 << 1)
+#define HELLO_CAP_TRUSTED_CRC (1 << 2)
+#define HELLO_CAP_WRITE_ID (1 << 3)
+#define HELLO_CAP_PATCH (1 << 4)
+#define HELLO_CAP_LAZY (1 << 5)
+#define HELLO_CAP_FILE_EVENTS (1 << 6)
+#define HELLO_CAP_WRITE_HOLD (1 << 7)
+
+// 0x07 写入通知的分片标志，同一次内核写入的分片共用一个 write_id
+#define WRITE_FLAG_FIRST (1 << 0)
+#define WRITE_FLAG_LAST (1 << 1)
+
+// 共享内存数据通道: 包类型带上 PACKET_TYPE_SHM 时，内容在共享内存中，包内只有 pos(8) length(4) 描述符
+// 每个方向一个环形缓冲区，区域开头 SHM_HEADER_SIZE 字节为头部 tail(8)，之后为数据区
+#define PACKET_TYPE_SHM 0x8000
+#define SHM_HEADER_SIZE 64
+
 #define FLAG_READ (1 << 0)
 #define FLAG_WRITE (1 << 1)
 #define FLAG_COPY_ON_WRITE (1 << 3)
 
+// 按需内容: 打开或读取时向 Python 发出 0x0D 通知，内容超过 TTL 后先返回旧内容再后台更新
+// 创建这类文件的数据为: flag(4) path_len(2) path ttl_ms(4)，首次获取最多等待 LAZY_FETCH_TIMEOUT_MS
+#define FLAG_LAZY (1 << 4)
+#define LAZY_FETCH_TIMEOUT_MS 10000
+
+// 以写方式打开的文件 flush、fsync 和 release 时向 Python 发出 0x0E 通知: event(1) path
+// open 时在 fi->fh 中记录 FH_WRITABLE，只读打开的文件不发出通知
+#define FILE_EVENT_FLUSH 1
+#define FILE_EVENT_RELEASE 2
+#define FILE_EVENT_FSYNC 3
+#define FH_WRITABLE 1
+
+// 暂停写入 0x10: hold(1) path，Python 端某个文件积压的写入过多时暂停该文件的写入，积压减少后恢复
+// 暂停期间该文件的写入在 helper 中等待，文件删除时返回 -ENOENT，超过 WRITE_HOLD_TIMEOUT_MS 返回 -EAGAIN
+#define WRITE_HOLD_TIMEOUT_MS 30000
+
 // 调试模式
 
 #ifdef DEBUG_MODE
@@ -61,45 +110,95 @@ typedef struct node {
     size_t size;
     time_t mtime;
     uint32_t flag;
+    uint32_t ttl_ms;        // 按需内容的有效期
+    uint64_t fetched_ms;    // 上次获取完成的时间（单调时钟），0 表示从未获取
+    int fetch_pending;      // 已通知 Python，等待获取完成
+    int write_held;         // Python 端暂停了该文件的写入
     struct node *parent;
     struct node *children;
     struct node *next;
 } node_t;
 
+// 解析后的包头信息
+typedef struct {
+    int version;
+    uint16_t type;
+    uint16_t id;
+    uint32_t data_size;
+    size_t header_size;
+} packet_info_t;
+
 // 全局变量声明
 extern node_t *root;
 extern pthread_mutex_t fs_mutex;
 extern int pipe_in_fd;
 extern int pipe_out_fd;
 
+// 协商状态，由 pipe_out_mutex 保护，该锁同时保证写出的包不交错
+extern pthread_mutex_t pipe_out_mutex;
+extern int protocol_version;
+extern uint32_t max_frame_size;
+
 // CRC函数
 uint16_t crc16_ccitt(const uint8_t *data, size_t length);
+void set_crc_mode(int trusted, uint16_t sample);
+int get_crc_trusted(void);
 
 // 工具函数
 uint8_t *ipath2c(const uint8_t* path, size_t len);
-int get_packet_size(const uint8_t *packet, size_t size, uint16_t *type, uint16_t *data_size);
-int validate_packet(const uint8_t *packet, size_t size, const uint8_t **data);
-
-size_t create_response_packet(uint8_t *buffer, uint16_t type, 
-                             uint16_t data_size, const uint8_t *data);
+uint32_t read_u32(const uint8_t *p);
+void write_u32(uint8_t *p, uint32_t value);
+uint64_t read_u64(const uint8_t *p);
+void write_u64(uint8_t *p, uint64_t value);
+size_t packet_header_size(int version);
+void get_protocol(int *version, uint32_t *max_frame);
+void set_protocol(int version, uint32_t max_frame);
+int get_packet_size(const uint8_t *packet, size_t size, packet_info_t *info);
+int validate_packet(const uint8_t *packet, size_t size, const packet_info_t *info, const uint8_t **data);
+int parse_path_content(const uint8_t *data, uint32_t data_size, int version,
+                       char **path, const uint8_t **content, uint32_t *content_len);
+
+size_t create_response_packet(uint8_t *buffer, int version, uint16_t type, uint16_t id,
+                             uint32_t data_size, const uint8_t *data);
+ssize_t write_packet(const uint8_t *packet, size_t size);
+ssize_t read_full(int fd, uint8_t *buffer, size_t size);
 void send_error_and_exit(uint8_t error_code, const char *message);
 int split_path(const char *path, char ***components);
 
 // 文件系统操作
 node_t *find_node(const char *path);
 int create_directory(const char *path);
-int create_file(const char *path, uint32_t flag);
+int create_file(const char *path, uint32_t flag, uint32_t ttl_ms);
 int delete_directory(const char *path);
 int delete_file(const char *path);
 int set_file_content(const char *path, const uint8_t *content, size_t content_size);
 int append_file_content(const char *path, const uint8_t *content, size_t content_size);
+int patch_file_content(const char *path, uint32_t offset, const uint8_t *content, size_t content_size);
+int truncate_file_content(const char *path, uint32_t size);
 int write_node_content(node_t *node, const char *buf, size_t size, off_t offset);
 
 // 管道操作
+int handle_operation(uint16_t type, const uint8_t *data, uint32_t data_size, int version);
+int handle_batch(const uint8_t *data, uint32_t data_size, int version, uint8_t *results, uint16_t *count);
+size_t handle_negotiate(const uint8_t *data, uint32_t data_size, uint8_t *response_data,
+                        int *agreed_version, uint32_t *agreed_max_frame,
+                        uint16_t *agreed_flags, uint16_t *agreed_sample);
 void *pipe_listener(void *arg);
+
+// 共享内存数据通道
+int shm_attach(const uint8_t *data, uint32_t data_size);
+int shm_in_data(uint64_t pos, uint32_t length, const uint8_t **content);
+void shm_in_release(uint64_t pos, uint32_t length);
+int shm_send_write(const char *path, uint16_t path_len, const char *buf, size_t size, off_t offset,
+                   uint32_t write_id, int version);
 void create_pipes(const char* in_path, const char* out_path);
 
 // FUSE操作
+void *fusemod_init(struct fuse_conn_info *conn, struct fuse_config *cfg);
+void lazy_fetched(const char *path, uint8_t status);
+void lazy_wake(void);
+void write_hold(const char *path, uint8_t hold);
+void write_wake(void);
 int fusemod_getattr(const char *path, struct stat *stbuf, struct fuse_file_info *fi);
 int fusemod_readdir(const char *path, void *buf, fuse_fill_dir_t filler,
                    off_t offset, struct fuse_file_info *fi,
@@ -109,6 +208,9 @@ int fusemod_read(const char *path, char *buf, size_t size, off_t offset,
                 struct fuse_file_info *fi);
 int fusemod_write(const char *path, const char *buf, size_t size, off_t offset,
                  struct fuse_file_info *fi);
+int fusemod_flush(const char *path, struct fuse_file_info *fi);
+int fusemod_release(const char *path, struct fuse_file_info *fi);
+int fusemod_fsync(const char *path, int datasync, struct fuse_file_info *fi);
 // 初始化
 void init_filesystem();
 
@@ -122,6 +122,11 @@ int create_directory(const char *path) {
     new_dir->gid = getgid();
     new_dir->content = NULL;
     new_dir->size = 0;
+    new_dir->flag = 0;
+    new_dir->ttl_ms = 0;
+    new_dir->fetched_ms = 0;
+    new_dir->fetch_pending = 0;
+    new_dir->write_held = 0;
     new_dir->mtime = time(NULL);
     new_dir->parent = parent;
     new_dir->children = NULL;
@@ -132,7 +137,7 @@ int create_directory(const char *path) {
 }
 
 // 创建文件
-int create_file(const char *path, uint32_t flag) {
+int create_file(const char *path, uint32_t flag, uint32_t ttl_ms) {
     if (path == NULL || path[0] != '/') {
         return ERR_INVALID_PATH;
     }
@@ -195,6 +200,10 @@ int create_file(const char *path, uint32_t flag) {
     new_file->content = NULL;
     new_file->size = 0;
     new_file->flag = flag;
+    new_file->ttl_ms = ttl_ms;
+    new_file->fetched_ms = 0;
+    new_file->fetch_pending = 0;
+    new_file->write_held = 0;
     new_file->mtime = time(NULL);
     new_file->parent = parent;
     new_file->children = NULL;
@@ -353,6 +362,76 @@ int append_file_content(const char *path, const uint8_t *content, size_t content
     return 0;
 }
 
+// 从 offset 开始覆盖文件内容，offset 不能超过当前大小，超出末尾的部分扩展文件
+int patch_file_content(const char *path, uint32_t offset, const uint8_t *content, size_t content_size) {
+    node_t *file = find_node(path);
+    if (file == NULL) {
+        return ERR_NOT_FOUND;
+    }
+
+    if (file->type == TYPE_DIR) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    if ((file->flag & FLAG_READ) == 0) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    if (offset > file->size) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    if ((size_t)offset + content_size > file->size) {
+        char *new_content = realloc(file->content, offset + content_size);
+        if (new_content == NULL) {
+            return ERR_IO_ERROR;
+        }
+        file->content = new_content;
+        file->size = offset + content_size;
+    }
+
+    if (content_size > 0) {
+        memcpy(file->content + offset, content, content_size);
+    }
+
+    file->mtime = time(NULL);
+    return 0;
+}
+
+// 把文件内容截断或扩展到 size，扩展部分填 0
+int truncate_file_content(const char *path, uint32_t size) {
+    node_t *file = find_node(path);
+    if (file == NULL) {
+        return ERR_NOT_FOUND;
+    }
+
+    if (file->type == TYPE_DIR) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    if ((file->flag & FLAG_READ) == 0) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    if (size == 0) {
+        free(file->content);
+        file->content = NULL;
+    } else if (size != file->size) {
+        char *new_content = realloc(file->content, size);
+        if (new_content == NULL) {
+            return ERR_IO_ERROR;
+        }
+        if (size > file->size) {
+            memset(new_content + file->size, 0, size - file->size);
+        }
+        file->content = new_content;
+    }
+
+    file->size = size;
+    file->mtime = time(NULL);
+    return 0;
+}
+
 // 写入节点内容（在 caller 持有 fs_mutex 时调用）
 int write_node_content(node_t *node, const char *buf, size_t size, off_t offset) {
     if (node == NULL) {
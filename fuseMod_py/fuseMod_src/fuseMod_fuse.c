@@ -1,5 +1,169 @@
 #include "fuseMod.h"
 
+// 挂载完成，向 Python 端发出就绪包: version(2) max_frame_size(4) capabilities(4)
+void *fusemod_init(struct fuse_conn_info *conn, struct fuse_config *cfg) {
+    (void) conn;
+    (void) cfg;
+
+    int version;
+    uint32_t max_frame;
+    get_protocol(&version, &max_frame);
+
+    uint8_t hello[PACKET_MIN_SIZE_V2 + 10];
+    uint8_t payload[10];
+    payload[0] = PROTOCOL_VERSION & 0xFF;
+    payload[1] = (PROTOCOL_VERSION >> 8) & 0xFF;
+    write_u32(payload + 2, PACKET_MAX_FRAME_LIMIT);
+    write_u32(payload + 6, HELLO_CAP_BATCH | HELLO_CAP_SHM | HELLO_CAP_TRUSTED_CRC | HELLO_CAP_WRITE_ID | HELLO_CAP_PATCH | HELLO_CAP_LAZY | HELLO_CAP_FILE_EVENTS | HELLO_CAP_WRITE_HOLD);
+
+    // 通知由 helper 主动发出，请求ID固定为 0
+    size_t hello_size = create_response_packet(hello, version, 0x0F, 0, sizeof(payload), payload);
+    if (write_packet(hello, hello_size) < 0) {
+        send_error_and_exit(0, "write hello failed");
+    }
+
+    return NULL;
+}
+
+// 按需内容 (FLAG_LAZY) 的获取状态由 fs_mutex 保护，获取完成或文件删除时广播 lazy_cond
+static pthread_cond_t lazy_cond = PTHREAD_COND_INITIALIZER;
+
+static uint64_t monotonic_ms(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    // 加 1 使 0 可以表示从未获取
+    return (uint64_t)ts.tv_sec * 1000 + ts.tv_nsec / 1000000 + 1;
+}
+
+// pthread_cond_timedwait 使用的截止时间: 当前时间之后 ms 毫秒
+static void deadline_after(uint32_t ms, struct timespec *deadline) {
+    clock_gettime(CLOCK_REALTIME, deadline);
+    deadline->tv_sec += ms / 1000;
+    deadline->tv_nsec += (ms % 1000) * 1000000L;
+    if (deadline->tv_nsec >= 1000000000L) {
+        deadline->tv_sec += 1;
+        deadline->tv_nsec -= 1000000000L;
+    }
+}
+
+// 向 Python 发出 0x0D 通知，数据为 path
+static void send_content_needed(const char *path) {
+    int version;
+    uint32_t max_frame;
+    get_protocol(&version, &max_frame);
+
+    size_t path_len = strlen(path);
+    uint8_t *packet = malloc(packet_header_size(version) + path_len + 4);
+    if (packet == NULL) {
+        return;
+    }
+
+    size_t packet_size = create_response_packet(packet, version, 0x0D, 0, path_len, (const uint8_t *)path);
+    write_packet(packet, packet_size);
+    free(packet);
+}
+
+// 打开或读取按需内容的文件前调用，调用方持有 fs_mutex，返回时仍持有
+// 从未获取时通知 Python 并等待获取完成；超过 TTL 时通知 Python 后直接使用旧内容
+// 等待期间文件可能被删除，返回重新查找到的节点，返回 NULL 表示文件已不存在
+// *fetched 为 0 表示内容仍未获取到
+static node_t *lazy_fetch(const char *path, node_t *node, int *fetched) {
+    *fetched = 1;
+    if ((node->flag & FLAG_LAZY) == 0) {
+        return node;
+    }
+
+    uint64_t now = monotonic_ms();
+    if (node->fetched_ms != 0 && now - node->fetched_ms < node->ttl_ms) {
+        return node;
+    }
+
+    if (!node->fetch_pending) {
+        node->fetch_pending = 1;
+        // 写管道可能阻塞，不持有 fs_mutex
+        pthread_mutex_unlock(&fs_mutex);
+        send_content_needed(path);
+        pthread_mutex_lock(&fs_mutex);
+        node = find_node(path);
+    }
+
+    struct timespec deadline;
+    deadline_after(LAZY_FETCH_TIMEOUT_MS, &deadline);
+
+    // 已有内容时不等待（stale-while-revalidate）
+    while (node != NULL && node->fetched_ms == 0 && node->fetch_pending) {
+        if (pthread_cond_timedwait(&lazy_cond, &fs_mutex, &deadline) == ETIMEDOUT) {
+            // 超时后允许下一次访问重新通知
+            node = find_node(path);
+            if (node != NULL) {
+                node->fetch_pending = 0;
+            }
+            break;
+        }
+        node = find_node(path);
+    }
+
+    *fetched = node != NULL && node->fetched_ms != 0;
+    return node;
+}
+
+// Python 端获取完成（status 为 0）或失败，调用方持有 fs_mutex
+void lazy_fetched(const char *path, uint8_t status) {
+    node_t *node = find_node(path);
+    if (node != NULL && node->type == TYPE_FILE) {
+        node->fetch_pending = 0;
+        if (status == 0) {
+            node->fetched_ms = monotonic_ms();
+        }
+    }
+    pthread_cond_broadcast(&lazy_cond);
+}
+
+// 文件删除后唤醒等待者重新查找，调用方持有 fs_mutex
+void lazy_wake(void) {
+    pthread_cond_broadcast(&lazy_cond);
+}
+
+// 被 Python 端暂停的写入在 write_cond 上等待，暂停状态由 fs_mutex 保护，恢复或文件删除时广播
+static pthread_cond_t write_cond = PTHREAD_COND_INITIALIZER;
+
+// Python 端暂停（hold 非 0）或恢复 path 的写入，调用方持有 fs_mutex
+void write_hold(const char *path, uint8_t hold) {
+    node_t *node = find_node(path);
+    if (node != NULL && node->type == TYPE_FILE) {
+        node->write_held = hold != 0;
+    }
+    if (!hold) {
+        pthread_cond_broadcast(&write_cond);
+    }
+}
+
+// 文件删除后唤醒被暂停的写入重新查找，调用方持有 fs_mutex
+void write_wake(void) {
+    pthread_cond_broadcast(&write_cond);
+}
+
+// 写入前调用，调用方持有 fs_mutex，返回时仍持有
+// 文件的写入被暂停时等待恢复，等待期间文件可能被删除，*node 更新为重新查找到的节点
+// 返回 0 表示可以写入，-ENOENT 表示文件已删除，-EAGAIN 表示等待超时
+static int write_wait(const char *path, node_t **node) {
+    if (!(*node)->write_held) {
+        return 0;
+    }
+
+    struct timespec deadline;
+    deadline_after(WRITE_HOLD_TIMEOUT_MS, &deadline);
+
+    while (*node != NULL && (*node)->write_held) {
+        if (pthread_cond_timedwait(&write_cond, &fs_mutex, &deadline) == ETIMEDOUT) {
+            return -EAGAIN;
+        }
+        *node = find_node(path);
+    }
+
+    return *node == NULL ? -ENOENT : 0;
+}
+
 // FUSE 操作实现
 int fusemod_getattr(const char *path, struct stat *stbuf, struct fuse_file_info *fi) {
     (void) fi;
@@ -89,6 +253,26 @@ int fusemod_open(const char *path, struct fuse_file_info *fi) {
         }
     }
 
+    // 以写方式打开的文件在 flush、fsync 和 release 时通知 Python
+    fi->fh = accmode != O_RDONLY ? FH_WRITABLE : 0;
+
+    if (node->flag & FLAG_LAZY) {
+        // 内容在打开后才获取，大小随时变化，绕过内核页缓存
+        fi->direct_io = 1;
+
+        if (accmode != O_WRONLY) {
+            int fetched;
+            node = lazy_fetch(path, node, &fetched);
+            if (node == NULL) {
+                pthread_mutex_unlock(&fs_mutex);
+                return -ENOENT;
+            }
+            if (!fetched) {
+                pthread_mutex_unlock(&fs_mutex);
+                return -EIO;
+            }
+        }
+    }
     
     pthread_mutex_unlock(&fs_mutex);
     return 0;
@@ -120,6 +304,17 @@ int fusemod_read(const char *path, char *buf, size_t size, off_t offset,
         pthread_mutex_unlock(&fs_mutex);
         return -EINVAL;
     }
+
+    int fetched;
+    node = lazy_fetch(path, node, &fetched);
+    if (node == NULL) {
+        pthread_mutex_unlock(&fs_mutex);
+        return -ENOENT;
+    }
+    if (!fetched) {
+        pthread_mutex_unlock(&fs_mutex);
+        return -EIO;
+    }
     
     if ((size_t)offset > node->size) {
         pthread_mutex_unlock(&fs_mutex);
@@ -150,6 +345,13 @@ int fusemod_write(const char *path, const char *buf, size_t size, off_t offset,
         return -ENOENT;
     }
 
+    // Python 端积压的写入过多时在此等待，写入不会在 Python 端无限积压
+    int hold_result = write_wait(path, &node);
+    if (hold_result != 0) {
+        pthread_mutex_unlock(&fs_mutex);
+        return hold_result;
+    }
+
     if (node->type == TYPE_DIR) {
         pthread_mutex_unlock(&fs_mutex);
         return -EISDIR;
@@ -177,65 +379,145 @@ int fusemod_write(const char *path, const char *buf, size_t size, off_t offset,
         }
     }
 
-    // 准备通知并分片发送
+    // 准备通知并分片发送，同一次写入的分片使用同一个 write_id，由 Python 端重组
+    static uint32_t next_write_id = 0;
+    uint32_t write_id = ++next_write_id;
     uint16_t path_len = strlen(path);
     size_t sent = 0;
 
     pthread_mutex_unlock(&fs_mutex);
 
-    // 计算固定开销：PACKET_MIN_SIZE + 2 path_len字段 + path_len + 2 content_len + 4 offset
-    size_t fixed_overhead = PACKET_MIN_SIZE + 2 + (size_t)path_len + 2 + 4; // = 14 + path_len + PACKET_MIN_SIZE
-    if (fixed_overhead >= PACKET_MAX_SIZE) {
+    // 按当前协商的格式分片，版本 2 的内容长度字段为 4 字节
+    int version;
+    uint32_t max_frame;
+    get_protocol(&version, &max_frame);
+    size_t header_size = packet_header_size(version);
+    size_t len_size = version >= 2 ? 4 : 2;
+
+    // 计算固定开销：包头 + CRC和包尾 + 2 path_len字段 + path_len + content_len字段 + 4 offset + 4 write_id + 1 flags
+    size_t fixed_overhead = header_size + 4 + 2 + (size_t)path_len + len_size + 4 + 4 + 1;
+    if (fixed_overhead >= max_frame) {
         // 无法发送任何内容
         return -EIO;
     }
-    size_t max_chunk = PACKET_MAX_SIZE - fixed_overhead;
+    size_t max_chunk = max_frame - fixed_overhead;
+
+    if (size == 0) {
+        return 0;
+    }
+
+    // 共享内存可用时内容写入共享内存，管道只传描述符
+    int shm_result = shm_send_write(path, path_len, buf, size, offset, write_id, version);
+    if (shm_result > 0) {
+        return size;
+    }
+    if (shm_result < 0) {
+        return shm_result;
+    }
+
+    // 所有分片共用一个缓冲区
+    size_t first_chunk = size > max_chunk ? max_chunk : size;
+    uint8_t *notification = malloc(fixed_overhead + first_chunk);
+    if (notification == NULL) {
+        return -ENOMEM;
+    }
 
-    while (sent < size) {
+    do {
         size_t chunk = (size - sent) > max_chunk ? max_chunk : (size - sent);
-        uint32_t data_size_chunk = 2 + path_len + 2 + (uint32_t)chunk + 4; // path_len(2) + path + content_len(2) + content + offset(4)
-        size_t alloc_size = data_size_chunk + PACKET_MIN_SIZE;
-        uint8_t *notification = malloc(alloc_size);
-        if (notification == NULL) {
-            return -ENOMEM;
+        uint32_t data_size_chunk = 2 + path_len + len_size + (uint32_t)chunk + 4 + 4 + 1; // path_len(2) + path + content_len + content + offset(4) + write_id(4) + flags(1)
+        uint8_t flags = 0;
+        if (sent == 0) {
+            flags |= WRITE_FLAG_FIRST;
+        }
+        if (sent + chunk == size) {
+            flags |= WRITE_FLAG_LAST;
         }
 
-        // 在 notification+6 开始布局
+        // 在 notification+header_size 开始布局
+        uint8_t *payload = notification + header_size;
         // path_len
-        notification[6] = path_len & 0xFF;
-        notification[7] = (path_len >> 8) & 0xFF;
+        payload[0] = path_len & 0xFF;
+        payload[1] = (path_len >> 8) & 0xFF;
         // path
-        memcpy(notification + 8, path, path_len);
+        memcpy(payload + 2, path, path_len);
         // content_len
-        uint32_t content_len_pos = 8 + path_len;
-        notification[content_len_pos] = (chunk) & 0xFF;
-        notification[content_len_pos + 1] = ((chunk) >> 8) & 0xFF;
+        uint32_t content_len_pos = 2 + path_len;
+        if (version >= 2) {
+            write_u32(payload + content_len_pos, (uint32_t)chunk);
+        } else {
+            payload[content_len_pos] = (chunk) & 0xFF;
+            payload[content_len_pos + 1] = ((chunk) >> 8) & 0xFF;
+        }
         // content
-        memcpy(notification + content_len_pos + 2, buf + sent, chunk);
+        memcpy(payload + content_len_pos + len_size, buf + sent, chunk);
         // offset (absolute)
-        uint32_t off = (uint32_t)(offset + sent);
-        size_t off_pos = content_len_pos + 2 + chunk;
-        notification[off_pos] = off & 0xFF;
-        notification[off_pos + 1] = (off >> 8) & 0xFF;
-        notification[off_pos + 2] = (off >> 16) & 0xFF;
-        notification[off_pos + 3] = (off >> 24) & 0xFF;
+        write_u32(payload + content_len_pos + len_size + chunk, (uint32_t)(offset + sent));
+        // write_id 和分片标志
+        write_u32(payload + content_len_pos + len_size + chunk + 4, write_id);
+        payload[content_len_pos + len_size + chunk + 8] = flags;
 
-        size_t packet_size = create_response_packet(notification, 7, data_size_chunk, notification + 6);
+        // 通知由 helper 主动发出，请求ID固定为 0
+        size_t packet_size = create_response_packet(notification, version, 7, 0, data_size_chunk, payload);
 
-        // 确保 packet_size 不超过 PACKET_MAX_SIZE
-        if (packet_size > PACKET_MAX_SIZE) {
+        // 确保 packet_size 不超过协商的最大包长
+        if (packet_size > max_frame) {
             free(notification);
             return -EIO;
         }
 
-        ssize_t w = write(pipe_out_fd, notification, packet_size);
-        free(notification);
-        if (w < 0) {
+        if (write_packet(notification, packet_size) < 0) {
+            free(notification);
             return -EIO;
         }
 
         sent += chunk;
-    }
+    } while (sent < size);
 
+    free(notification);
     return size;
-}
\ No newline at end of file
+}
+
+// 向 Python 发出 0x0E 通知，数据为 event(1) path
+// 通知与写入通知经同一管道按顺序发出，Python 端收到时该文件之前的写入通知都已收到
+static int send_file_event(const char *path, uint8_t event, struct fuse_file_info *fi) {
+    if ((fi->fh & FH_WRITABLE) == 0) {
+        return 0;
+    }
+
+    int version;
+    uint32_t max_frame;
+    get_protocol(&version, &max_frame);
+
+    size_t header_size = packet_header_size(version);
+    size_t path_len = strlen(path);
+    uint8_t *packet = malloc(header_size + 1 + path_len + 4);
+    if (packet == NULL) {
+        return -ENOMEM;
+    }
+
+    // 在 packet+header_size 开始布局
+    uint8_t *payload = packet + header_size;
+    payload[0] = event;
+    memcpy(payload + 1, path, path_len);
+
+    // 通知由 helper 主动发出，请求ID固定为 0
+    size_t packet_size = create_response_packet(packet, version, 0x0E, 0, 1 + path_len, payload);
+    int result = write_packet(packet, packet_size) < 0 ? -EIO : 0;
+    free(packet);
+    return result;
+}
+
+int fusemod_flush(const char *path, struct fuse_file_info *fi) {
+    return send_file_event(path, FILE_EVENT_FLUSH, fi);
+}
+
+int fusemod_release(const char *path, struct fuse_file_info *fi) {
+    // release 的返回值被内核忽略
+    send_file_event(path, FILE_EVENT_RELEASE, fi);
+    return 0;
+}
+
+int fusemod_fsync(const char *path, int datasync, struct fuse_file_info *fi) {
+    (void) datasync;
+    return send_file_event(path, FILE_EVENT_FSYNC, fi);
+}
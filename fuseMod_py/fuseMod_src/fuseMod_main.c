@@ -6,12 +6,21 @@ pthread_mutex_t fs_mutex = PTHREAD_MUTEX_INITIALIZER;
 int pipe_in_fd = -1;
 int pipe_out_fd = -1;
 
+// 启动时使用版本 1 格式，协商后切换
+pthread_mutex_t pipe_out_mutex = PTHREAD_MUTEX_INITIALIZER;
+int protocol_version = 1;
+uint32_t max_frame_size = PACKET_MAX_SIZE;
+
 static struct fuse_operations fusemod_oper = {
+    .init = fusemod_init,
     .getattr = fusemod_getattr,
     .readdir = fusemod_readdir,
     .open = fusemod_open,
     .read = fusemod_read,
     .write = fusemod_write,
+    .flush = fusemod_flush,
+    .release = fusemod_release,
+    .fsync = fusemod_fsync,
 };
 
 int main(int argc, char *argv[]) {
@@ -23,6 +32,7 @@ int main(int argc, char *argv[]) {
 
     // 初始化文件系统
     init_filesystem();
+    DEBUG_LOG("CRC16: table-driven\n");
 
     // 创建命名管道
     create_pipes(argv[1], argv[2]);
@@ -1,189 +1,413 @@
 #include "fuseMod.h"
 
+// 执行单个操作（调用方需持有 fs_mutex）
+// version 决定数据中内容长度字段的宽度（版本 1 为 2 字节，版本 2 为 4 字节）
+int handle_operation(uint16_t type, const uint8_t *data, uint32_t data_size, int version) {
+    int operation_result = 0;
+
+    switch (type) {
+        case 1: { // 创建目录
+            if (data_size == 0) {
+                operation_result = ERR_INVALID_PATH;
+            } else {
+                uint8_t* cpath = ipath2c(data, data_size);
+                operation_result = create_directory((const char *)cpath);
+                free(cpath);
+            }
+            break;
+        }
+        case 2: // 创建可读写文件
+        {
+            if (data_size < 6) {
+                operation_result = ERR_INVALID_PACKET;
+            } else {
+                uint32_t flag = (uint32_t)data[0] | ((uint32_t)data[1] << 8) | ((uint32_t)data[2] << 16) | ((uint32_t)data[3] << 24);
+                uint16_t path_len = (data[5] << 8) | data[4];
+                // 按需内容的文件在路径后带 ttl_ms(4)
+                size_t ttl_size = (flag & FLAG_LAZY) ? 4 : 0;
+
+                if ((size_t)(6 + path_len + ttl_size) != data_size) {
+                    operation_result = ERR_INVALID_PACKET;
+                } else {
+                    uint32_t ttl_ms = ttl_size ? read_u32(data + 6 + path_len) : 0;
+                    uint8_t* cpath = ipath2c(data + 6, path_len);
+                    operation_result = create_file((const char *)cpath, flag, ttl_ms);
+                    free(cpath);
+                }
+            }
+            break;
+        }
+        case 3: { // 删除目录
+            if (data_size == 0) {
+                operation_result = ERR_INVALID_PATH;
+            } else {
+                uint8_t* cpath = ipath2c(data, data_size);
+                operation_result = delete_directory((const char *)cpath);
+                free(cpath);
+            }
+            break;
+        }
+        case 4: { // 删除文件
+            if (data_size == 0) {
+                operation_result = ERR_INVALID_PATH;
+            } else {
+                uint8_t* cpath = ipath2c(data, data_size);
+                operation_result = delete_file((const char *)cpath);
+                free(cpath);
+                // 唤醒等待该文件内容的读取和被暂停的写入
+                lazy_wake();
+                write_wake();
+            }
+            break;
+        }
+        case 5:   // 设置文件内容
+        case 6: { // 追加文件内容
+            char *path_str = NULL;
+            const uint8_t *content = NULL;
+            uint32_t content_len = 0;
+
+            operation_result = parse_path_content(data, data_size, version, &path_str, &content, &content_len);
+            if (operation_result == 0) {
+                if (type == 5) {
+                    operation_result = set_file_content(path_str, content, content_len);
+                } else {
+                    operation_result = append_file_content(path_str, content, content_len);
+                }
+                free(path_str);
+            }
+            break;
+        }
+
+        case PACKET_TYPE_SHM | 5:   // 设置文件内容，内容在共享内存中
+        case PACKET_TYPE_SHM | 6: { // 追加文件内容，内容在共享内存中
+            // 数据格式为: path_len(2) path pos(8) length(4)
+            if (data_size < 2) {
+                operation_result = ERR_INVALID_PACKET;
+                break;
+            }
+
+            uint16_t path_len = (data[1] << 8) | data[0];
+            if ((size_t)(2 + path_len + 12) != data_size) {
+                operation_result = ERR_INVALID_PACKET;
+                break;
+            }
+
+            uint64_t pos = read_u64(data + 2 + path_len);
+            uint32_t length = read_u32(data + 2 + path_len + 8);
+            const uint8_t *content = NULL;
+
+            operation_result = shm_in_data(pos, length, &content);
+            if (operation_result == 0) {
+                uint8_t* cpath = ipath2c(data + 2, path_len);
+                if ((type & ~PACKET_TYPE_SHM) == 5) {
+                    operation_result = set_file_content((const char *)cpath, content, length);
+                } else {
+                    operation_result = append_file_content((const char *)cpath, content, length);
+                }
+                free(cpath);
+
+                // 无论结果如何都回收这段空间，响应发出前完成
+                shm_in_release(pos, length);
+            }
+            break;
+        }
+
+        case 7:
+            break;
+
+        case 0x0B: { // 局部修改文件内容，数据格式为: offset(4) path_len(2) path content_len content
+            if (data_size < 4) {
+                operation_result = ERR_INVALID_PACKET;
+                break;
+            }
+
+            char *path_str = NULL;
+            const uint8_t *content = NULL;
+            uint32_t content_len = 0;
+
+            operation_result = parse_path_content(data + 4, data_size - 4, version, &path_str, &content, &content_len);
+            if (operation_result == 0) {
+                operation_result = patch_file_content(path_str, read_u32(data), content, content_len);
+                free(path_str);
+            }
+            break;
+        }
+
+        case 0x0C: { // 截断文件内容，数据格式为: size(4) path_len(2) path
+            if (data_size < 6) {
+                operation_result = ERR_INVALID_PACKET;
+                break;
+            }
+
+            uint16_t path_len = (data[5] << 8) | data[4];
+            if ((size_t)(6 + path_len) != data_size) {
+                operation_result = ERR_INVALID_PACKET;
+            } else {
+                uint8_t* cpath = ipath2c(data + 6, path_len);
+                operation_result = truncate_file_content((const char *)cpath, read_u32(data));
+                free(cpath);
+            }
+            break;
+        }
+
+        case 0x0D: { // 按需内容获取完成，数据格式为: status(1) path，status 非 0 表示获取失败
+            if (data_size < 2) {
+                operation_result = ERR_INVALID_PACKET;
+            } else {
+                uint8_t* cpath = ipath2c(data + 1, data_size - 1);
+                lazy_fetched((const char *)cpath, data[0]);
+                free(cpath);
+            }
+            break;
+        }
+
+        case 0x10: { // 暂停或恢复文件写入，数据格式为: hold(1) path，hold 非 0 表示暂停
+            if (data_size < 2) {
+                operation_result = ERR_INVALID_PACKET;
+            } else {
+                uint8_t* cpath = ipath2c(data + 1, data_size - 1);
+                write_hold((const char *)cpath, data[0]);
+                free(cpath);
+            }
+            break;
+        }
+
+        case 8: // 批量操作
+            operation_result = ERR_INVALID_TYPE;
+            break;
+
+        default:
+            operation_result = ERR_INVALID_TYPE;
+            break;
+    }
+
+    return operation_result;
+}
+
+// 执行批量操作，数据格式为: count(2) [type(2) size(2) data]...
+// 每个子操作的结果码依次写入 results，返回包本身的错误码
+int handle_batch(const uint8_t *data, uint32_t data_size, int version, uint8_t *results, uint16_t *count) {
+    if (data_size < 2) {
+        return ERR_INVALID_PACKET;
+    }
+
+    uint16_t total = (data[1] << 8) | data[0];
+    size_t pos = 2;
+
+    if (total > BATCH_MAX_OPS) {
+        return ERR_INVALID_PACKET;
+    }
+
+    // 先校验整个批量包，避免执行到一半才发现格式错误
+    for (uint16_t i = 0; i < total; i++) {
+        if (pos + 4 > data_size) {
+            return ERR_INVALID_PACKET;
+        }
+        uint16_t op_size = (data[pos + 3] << 8) | data[pos + 2];
+        pos += 4 + op_size;
+    }
+
+    if (pos != data_size) {
+        return ERR_INVALID_PACKET;
+    }
+
+    pos = 2;
+    for (uint16_t i = 0; i < total; i++) {
+        uint16_t op_type = (data[pos + 1] << 8) | data[pos];
+        uint16_t op_size = (data[pos + 3] << 8) | data[pos + 2];
+
+        if (op_type == 1 || op_type == 2 || op_type == 4) {
+            results[i] = (uint8_t)handle_operation(op_type, data + pos + 4, op_size, version);
+        } else {
+            results[i] = ERR_INVALID_TYPE;
+        }
+
+        pos += 4 + op_size;
+    }
+
+    *count = total;
+    return 0;
+}
+
+// 处理协议协商请求，数据格式为: version(2) max_frame_size(4) [flags(2) crc_sample(2)]
+// 响应数据为: err(1) version(2) max_frame_size(4) flags(2) crc_sample(2)，返回响应数据长度
+size_t handle_negotiate(const uint8_t *data, uint32_t data_size, uint8_t *response_data,
+                        int *agreed_version, uint32_t *agreed_max_frame,
+                        uint16_t *agreed_flags, uint16_t *agreed_sample) {
+    if (data_size < 6) {
+        response_data[0] = ERR_INVALID_PACKET;
+        return 1;
+    }
+
+    uint16_t version = (data[1] << 8) | data[0];
+    uint32_t max_frame = read_u32(data + 2);
+
+    // 双方都支持的最高版本，版本 1 保持原有 3KB 分包
+    *agreed_version = version < PROTOCOL_VERSION ? version : PROTOCOL_VERSION;
+    if (*agreed_version < 2) {
+        *agreed_version = 1;
+        *agreed_max_frame = PACKET_MAX_SIZE;
+    } else {
+        *agreed_max_frame = max_frame < PACKET_MAX_FRAME_LIMIT ? max_frame : PACKET_MAX_FRAME_LIMIT;
+        if (*agreed_max_frame < PACKET_MAX_SIZE) {
+            *agreed_max_frame = PACKET_MAX_SIZE;
+        }
+    }
+
+    // 可信本地管道模式由 Python 端请求，本端直接接受
+    *agreed_flags = 0;
+    *agreed_sample = 0;
+    if (data_size >= 10) {
+        *agreed_flags = ((data[7] << 8) | data[6]) & NEGOTIATE_FLAG_TRUSTED;
+        *agreed_sample = (data[9] << 8) | data[8];
+    }
+
+    response_data[0] = 0;
+    response_data[1] = *agreed_version & 0xFF;
+    response_data[2] = (*agreed_version >> 8) & 0xFF;
+    write_u32(response_data + 3, *agreed_max_frame);
+    response_data[7] = *agreed_flags & 0xFF;
+    response_data[8] = (*agreed_flags >> 8) & 0xFF;
+    response_data[9] = *agreed_sample & 0xFF;
+    response_data[10] = (*agreed_sample >> 8) & 0xFF;
+    return 11;
+}
+
 void *pipe_listener(void *arg) {
-    uint8_t buffer[4096];
-    uint8_t response[4096];
+    size_t buffer_size = PACKET_MAX_SIZE + PACKET_MIN_SIZE_V2;
+    uint8_t *buffer = malloc(buffer_size);
+    uint8_t response[PACKET_MIN_SIZE_V2 + BATCH_MAX_OPS + 16];
+    uint8_t response_data[BATCH_MAX_OPS + 16];
     ssize_t bytes_read;
-    uint8_t err;
     size_t response_size;
 
-    while ((bytes_read = read(pipe_in_fd, buffer, PACKET_MIN_SIZE)) > 0) {
-        uint16_t type, data_size;
+    if (buffer == NULL) {
+        send_error_and_exit(0, "pipe_listener malloc");
+    }
+
+    while ((bytes_read = read_full(pipe_in_fd, buffer, PACKET_MIN_SIZE)) > 0) {
+        packet_info_t info = {0};
         const uint8_t *data;
         int result = ERR_INVALID_PACKET;
+        int version;
+        uint32_t max_frame;
+
+        get_protocol(&version, &max_frame);
 
         if (bytes_read != PACKET_MIN_SIZE){
             goto bad_packet;
         }
 
-        result = get_packet_size(buffer, bytes_read, &type, &data_size);
+        result = get_packet_size(buffer, bytes_read, &info);
         if (result != 0){
             goto bad_packet;
         }
 
         result = ERR_INVALID_PACKET;
-        bytes_read = read(pipe_in_fd, buffer + PACKET_MIN_SIZE, data_size);
-        if (bytes_read != data_size){
+        size_t packet_size = info.header_size + info.data_size + 4;
+        if (packet_size > max_frame || packet_size > buffer_size){
+            goto bad_packet;
+        }
+
+        bytes_read = read_full(pipe_in_fd, buffer + PACKET_MIN_SIZE, packet_size - PACKET_MIN_SIZE);
+        if (bytes_read != (ssize_t)(packet_size - PACKET_MIN_SIZE)){
             goto bad_packet;
         }
  
-        result = validate_packet(buffer, bytes_read + PACKET_MIN_SIZE, &data);
+        result = validate_packet(buffer, packet_size, &info, &data);
         if (result != 0){
             goto bad_packet;
         }
-        
-        pthread_mutex_lock(&fs_mutex);
-        int operation_result = 0;
 
-        switch (type) {
-            case 1: { // 创建目录
-                if (data_size == 0) {
-                    operation_result = ERR_INVALID_PATH;
-                } else {
-                    uint8_t* cpath = ipath2c(data, data_size);
-                    operation_result = create_directory((const char *)cpath);
-                    free(cpath);
-                }
-                break;
-            }
-            case 2: // 创建可读写文件
-            {
-                if (data_size < 6) {
-                    operation_result = ERR_INVALID_PACKET;
-                } else {
-                    uint32_t flag = (uint32_t)data[0] | ((uint32_t)data[1] << 8) | ((uint32_t)data[2] << 16) | ((uint32_t)data[3] << 24);
-                    uint16_t path_len = (data[5] << 8) | data[4];
-
-                    if ((size_t)(6 + path_len) != data_size) {
-                        operation_result = ERR_INVALID_PACKET;
-                    } else {
-                        uint8_t* cpath = ipath2c(data + 6, path_len);
-                        operation_result = create_file((const char *)cpath, flag);
-                        free(cpath);
-                    }
-                }
-                break;
-            }
-            case 3: { // 删除目录
-                if (data_size == 0) {
-                    operation_result = ERR_INVALID_PATH;
-                } else {
-                    uint8_t* cpath = ipath2c(data, data_size);
-                    operation_result = delete_directory((const char *)data);
-                    free(cpath);
-                }
-                break;
-            }
-            case 4: { // 删除文件
-                if (data_size == 0) {
-                    operation_result = ERR_INVALID_PATH;
-                } else {
-                    uint8_t* cpath = ipath2c(data, data_size);
-                    operation_result = delete_file((const char *)data);
-                    free(cpath);
-                }
-                break;
+        if (info.type == 9) {
+            // 协议协商：先用当前格式回复，再切换到协商后的格式
+            int agreed_version = version;
+            uint32_t agreed_max_frame = max_frame;
+            uint16_t agreed_flags = 0;
+            uint16_t agreed_sample = 0;
+            size_t negotiate_size = handle_negotiate(data, info.data_size, response_data, &agreed_version, &agreed_max_frame,
+                                                     &agreed_flags, &agreed_sample);
+
+            response_size = create_response_packet(response, version, info.type, info.id, negotiate_size, response_data);
+            if (write_packet(response, response_size) < 0){
+                send_error_and_exit(0, "write pipe_out_fd failed");
             }
-            case 5: { // 设置文件内容
-                if (data_size < 4) {
-                    operation_result = ERR_INVALID_PACKET;
-                } else {
-                    uint16_t path_len = (data[1] << 8) | data[0];
-                    if (4 + path_len > data_size) {
-                        operation_result = ERR_INVALID_PACKET;
-                    } else {
-                        uint16_t content_len = (data[path_len + 3] << 8) | data[path_len + 2];
-                        if (4 + path_len + content_len != data_size) {
-                            operation_result = ERR_INVALID_PACKET;
-                        } else {
-                            char *path_str = malloc(path_len + 1);
-                            if (path_str == NULL) {
-                                operation_result = ERR_IO_ERROR;
-                            } else {
-                                memcpy(path_str, data + 2, path_len);
-                                path_str[path_len] = '\0';
-                                
-                                operation_result = set_file_content(
-                                    path_str, 
-                                    data + 4 + path_len, 
-                                    content_len
-                                );
-                                
-                                free(path_str);
-                            }
-                        }
-                    }
-                }
-                break;
+
+            if (response_data[0] != 0) {
+                send_error_and_exit(response_data[0], "Negotiate failed");
             }
-            case 6: { // 追加文件内容
-                if (data_size < 4) {
-                    operation_result = ERR_INVALID_PACKET;
-                } else {
-                    uint16_t path_len = (data[1] << 8) | data[0];
-                    if (4 + path_len > data_size) {
-                        operation_result = ERR_INVALID_PACKET;
-                    } else {
-                        uint16_t content_len = (data[path_len + 3] << 8) | data[path_len + 2];
-                        if (4 + path_len + content_len != data_size) {
-                            operation_result = ERR_INVALID_PACKET;
-                        } else {
-                            char *path_str = malloc(path_len + 1);
-                            if (path_str == NULL) {
-                                operation_result = ERR_IO_ERROR;
-                            } else {
-                                memcpy(path_str, data + 2, path_len);
-                                path_str[path_len] = '\0';
-                                
-                                operation_result = append_file_content(
-                                    path_str, 
-                                    data + 4 + path_len, 
-                                    content_len
-                                );
-                                
-                                free(path_str);
-                            }
-                        }
-                    }
+
+            size_t new_size = agreed_max_frame + PACKET_MIN_SIZE_V2;
+            if (new_size > buffer_size) {
+                uint8_t *new_buffer = realloc(buffer, new_size);
+                if (new_buffer == NULL) {
+                    send_error_and_exit(ERR_IO_ERROR, "pipe_listener realloc");
                 }
-                break;
+                buffer = new_buffer;
+                buffer_size = new_size;
             }
 
-            case 7:
-                break;
+            set_protocol(agreed_version, agreed_max_frame);
+            set_crc_mode((agreed_flags & NEGOTIATE_FLAG_TRUSTED) != 0, agreed_sample);
+            continue;
+        }
 
-            default:
-                operation_result = ERR_INVALID_TYPE;
-                break;
+        if (info.type == 10) {
+            // 挂载共享内存数据通道，失败时只回复错误码，Python 端继续只用管道
+            response_data[0] = (uint8_t)shm_attach(data, info.data_size);
+
+            response_size = create_response_packet(response, version, info.type, info.id, 1, response_data);
+            if (write_packet(response, response_size) < 0){
+                send_error_and_exit(0, "write pipe_out_fd failed");
+            }
+            continue;
         }
         
+        pthread_mutex_lock(&fs_mutex);
+        int operation_result = 0;
+        uint32_t response_data_size = 1;
+
+        if (info.type == 8) {
+            uint16_t count = 0;
+            operation_result = handle_batch(data, info.data_size, info.version, response_data + 3, &count);
+            response_data[1] = count & 0xFF;
+            response_data[2] = (count >> 8) & 0xFF;
+            response_data_size = 3 + count;
+        } else {
+            operation_result = handle_operation(info.type, data, info.data_size, info.version);
+        }
+        response_data[0] = (uint8_t)operation_result;
+
         pthread_mutex_unlock(&fs_mutex);
         
-        
-        err = (uint8_t)operation_result;
+        // 批量操作的子操作结果在 response_data 中，只有整体错误才视为失败
         response_size = create_response_packet(
             response, 
-            type,
-            1, 
-            &err
+            version,
+            info.type,
+            info.id,
+            response_data_size, 
+            response_data
         );
         
-        if (write(pipe_out_fd, response, response_size) < 0){
+        if (write_packet(response, response_size) < 0){
             send_error_and_exit(0, "write pipe_out_fd failed");
         }
         
-        if (operation_result != 0) {
+        // 局部修改和截断失败（如与删除文件竞争）只在响应中返回错误，由 Python 端改为完整设置内容
+        if (operation_result != 0 && info.type != 0x0B && info.type != 0x0C) {
             send_error_and_exit(operation_result, "Operation failed");
         }
 
         continue;
 bad_packet:
-        err = result;
-        response_size = create_response_packet(response, type, 1, &err);
-        write(pipe_out_fd, response, response_size);
+        response_data[0] = result;
+        response_size = create_response_packet(response, version, info.type, info.id, 1, response_data);
+        write_packet(response, response_size);
         break;
     }
 
+    free(buffer);
     send_error_and_exit(0, "pipe_listener exit");
     return NULL;
 }
@@ -0,0 +1,137 @@
+#include "fuseMod.h"
+#include <sys/mman.h>
+
+// 基于 memfd 的单生产者单消费者环形缓冲区，由 Python 端创建并通过继承的 fd 传给本进程
+// 位置 pos 为单调递增的 64 位绝对位置，数据区偏移为 pos % size
+typedef struct {
+    uint8_t *base;   // 区域起始地址，开头为 tail(8)
+    size_t size;     // 数据区大小
+    uint64_t head;   // 生产方写入位置，只在本进程中使用
+} shm_ring_t;
+
+static shm_ring_t shm_in = {0};   // Python -> helper，本进程为消费方
+static shm_ring_t shm_out = {0};  // helper -> Python，本进程为生产方
+static pthread_mutex_t shm_out_mutex = PTHREAD_MUTEX_INITIALIZER;
+
+static int shm_map(shm_ring_t *ring, int fd, uint32_t size) {
+    if (size == 0) {
+        return 0;
+    }
+
+    void *base = mmap(NULL, SHM_HEADER_SIZE + (size_t)size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    if (base == MAP_FAILED) {
+        return ERR_IO_ERROR;
+    }
+
+    // 映射建立后不再需要 fd
+    close(fd);
+    ring->base = base;
+    ring->size = size;
+    ring->head = 0;
+    return 0;
+}
+
+// 挂载共享内存，数据格式为: in_fd(4) in_size(4) out_fd(4) out_size(4)
+// size 为 0 表示该方向不使用共享内存
+int shm_attach(const uint8_t *data, uint32_t data_size) {
+    if (data_size != 16) {
+        return ERR_INVALID_PACKET;
+    }
+
+    pthread_mutex_lock(&shm_out_mutex);
+    if (shm_in.base != NULL || shm_out.base != NULL) {
+        pthread_mutex_unlock(&shm_out_mutex);
+        return ERR_INVALID_OPERATION;
+    }
+
+    int result = shm_map(&shm_in, (int)read_u32(data), read_u32(data + 4));
+    if (result == 0) {
+        result = shm_map(&shm_out, (int)read_u32(data + 8), read_u32(data + 12));
+        if (result != 0 && shm_in.base != NULL) {
+            munmap(shm_in.base, SHM_HEADER_SIZE + shm_in.size);
+            shm_in.base = NULL;
+        }
+    }
+    pthread_mutex_unlock(&shm_out_mutex);
+    return result;
+}
+
+// 按描述符取得 Python 写入的内容，描述符不合法时返回 ERR_INVALID_PACKET
+int shm_in_data(uint64_t pos, uint32_t length, const uint8_t **content) {
+    if (shm_in.base == NULL) {
+        return ERR_INVALID_OPERATION;
+    }
+
+    size_t offset = pos % shm_in.size;
+    if (length > shm_in.size || offset + length > shm_in.size) {
+        return ERR_INVALID_PACKET;
+    }
+
+    *content = shm_in.base + SHM_HEADER_SIZE + offset;
+    return 0;
+}
+
+// 内容已处理完，把 tail 推进到该段末尾，Python 端之后可以覆盖这段空间
+void shm_in_release(uint64_t pos, uint32_t length) {
+    uint64_t *tail = (uint64_t *)shm_in.base;
+    uint64_t end = pos + length;
+    if (end > __atomic_load_n(tail, __ATOMIC_RELAXED)) {
+        __atomic_store_n(tail, end, __ATOMIC_RELEASE);
+    }
+}
+
+// 通过共享内存发送一次完整的写入通知，数据格式为:
+// path_len(2) path pos(8) length(4) offset(4) write_id(4) flags(1)
+// 返回 1 表示已发送，0 表示共享内存不可用或空间不足（调用方改用管道分片发送），负数为错误
+int shm_send_write(const char *path, uint16_t path_len, const char *buf, size_t size, off_t offset,
+                   uint32_t write_id, int version) {
+    pthread_mutex_lock(&shm_out_mutex);
+
+    if (shm_out.base == NULL || size > shm_out.size) {
+        pthread_mutex_unlock(&shm_out_mutex);
+        return 0;
+    }
+
+    uint64_t pos = shm_out.head;
+    size_t ring_offset = pos % shm_out.size;
+    if (ring_offset + size > shm_out.size) {
+        // 末尾放不下，从数据区开头写
+        pos += shm_out.size - ring_offset;
+        ring_offset = 0;
+    }
+
+    uint64_t tail = __atomic_load_n((uint64_t *)shm_out.base, __ATOMIC_ACQUIRE);
+    if (pos + size - tail > shm_out.size) {
+        pthread_mutex_unlock(&shm_out_mutex);
+        return 0;
+    }
+
+    size_t header_size = packet_header_size(version);
+    uint32_t data_size = 2 + path_len + 8 + 4 + 4 + 4 + 1;
+    uint8_t *notification = malloc(header_size + data_size + 4);
+    if (notification == NULL) {
+        pthread_mutex_unlock(&shm_out_mutex);
+        return -ENOMEM;
+    }
+
+    memcpy(shm_out.base + SHM_HEADER_SIZE + ring_offset, buf, size);
+    shm_out.head = pos + size;
+
+    uint8_t *payload = notification + header_size;
+    payload[0] = path_len & 0xFF;
+    payload[1] = (path_len >> 8) & 0xFF;
+    memcpy(payload + 2, path, path_len);
+    write_u64(payload + 2 + path_len, pos);
+    write_u32(payload + 2 + path_len + 8, (uint32_t)size);
+    write_u32(payload + 2 + path_len + 12, (uint32_t)offset);
+    write_u32(payload + 2 + path_len + 16, write_id);
+    payload[2 + path_len + 20] = WRITE_FLAG_FIRST | WRITE_FLAG_LAST;
+
+    // 持有 shm_out_mutex 直到写出，保证描述符按分配顺序到达 Python 端
+    size_t packet_size = create_response_packet(notification, version, 7 | PACKET_TYPE_SHM, 0, data_size, payload);
+    ssize_t w = write_packet(notification, packet_size);
+    pthread_mutex_unlock(&shm_out_mutex);
+
+    free(notification);
+    return w < 0 ? -EIO : 1;
+}
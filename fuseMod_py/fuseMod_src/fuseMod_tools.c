@@ -1,12 +1,12 @@
 #include "fuseMod.h"
 
-// CRC16-CCITT 计算函数
-uint16_t crc16_ccitt(const uint8_t *data, size_t length) {
-    uint16_t crc = 0;
-    
-    for (size_t i = 0; i < length; i++) {
-        crc ^= (uint16_t)data[i] << 8;
-        
+// CRC16-CCITT 查表实现，表在第一次使用时生成
+static uint16_t crc16_table[256];
+static pthread_once_t crc16_table_once = PTHREAD_ONCE_INIT;
+
+static void crc16_init_table(void) {
+    for (int i = 0; i < 256; i++) {
+        uint16_t crc = (uint16_t)(i << 8);
         for (int j = 0; j < 8; j++) {
             if (crc & 0x8000) {
                 crc = (crc << 1) ^ 0x1021;
@@ -14,60 +14,152 @@ uint16_t crc16_ccitt(const uint8_t *data, size_t length) {
                 crc <<= 1;
             }
         }
+        crc16_table[i] = crc;
+    }
+}
+
+// CRC16-CCITT 计算函数
+uint16_t crc16_ccitt(const uint8_t *data, size_t length) {
+    uint16_t crc = 0;
+
+    pthread_once(&crc16_table_once, crc16_init_table);
+    for (size_t i = 0; i < length; i++) {
+        crc = (uint16_t)(crc << 8) ^ crc16_table[(crc >> 8) ^ data[i]];
     }
     
     return crc;
 }
 
+// 可信本地管道模式：CRC 为 0 表示发送方未计算，接收方跳过校验
+// crc_sample 为 N 时每 N 个包计算一次 CRC，为 0 时都不计算
+static int crc_trusted = 0;
+static uint16_t crc_sample = 0;
+static uint32_t crc_counter = 0;
+
+void set_crc_mode(int trusted, uint16_t sample) {
+    pthread_mutex_lock(&pipe_out_mutex);
+    crc_trusted = trusted;
+    crc_sample = sample;
+    crc_counter = 0;
+    pthread_mutex_unlock(&pipe_out_mutex);
+}
+
+int get_crc_trusted(void) {
+    pthread_mutex_lock(&pipe_out_mutex);
+    int trusted = crc_trusted;
+    pthread_mutex_unlock(&pipe_out_mutex);
+    return trusted;
+}
+
+// 发送方计算包的 CRC，可信模式下未抽中的包返回 0
+static uint16_t packet_crc(const uint8_t *packet, size_t length) {
+    pthread_mutex_lock(&pipe_out_mutex);
+    int compute = !crc_trusted || (crc_sample != 0 && crc_counter++ % crc_sample == 0);
+    pthread_mutex_unlock(&pipe_out_mutex);
+    return compute ? crc16_ccitt(packet, length) : 0;
+}
+
 uint8_t *ipath2c(const uint8_t* path, size_t len){
     uint8_t *res = (uint8_t *)malloc(len + 1);
+    if (res == NULL) {
+        return NULL;
+    }
     memcpy(res, path, len);
     res[len] = 0;
     return res;
 }
 
-// 验证包格式和CRC
-int get_packet_size(const uint8_t *packet, size_t size, uint16_t *type, uint16_t *data_size){
+uint32_t read_u32(const uint8_t *p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+void write_u32(uint8_t *p, uint32_t value) {
+    p[0] = value & 0xFF;
+    p[1] = (value >> 8) & 0xFF;
+    p[2] = (value >> 16) & 0xFF;
+    p[3] = (value >> 24) & 0xFF;
+}
+
+uint64_t read_u64(const uint8_t *p) {
+    return (uint64_t)read_u32(p) | ((uint64_t)read_u32(p + 4) << 32);
+}
+
+void write_u64(uint8_t *p, uint64_t value) {
+    write_u32(p, (uint32_t)value);
+    write_u32(p + 4, (uint32_t)(value >> 32));
+}
+
+size_t packet_header_size(int version) {
+    return version >= 2 ? PACKET_HEADER_SIZE_V2 : PACKET_HEADER_SIZE;
+}
+
+// 读取当前协商的协议版本和最大包长
+void get_protocol(int *version, uint32_t *max_frame) {
+    pthread_mutex_lock(&pipe_out_mutex);
+    *version = protocol_version;
+    *max_frame = max_frame_size;
+    pthread_mutex_unlock(&pipe_out_mutex);
+}
+
+void set_protocol(int version, uint32_t max_frame) {
+    pthread_mutex_lock(&pipe_out_mutex);
+    protocol_version = version;
+    max_frame_size = max_frame;
+    pthread_mutex_unlock(&pipe_out_mutex);
+}
+
+// 解析包头，按包头魔数区分版本 1（16 位长度）和版本 2（32 位长度）
+int get_packet_size(const uint8_t *packet, size_t size, packet_info_t *info){
     if (size < PACKET_MIN_SIZE) {
         return ERR_INVALID_PACKET;
     }
  
     // 检查包头
-    if (packet[0] != 0x54 || packet[1] != 0x32) {
+    if (packet[0] != 0x54 || (packet[1] != 0x32 && packet[1] != 0x33)) {
         return ERR_INVALID_PACKET;
     }
 
-    // 提取类型和数据大小
-    *type = (packet[3] << 8) | packet[2];
-    *data_size = (packet[5] << 8) | packet[4];
+    info->version = packet[1] == 0x33 ? 2 : 1;
+    info->header_size = packet_header_size(info->version);
+
+    // 提取类型、请求ID和数据大小
+    info->type = (packet[3] << 8) | packet[2];
+    info->id = (packet[5] << 8) | packet[4];
+    if (info->version >= 2) {
+        info->data_size = read_u32(packet + 6);
+    } else {
+        info->data_size = (packet[7] << 8) | packet[6];
+    }
 
     return 0;
 }
 
-int validate_packet(const uint8_t *packet, size_t size, const uint8_t **data) {
+// 验证包格式和CRC
+int validate_packet(const uint8_t *packet, size_t size, const packet_info_t *info, const uint8_t **data) {
     
     // 检查包尾
     if (packet[size - 2] != 0x23 || packet[size - 1] != 0x45) {
         return ERR_INVALID_PACKET;
     }
 
-    uint16_t data_size = (packet[5] << 8) | packet[4];
-    
     // 检查数据大小是否匹配
-    if (size != PACKET_MIN_SIZE + data_size) {
+    if (size != info->header_size + info->data_size + 4) {
         return ERR_INVALID_PACKET;
     }
     
     // 提取数据指针
-    *data = packet + 6;
+    *data = packet + info->header_size;
     
     // 计算并验证CRC
     uint16_t expected_crc = packet[size - 4] | (packet[size - 3] << 8);
+    if (expected_crc == 0 && get_crc_trusted()) {
+        return 0;
+    }
     uint16_t actual_crc = crc16_ccitt(packet, size - 4);
 
     DEBUG_LOG("C received: ");
 
-    for (int i = 0; i < size; i++){
+    for (size_t i = 0; i < size; i++){
         DEBUG_LOG("%02x", packet[i]);
     }
 
@@ -80,36 +172,114 @@ int validate_packet(const uint8_t *packet, size_t size, const uint8_t **data) {
     return 0;
 }
 
-// 创建响应包
-size_t create_response_packet(uint8_t *buffer, uint16_t type, uint16_t data_size, const uint8_t *data) {
+// 创建响应包，回传请求ID以便 Python 端按ID完成请求
+// 版本 1 包头为 0x5402，版本 2 包头为 0x5403 且长度字段为 32 位
+size_t create_response_packet(uint8_t *buffer, int version, uint16_t type, uint16_t id, uint32_t data_size, const uint8_t *data) {
+    size_t header_size = packet_header_size(version);
+
+    // data 可能与 buffer 重叠，先移动数据再写包头
+    if (data_size > 0 && data != NULL) {
+        memmove(buffer + header_size, data, data_size);
+    }
+
     buffer[0] = 0x54;
-    buffer[1] = 0x02;
+    buffer[1] = version >= 2 ? 0x03 : 0x02;
     buffer[2] = type & 0xFF;
     buffer[3] = (type >> 8) & 0xFF;
-    buffer[4] = data_size & 0xFF;
-    buffer[5] = (data_size >> 8) & 0xFF;
-    
-    if (data_size > 0 && data != NULL) {
-        memcpy(buffer + 6, data, data_size);
+    buffer[4] = id & 0xFF;
+    buffer[5] = (id >> 8) & 0xFF;
+    if (version >= 2) {
+        write_u32(buffer + 6, data_size);
+    } else {
+        buffer[6] = data_size & 0xFF;
+        buffer[7] = (data_size >> 8) & 0xFF;
     }
     
     // 计算CRC
-    uint16_t crc = crc16_ccitt(buffer, 6 + data_size);
+    uint16_t crc = packet_crc(buffer, header_size + data_size);
 
-    buffer[6 + data_size] = crc & 0xFF;
-    buffer[6 + data_size + 1] = (crc >> 8) & 0xFF;
+    buffer[header_size + data_size] = crc & 0xFF;
+    buffer[header_size + data_size + 1] = (crc >> 8) & 0xFF;
     
     // 添加包尾
-    buffer[6 + data_size + 2] = 0x23;
-    buffer[6 + data_size + 3] = 0x45;
+    buffer[header_size + data_size + 2] = 0x23;
+    buffer[header_size + data_size + 3] = 0x45;
 
     DEBUG_LOG("C response: ");
-    for (int i = 0; i < 6 + data_size + 4; i++){
+    for (size_t i = 0; i < header_size + data_size + 4; i++){
         DEBUG_LOG("%02x", buffer[i]);
     }
     DEBUG_LOG(" %d %02x\n", crc, crc);
     
-    return 6 + data_size + 4;
+    return header_size + data_size + 4;
+}
+
+// 写出完整的包，包可能大于 PIPE_BUF，加锁避免多个线程的包交错
+ssize_t write_packet(const uint8_t *packet, size_t size) {
+    size_t total = 0;
+    pthread_mutex_lock(&pipe_out_mutex);
+    while (total < size) {
+        ssize_t n = write(pipe_out_fd, packet + total, size - total);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n < 0) {
+            pthread_mutex_unlock(&pipe_out_mutex);
+            return n;
+        }
+        total += n;
+    }
+    pthread_mutex_unlock(&pipe_out_mutex);
+    return total;
+}
+
+// 解析 path_len(2) path content_len(2/4) content 格式的数据
+int parse_path_content(const uint8_t *data, uint32_t data_size, int version,
+                       char **path, const uint8_t **content, uint32_t *content_len) {
+    size_t len_size = version >= 2 ? 4 : 2;
+
+    if (data_size < 2 + len_size) {
+        return ERR_INVALID_PACKET;
+    }
+
+    uint16_t path_len = (data[1] << 8) | data[0];
+    if (2 + path_len + len_size > data_size) {
+        return ERR_INVALID_PACKET;
+    }
+
+    if (version >= 2) {
+        *content_len = read_u32(data + 2 + path_len);
+    } else {
+        *content_len = (data[path_len + 3] << 8) | data[path_len + 2];
+    }
+
+    if (2 + path_len + len_size + (size_t)*content_len != data_size) {
+        return ERR_INVALID_PACKET;
+    }
+
+    *path = (char *)ipath2c(data + 2, path_len);
+    if (*path == NULL) {
+        return ERR_IO_ERROR;
+    }
+
+    *content = data + 2 + path_len + len_size;
+    return 0;
+}
+
+// 读取指定长度数据，处理管道的短读
+ssize_t read_full(int fd, uint8_t *buffer, size_t size) {
+    size_t total = 0;
+    while (total < size) {
+        ssize_t n = read(fd, buffer + total, size - total);
+        if (n < 0 && errno == EINTR) {
+            continue;
+        }
+        if (n <= 0) {
+            return total > 0 ? (ssize_t)total : n;
+        }
+        total += n;
+    }
+    return total;
 }
 
 // 发送错误并退出
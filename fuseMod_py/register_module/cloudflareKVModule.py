@@ -1,10 +1,11 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import aiohttp
 import asyncio
 import time
 
 from ..VF_File import VF_File
 from ..VF_Module import VF_Module
+from ..VF_Store import Blob, ContentStore
 
 async def put_kv_value(account_id, namespace_id, api_key, key, value):
     url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/storage/kv/namespaces/{namespace_id}/values/{key}"
@@ -36,21 +37,31 @@ async def get_kv_value(account_id, namespace_id, api_key, key):
         return None
 
 class CloudFlareKVFile(VF_File):
-    def __init__(self, flag, argv) -> None:
-        super().__init__(flag)
+    def __init__(self, flag, argv, store: ContentStore) -> None:
+        # 按需获取时，更新间隔作为内容有效期
+        super().__init__(flag, argv["updateTimeMin"] * 60)
         self.argv = argv
         self.hasInit = False
+        # 最新的值保存在共享的内容存储中，较大的值映射到磁盘
+        self.store = store
+        self.content: Optional[Blob] = None
+
+    def set_content(self, value: bytes) -> memoryview:
+        """保存最新的值，返回其只读视图"""
+        if self.content is not None:
+            self.content.close()
+        self.content = self.store.put(value)
+        return self.content.view()
     
-    def write(self, buffer: bytes, offset: int) -> None:
-        self.content = buffer
-        asyncio.create_task(
-            put_kv_value(
+    async def awrite(self, buffer: bytes, offset: int) -> None:
+        self.set_content(buffer)
+        await put_kv_value(
             self.argv["account_id"],
             self.argv["namespace_id"],
             self.argv["api_key"],
             self.argv["key"],
             buffer
-        ))
+        )
         
     async def read(self):
         
@@ -70,7 +81,24 @@ class CloudFlareKVFile(VF_File):
             if res == None:
                 continue
             else:
-                return res.encode()
+                return self.set_content(res.encode())
+
+    async def fetch(self):
+        res = await get_kv_value(
+            self.argv["account_id"],
+            self.argv["namespace_id"],
+            self.argv["api_key"],
+            self.argv["key"],
+        )
+
+        if res == None:
+            raise IOError(f"get kv value failed: {self.argv['key']}")
+        return self.set_content(res.encode())
+
+    async def rm(self) -> None:
+        if self.content is not None:
+            self.content.close()
+            self.content = None
 
 class CloudFlareKVInstance(VF_Module):
     def __init__(self, global_table: Dict, enableDebug=False) -> None:
@@ -79,11 +107,19 @@ class CloudFlareKVInstance(VF_Module):
         
     def init_from_config(self):
         config = self.read_config("cloudflareKV")
-        for instance in config["instances"]:
-            self.register_file(instance["name"], instance["argv"])
+        self.load_update_policy(config)
+        self.register_instances(config["instances"])
+
+    def reload_config(self):
+        config = self.read_config("cloudflareKV")
+        self.load_update_policy(config)
+        return self.reload_instances(config["instances"])
     
     def create_file(self, name: str, kwargs: Dict[str, Any]) -> "VF_File | None":
-        return CloudFlareKVFile(VF_File.FLAG_READ | VF_File.FLAG_WRITE | VF_File.FLAG_COPY_ON_WRITE, kwargs)
+        flag = VF_File.FLAG_READ | VF_File.FLAG_WRITE | VF_File.FLAG_COPY_ON_WRITE
+        if kwargs.get("lazy", 0):
+            flag |= VF_File.FLAG_LAZY
+        return CloudFlareKVFile(flag, kwargs, self.get_content_store())
 
 
 class CloudFlareKVModule(VF_Module):
@@ -87,12 +87,21 @@ class EmailFile(VF_File):
         self.subject = kwargs["subject"]
         self.ssl = kwargs["ssl"]
         self.tls = kwargs["tls"]
+        # 一次打开期间写入的内容，关闭文件时作为一封邮件发送
+        self.context = bytearray()
 
-    def write(self, buffer: bytes, offset: int) -> None:
-        try:
-            asyncio.create_task(send_email(self.host, self.port, self.account, self.password, self.sender, self.sender_email, self.receiver, self.receiver_email, self.subject, buffer, self.ssl, self.tls))
-        except:
-            pass
+    async def awrite(self, buffer: bytes, offset: int) -> None:
+        end = offset + len(buffer)
+        if end > len(self.context):
+            self.context.extend(b"\0" * (end - len(self.context)))
+        self.context[offset:end] = buffer
+
+    async def on_close(self) -> None:
+        if not self.context:
+            return
+        context = bytes(self.context)
+        self.context = bytearray()
+        await send_email(self.host, self.port, self.account, self.password, self.sender, self.sender_email, self.receiver, self.receiver_email, self.subject, context, self.ssl, self.tls)
     
 
 class EmailModule(VF_Module):
@@ -102,8 +111,13 @@ class EmailModule(VF_Module):
 
     def init_email_form_config(self):
         config = self.read_config("email")
-        for instance in config["instances"]:
-            self.register_file(instance["name"], instance["argv"])
+        self.load_update_policy(config)
+        self.register_instances(config["instances"])
+
+    def reload_config(self):
+        config = self.read_config("email")
+        self.load_update_policy(config)
+        return self.reload_instances(config["instances"])
 
     def create_file(self, name: str, kwargs: Dict[str, Any]) -> VF_File:
         return EmailFile(VF_File.FLAG_WRITE, kwargs)
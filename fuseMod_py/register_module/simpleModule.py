@@ -1,30 +1,14 @@
 # 示例使用
-import asyncio
 from ..VF_File import VF_File
+from ..VF_Buffer import BufferedVF_File
 from ..VF_Module import VF_Module
-from typing import Optional, List, Dict, Any, Callable, Tuple
+from typing import Dict, Any
+
+class SimpleFile(BufferedVF_File):
+    """写入的内容保存在内存中，每次写入后推送回 FUSE 模块"""
 
-class SimpleFile(VF_File):
     def __init__(self, **kwargs) -> None:
         super().__init__(VF_File.FLAG_WRITE | VF_File.FLAG_READ)
-        self.content = b""
-        self.read_event = asyncio.Event()
-    
-    def write(self, buffer: bytes, offset: int) -> None:
-        # 简单的写入实现
-        if offset + len(buffer) > len(self.content):
-            self.content += b"\0" * (offset + len(buffer) - len(self.content))
-        self.content = self.content[:offset] + buffer + self.content[offset + len(buffer):]
-        self.read_event.set()
-
-    async def read(self) -> bytes:
-        await self.read_event.wait()
-        self.read_event.clear()
-        return b"hello world"
-
-    async def rm(self) -> None:
-        # 简单的删除实现
-        self.content = b""
 
 
 class SimpleModuleChild(VF_Module):
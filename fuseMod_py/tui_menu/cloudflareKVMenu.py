@@ -10,6 +10,7 @@ def register_cloudflareKV(panel: Panel, menu:Menu):
         'api_key': {'type': 'text', 'default': '', 'flag': SimpleMenuManager.FLAG_SAVE_NOT_EMPTY},
         'key': {'type': 'password', 'default': '', 'flag': SimpleMenuManager.FLAG_SAVE_NOT_EMPTY},
         'updateTimeMin': {'type': 'int', 'default': 10, 'flag': 0},
+        'lazy': {'type': 'int', 'default': 0, 'flag': 0},
     }
     
     formats = {
@@ -19,6 +20,7 @@ def register_cloudflareKV(panel: Panel, menu:Menu):
             'api_key': "API密钥：{value}",
             'key': "键值：{value}",
             'updateTimeMin': "更新间隔（分钟）：{value}",
+            'lazy': "打开时才获取（0/1）：{value}",
         }
     
     register_simple_menu(panel, menu, field_config, formats, 'cloudflareKV')
\ No newline at end of file
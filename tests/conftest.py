@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# 从仓库根目录导入 fuseMod_py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuseMod_py.FuseModManager import FuseModManager
+
+FAKE_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_helper.py")
+
+
+@pytest.fixture
+def start_manager(tmp_path, monkeypatch):
+    """返回协程函数 start(**env)，启动连接到 helper 替身 (fake_helper.py) 的管理器，env 为替身的环境变量"""
+    # 用当前解释器运行 helper 替身
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def spawn_fake_helper(program, *args, **kwargs):
+        return await create_subprocess_exec(sys.executable, program, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", spawn_fake_helper)
+
+    async def start(**env) -> FuseModManager:
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        manager = FuseModManager(str(tmp_path), str(tmp_path), False, shm_size=0, config_watch_interval=0,
+                                 snapshot_interval=0, metrics_interval=0)
+        manager.helper_path = FAKE_HELPER
+        manager.request_timeout = 0.5
+        assert await manager.init(str(tmp_path)) is manager
+        return manager
+
+    return start
@@ -0,0 +1,102 @@
+"""测试用的 FUSE helper 替身
+
+按 fuseMod 的顺序打开命名管道，发送就绪包后对每个请求回复成功。环境变量:
+FAKE_HELPER_STALL: 收到该类型的请求后不再回复，模拟卡住的 helper
+FAKE_HELPER_FAIL: 对该类型的请求回复 ERR_NOT_FOUND
+FAKE_HELPER_CAPS: 就绪包中声明的能力
+FAKE_HELPER_WRITES: "路径:次数"，回复创建该文件的批量包后发出该文件的顺序写入通知，每次 WRITE_SIZE 字节，
+间隔 WRITE_INTERVAL 秒；声明了 HELLO_CAP_WRITE_HOLD 时，收到 0x10 暂停后停止发出直到恢复
+用法与 fuseMod 相同: fake_helper.py <pipe_in> <pipe_out> <mount_point> -f"""
+
+import os
+import select
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuseMod_py.VF_Codec import FrameDecoder, FrameEncoder
+from fuseMod_py.VF_Defined import PACKET_HEADER, PACKET_HEADER_V2, PACKET_RESPONSE_HEADER, PACKET_RESPONSE_HEADER_V2, PACKET_MAX_SIZE, ERR_NOT_FOUND, WRITE_FLAG_FIRST, WRITE_FLAG_LAST, HELLO_CAP_WRITE_HOLD
+
+
+WRITE_SIZE = 10
+WRITE_INTERVAL = 0.02
+
+
+def write_notifications(path: str, count: int):
+    """0x07 写入通知: path_len(2) path content_len(2) content offset(4) write_id(4) flags(1)"""
+    path_bytes = path.encode()
+    for index in range(count):
+        content = bytes([index]) * WRITE_SIZE
+        yield (struct.pack("<H", len(path_bytes)) + path_bytes + struct.pack("<H", len(content)) + content
+               + struct.pack("<IIB", index * WRITE_SIZE, index + 1, WRITE_FLAG_FIRST | WRITE_FLAG_LAST))
+
+
+def batch_creates(payload) -> list:
+    """批量包中创建的文件路径: count(2) [type(2) size(2) data]...，0x02 的 data 为 flag(4) path_len(2) path"""
+    paths = []
+    position = 2
+    for _ in range(struct.unpack_from("<H", payload)[0]):
+        op_type, size = struct.unpack_from("<HH", payload, position)
+        if op_type == 0x02:
+            path_len = struct.unpack_from("<H", payload, position + 8)[0]
+            paths.append(str(payload[position + 10:position + 10 + path_len], "utf-8"))
+        position += 4 + size
+    return paths
+
+
+def main() -> None:
+    pipe_in = os.open(sys.argv[1], os.O_RDONLY)
+    pipe_out = os.open(sys.argv[2], os.O_WRONLY)
+    stall_type = int(os.environ.get("FAKE_HELPER_STALL", "-1"), 0)
+    fail_type = int(os.environ.get("FAKE_HELPER_FAIL", "-1"), 0)
+    capabilities = int(os.environ.get("FAKE_HELPER_CAPS", "0"), 0)
+    writes = os.environ.get("FAKE_HELPER_WRITES")
+    write_path, write_count = writes.rsplit(":", 1) if writes else (None, "0")
+
+    encoder = FrameEncoder(PACKET_RESPONSE_HEADER, PACKET_RESPONSE_HEADER_V2)
+    decoder = FrameDecoder(PACKET_HEADER, PACKET_HEADER_V2)
+
+    def send(type: int, request_id: int, data: bytes) -> None:
+        os.writev(pipe_out, encoder.encode_parts(type, request_id, [data]))
+
+    # 就绪包: version(2) max_frame_size(4) capabilities(4)
+    send(0x0F, 0, struct.pack("<HII", 1, PACKET_MAX_SIZE, capabilities))
+
+    stalled = False
+    notifications = []
+    held = False
+    while True:
+        # 像内核写入一样逐个发出写入通知，其间处理收到的请求
+        timeout = None
+        if notifications and not held:
+            send(0x07, 0, notifications.pop(0))
+            timeout = WRITE_INTERVAL
+        if not select.select([pipe_in], [], [], timeout)[0]:
+            continue
+        chunk = os.read(pipe_in, 65536)
+        if not chunk:
+            return
+        decoder.feed(chunk)
+        for _, type, request_id, payload in decoder.frames():
+            stalled = stalled or type == stall_type
+            if stalled:
+                continue
+            if type == fail_type:
+                send(type, request_id, bytes([ERR_NOT_FOUND]))
+            elif type == 0x08:
+                # 批量包: err(1) count(2) result(1)...
+                count = struct.unpack_from("<H", payload)[0]
+                send(type, request_id, b"\x00" + struct.pack("<H", count) + bytes(count))
+                if write_path in batch_creates(payload):
+                    notifications.extend(write_notifications(write_path, int(write_count)))
+            elif type == 0x10 and capabilities & HELLO_CAP_WRITE_HOLD:
+                # 暂停写入: hold(1) path
+                held = payload[0] != 0
+                send(type, request_id, b"\x00")
+            else:
+                send(type, request_id, b"\x00")
+
+
+if __name__ == "__main__":
+    main()
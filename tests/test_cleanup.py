@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from fuseMod_py.VF_File import VF_File
+from fuseMod_py.VF_Module import VF_Module
+
+
+class OnceFile(VF_File):
+    """可读文件，内容只产生一次"""
+
+    def __init__(self) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.done = False
+
+    async def read(self) -> bytes:
+        if self.done:
+            await asyncio.sleep(3600)
+        self.done = True
+        return b"content"
+
+
+class OnceModule(VF_Module):
+    def create_file(self, name, kwargs):
+        return OnceFile()
+
+
+def test_push_timeout_terminates_helper_and_exits(start_manager, monkeypatch):
+    """推送内容的任务等待响应超时后清理，清理不会因该任务被取消而中断"""
+    exit_codes = []
+    monkeypatch.setattr(os, "_exit", exit_codes.append)
+
+    async def main():
+        # helper 收到 0x05 设置内容后不再回复
+        manager = await start_manager(FAKE_HELPER_STALL=0x05)
+        module = OnceModule(manager.global_table)
+        manager.register_module("m", module)
+        module.register_files([("a", {})])
+
+        await asyncio.wait_for(manager.run(), timeout=10)
+        for _ in range(100):
+            if exit_codes:
+                break
+            await asyncio.sleep(0.05)
+        return manager
+
+    manager = asyncio.run(main())
+    assert exit_codes == [1]
+    assert manager.closed and manager.process.returncode is not None
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from fuseMod_py.VF_Codec import FrameDecoder, FrameEncoder
+from fuseMod_py.VF_Defined import PACKET_RESPONSE_HEADER, PACKET_RESPONSE_HEADER_V2
+
+# 由 fuseMod_tools.c 的 create_response_packet 生成的响应包
+C_RESPONSES = [
+    # 版本 1: type 0x05 id 0x1234 data 00
+    (bytes.fromhex("540205003412010000de222345"), (1, 0x05, 0x1234, b"\x00")),
+    # 版本 2: type 0x07 id 7 data "hello"
+    (bytes.fromhex("5403070007000500000068656c6c6f89252345"), (2, 0x07, 7, b"hello")),
+    # 版本 1 无数据: type 0x0F id 0
+    (bytes.fromhex("54020f0000000000e9612345"), (1, 0x0F, 0, b"")),
+]
+
+# 请求包，fuseMod_tools.c 的 get_packet_size / validate_packet 解析结果为 0
+C_REQUESTS = [
+    # 版本 1: type 0x01 id 0x0102 data path_len(2) "/abc"
+    (1, 0x01, 0x0102, [b"\x04\x00/abc"], bytes.fromhex("543201000201060004002f616263376f2345")),
+    # 版本 2: type 0x05 id 0xfffe data path_len(2) "/a" content_len(4) "xyz"
+    (2, 0x05, 0xFFFE, [b"\x02\x00/a\x03\x00\x00\x00", b"xyz"],
+     bytes.fromhex("54330500feff0b00000002002f610300000078797a09052345")),
+]
+
+
+def response_encoder(version: int) -> FrameEncoder:
+    """按响应包头编码，用于与解码器往返"""
+    return FrameEncoder(PACKET_RESPONSE_HEADER, PACKET_RESPONSE_HEADER_V2, version)
+
+
+def decode_all(decoder: FrameDecoder, data: bytes):
+    decoder.feed(data)
+    return [(version, type, request_id, bytes(payload)) for version, type, request_id, payload in decoder.frames()]
+
+
+@pytest.mark.parametrize("version, type, request_id, parts, expected", C_REQUESTS)
+def test_encode_matches_c_layout(version, type, request_id, parts, expected):
+    encoder = FrameEncoder(version=version)
+    assert b"".join(encoder.encode_parts(type, request_id, parts)) == expected
+
+    # 分段方式不影响结果，memoryview 分段同样可用
+    data = b"".join(parts)
+    split = [memoryview(data)[:3], data[3:5], memoryview(data)[5:]]
+    assert b"".join(encoder.encode_parts(type, request_id, split)) == expected
+
+
+@pytest.mark.parametrize("frame, expected", C_RESPONSES)
+def test_decode_c_response(frame, expected):
+    decoder = FrameDecoder()
+    assert decode_all(decoder, frame) == [expected]
+    assert decoder.pending() == 0 and decoder.resync_count == 0
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_round_trip_arbitrary_chunking(version):
+    encoder = response_encoder(version)
+    frames = []
+    stream = bytearray()
+    for request_id in range(1, 200):
+        data = os.urandom(request_id * 7 % 2000)
+        split = len(data) // 3
+        stream += b"".join(encoder.encode_parts(request_id % 9, request_id, [data[:split], memoryview(data)[split:]]))
+        frames.append((version, request_id % 9, request_id, data))
+
+    for step in (1, 7, 4096):
+        decoder = FrameDecoder()
+        decoded = []
+        for position in range(0, len(stream), step):
+            decoded += decode_all(decoder, stream[position:position + step])
+        assert decoded == frames
+        assert decoder.resync_count == 0 and decoder.pending() == 0
+
+
+def test_mixed_versions_in_one_stream():
+    stream = b"".join(frame for frame, _ in C_RESPONSES)
+    assert decode_all(FrameDecoder(), stream) == [expected for _, expected in C_RESPONSES]
+
+
+def test_resync_after_garbage_and_corruption():
+    good = [C_RESPONSES[0][0], C_RESPONSES[1][0]]
+
+    # CRC 错误的包
+    bad_crc = bytearray(C_RESPONSES[1][0])
+    bad_crc[-4] ^= 0xFF
+    # 包尾错误的包
+    bad_tail = bytearray(C_RESPONSES[0][0])
+    bad_tail[-1] = 0
+    # 长度超出上限的包头
+    oversize = bytes.fromhex("54030700070000001000")
+
+    stream = b"\x00\x54\xff" + bytes(bad_crc) + good[0] + bytes(bad_tail) + oversize + good[1]
+    decoder = FrameDecoder()
+    assert decode_all(decoder, stream) == [C_RESPONSES[0][1], C_RESPONSES[1][1]]
+    assert decoder.resync_count > 0 and decoder.pending() == 0
+
+
+def test_incomplete_frame_waits_for_more_data():
+    frame = C_RESPONSES[1][0]
+    decoder = FrameDecoder()
+    assert decode_all(decoder, frame[:5]) == []
+    assert decode_all(decoder, frame[5:-1]) == []
+    assert decode_all(decoder, frame[-1:]) == [C_RESPONSES[1][1]]
+    assert decoder.resync_count == 0
+
+
+def test_trusted_zero_crc():
+    frame = bytearray(C_RESPONSES[1][0])
+    frame[-4:-2] = b"\x00\x00"
+
+    # 未协商可信管道时 CRC 为 0 按错误处理
+    assert decode_all(FrameDecoder(), bytes(frame)) == []
+
+    decoder = FrameDecoder()
+    decoder.trusted = True
+    assert decode_all(decoder, bytes(frame)) == [C_RESPONSES[1][1]]
+
+
+def test_trusted_encoder_samples_crc():
+    encoder = response_encoder(2)
+    encoder.trusted = True
+    encoder.crc_sample = 3
+    crcs = [encoder.encode_parts(0x05, 1, [b"data"])[-1][:2] for _ in range(6)]
+    assert [crc == b"\x00\x00" for crc in crcs] == [True, True, False, True, True, False]
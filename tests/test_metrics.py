@@ -0,0 +1,69 @@
+import asyncio
+
+from fuseMod_py.VF_File import VF_File
+from fuseMod_py.VF_Metrics import MetricsRegistry
+from fuseMod_py.VF_Module import VF_Module
+from fuseMod_py.VF_Tools import CRC16_IMPL
+
+
+def test_info_series_rendered_with_labels():
+    registry = MetricsRegistry()
+    registry.add_info("build_info", lambda: {"version": "2", "impl": "table"})
+    assert registry.to_dict()["info"] == {"build_info": {"version": "2", "impl": "table"}}
+    assert 'fusemod_build_info{impl="table",version="2"} 1' in registry.to_prometheus().decode().splitlines()
+
+
+def test_crc_implementation_reported(start_manager):
+    """不开启调试输出也能从 status() 和统计文件中看到使用的 CRC 实现"""
+
+    async def main():
+        manager = await start_manager()
+        assert manager.status()["crc"] == {"impl": CRC16_IMPL, "mode": "full", "sample": 0}
+        lines = manager.metrics.to_prometheus().decode().splitlines()
+        assert f'fusemod_crc_info{{impl="{CRC16_IMPL}",mode="full",sample="0"}} 1' in lines
+
+        manager.process.kill()
+        await manager.process.wait()
+
+    asyncio.run(main())
+
+
+class OnceFile(VF_File):
+    """可读文件，只产生一次内容"""
+
+    def __init__(self, content: bytes) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.content = content
+
+    async def read(self) -> bytes:
+        content, self.content = self.content, b""
+        if not content:
+            await asyncio.Event().wait()
+        return content
+
+
+class OnceModule(VF_Module):
+    def create_file(self, name, kwargs):
+        return OnceFile(name.encode() * 10)
+
+
+def test_content_bytes_labelled_by_module(start_manager):
+    """推送的字节数按模块统计，标签数不随文件数增长"""
+
+    async def main():
+        manager = await start_manager()
+        module = OnceModule(manager.global_table)
+        manager.register_module("m", module)
+        module.register_files((f"f{index}", {}) for index in range(20))
+
+        run = asyncio.create_task(manager.run())
+        await asyncio.sleep(0.5)
+        series = manager.metrics.counters["content_bytes_total"]
+        assert series == {(("module", "m"),): sum(len(f"f{index}") * 10 for index in range(20))}
+
+        manager.process.kill()
+        await manager.process.wait()
+        manager.running = False
+        run.cancel()
+
+    asyncio.run(main())
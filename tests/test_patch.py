@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+from fuseMod_py.VF_Defined import HELLO_CAP_PATCH, PATCH_MIN_SIZE
+from fuseMod_py.VF_File import VF_File
+from fuseMod_py.VF_Module import VF_Module
+
+
+class VersionFile(VF_File):
+    """可读文件，依次产生两个只有一个字节不同的版本"""
+
+    def __init__(self) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.versions = [b"a" * PATCH_MIN_SIZE * 4, b"a" * PATCH_MIN_SIZE * 2 + b"b" + b"a" * (PATCH_MIN_SIZE * 2 - 1)]
+        self.pushed = asyncio.Event()
+
+    async def read(self) -> bytes:
+        if not self.versions:
+            self.pushed.set()
+            await asyncio.sleep(3600)
+        if len(self.versions) == 1:
+            # 等第一个版本推送完成，避免两个版本合并为一次推送
+            await asyncio.sleep(0.2)
+        return self.versions.pop(0)
+
+
+class VersionModule(VF_Module):
+    def create_file(self, name, kwargs):
+        return VersionFile()
+
+
+def test_rejected_patch_falls_back_to_full_push(start_manager, monkeypatch):
+    """helper 拒绝局部修改时改为完整设置内容，管理器继续运行"""
+    # 清理时不退出测试进程
+    monkeypatch.setattr(os, "_exit", lambda code: None)
+
+    async def main():
+        manager = await start_manager(FAKE_HELPER_CAPS=HELLO_CAP_PATCH, FAKE_HELPER_FAIL=0x0B)
+        module = VersionModule(manager.global_table)
+        manager.register_module("m", module)
+        module.register_files([("a", {})])
+
+        run = asyncio.create_task(manager.run())
+        await asyncio.wait_for(module.register_file_table["a"].pushed.wait(), timeout=5)
+        # 等待最后一次推送完成
+        await asyncio.sleep(0.2)
+
+        sent = manager.metrics.counters["frames_sent_total"]
+        pushes = manager.metrics.counters["pushes_total"]
+        assert manager.running and not manager.closed
+        assert sent[(("type", "0x0b"),)] >= 1 and sent[(("type", "0x05"),)] == 2
+        assert pushes == {(("result", "full"),): 1, (("result", "patch_fallback"),): 1}
+
+        manager.process.kill()
+        await manager.process.wait()
+        manager.running = False
+        run.cancel()
+
+    asyncio.run(main())
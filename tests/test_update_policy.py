@@ -0,0 +1,87 @@
+import asyncio
+from collections import Counter
+
+from fuseMod_py.VF_File import VF_File
+from fuseMod_py.VF_Module import VF_Module
+
+
+class CounterFile(VF_File):
+    """可读文件，每 0.02 秒产生一次新内容"""
+
+    def __init__(self) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.count = 0
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(0.02)
+        self.count += 1
+        return str(self.count).encode()
+
+
+class CounterModule(VF_Module):
+    """按配置注册实例的模块，与 cloudflareKV、email 模块的用法相同"""
+
+    def load(self, config) -> None:
+        self.load_update_policy(config)
+        self.register_instances(config["instances"])
+
+    def reload(self, config):
+        self.load_update_policy(config)
+        return self.reload_instances(config["instances"])
+
+    def create_file(self, name, kwargs):
+        return CounterFile()
+
+
+def config(fast_policy=None, slow_policy=None):
+    instances = [{"name": "fast", "argv": {}}, {"name": "slow", "argv": {}}]
+    if fast_policy is not None:
+        instances[0]["updatePolicy"] = fast_policy
+    if slow_policy is not None:
+        instances[1]["updatePolicy"] = slow_policy
+    return {"updatePolicy": {"minInterval": 1}, "instances": instances}
+
+
+def test_instance_policy_overrides_module_policy():
+    """实例配置的 updatePolicy 覆盖模块的策略，重新加载时只更换策略不重新创建文件"""
+    module = CounterModule({})
+    module.load(config(fast_policy={"minInterval": 0}, slow_policy={"debounce": 0.5, "maxLatency": 2}))
+    fast = module.register_file_table["fast"]
+    slow = module.register_file_table["slow"]
+    assert fast.update_policy.min_interval == 0
+    assert (slow.update_policy.debounce, slow.update_policy.max_latency) == (0.5, 2)
+
+    added, removed = module.reload(config(fast_policy={"minInterval": 0.1}))
+    assert (added, removed) == ([], [])
+    assert module.register_file_table["fast"] is fast and fast.update_policy.min_interval == 0.1
+    assert module.register_file_table["slow"] is slow and slow.update_policy is module.update_policy
+
+
+def test_instances_push_with_their_own_policy(start_manager):
+    """同一模块的两个实例按各自的策略推送"""
+
+    async def main():
+        manager = await start_manager()
+        pushes = Counter()
+        push_content = manager.push_content
+
+        async def count_push(path, *args):
+            pushes[path] += 1
+            return await push_content(path, *args)
+
+        manager.push_content = count_push
+        module = CounterModule(manager.global_table)
+        manager.register_module("m", module)
+        module.load(config(fast_policy={"minInterval": 0}, slow_policy={"minInterval": 0.5}))
+
+        run = asyncio.create_task(manager.run())
+        await asyncio.sleep(1.2)
+        assert pushes["/m/fast"] > 10
+        assert 1 <= pushes["/m/slow"] <= 4
+
+        manager.process.kill()
+        await manager.process.wait()
+        manager.running = False
+        run.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+import asyncio
+import os
+
+import pytest
+
+from fuseMod_py.VF_Defined import HELLO_CAP_WRITE_HOLD
+from fuseMod_py.VF_File import VF_File
+from fuseMod_py.VF_Module import VF_Module
+from fuseMod_py.VF_Supervisor import WriteQueue
+from fake_helper import WRITE_SIZE
+
+
+MAX_QUEUED_WRITES = 4
+
+
+class SlowWriteFile(VF_File):
+    """每次写入耗时 delay 秒"""
+
+    def __init__(self, delay: float, coalesce: bool = False) -> None:
+        super().__init__(VF_File.FLAG_READ | VF_File.FLAG_WRITE, max_queued_writes=MAX_QUEUED_WRITES,
+                         coalesce_writes=coalesce)
+        self.delay = delay
+        self.writes = []
+        self.content = bytearray()
+
+    async def awrite(self, buffer: bytes, offset: int) -> None:
+        await asyncio.sleep(self.delay)
+        self.writes.append((offset, len(buffer)))
+        self.content[offset:offset + len(buffer)] = buffer
+
+
+class CounterFile(VF_File):
+    """可读文件，每 0.05 秒产生一次新内容"""
+
+    def __init__(self) -> None:
+        super().__init__(VF_File.FLAG_READ)
+        self.count = 0
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(0.05)
+        self.count += 1
+        return str(self.count).encode()
+
+
+class WriteModule(VF_Module):
+    coalesce = False
+
+    def create_file(self, name, kwargs):
+        return SlowWriteFile(0.2, self.coalesce) if name == "slow" else CounterFile()
+
+
+@pytest.fixture
+def peak_backlog(monkeypatch):
+    """记录写入队列中排队的最大项数"""
+    peak = [0]
+    append = WriteQueue.append
+
+    def record(self, entry):
+        append(self, entry)
+        peak[0] = max(peak[0], len(self.backlog))
+
+    monkeypatch.setattr(WriteQueue, "append", record)
+    # 清理时不退出测试进程
+    monkeypatch.setattr(os, "_exit", lambda code: None)
+    return peak
+
+
+async def run_writes(start_manager, count: int, files, coalesce: bool = False, **env):
+    manager = await start_manager(FAKE_HELPER_WRITES=f"/m/slow:{count}", **env)
+    module = WriteModule(manager.global_table)
+    module.coalesce = coalesce
+    manager.register_module("m", module)
+    module.register_files([(name, {}) for name in files])
+    run = asyncio.create_task(manager.run())
+    return manager, module, run
+
+
+async def stop(manager, run) -> None:
+    manager.process.kill()
+    await manager.process.wait()
+    manager.running = False
+    run.cancel()
+
+
+async def wait_writes(file: SlowWriteFile, size: int, timeout: float = 5) -> None:
+    """等待写入的内容达到 size 字节"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while len(file.content) < size and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def expected_content(count: int) -> bytes:
+    return b"".join(bytes([index]) * WRITE_SIZE for index in range(count))
+
+
+def test_slow_writes_are_held_in_the_helper(start_manager, peak_backlog):
+    """一个文件写入慢时暂停该文件的写入，排队的写入不超过上限，每次写入都单独执行，其他文件的响应照常处理"""
+    count = 12
+
+    async def main():
+        manager, module, run = await run_writes(start_manager, count, ["slow", "counter"],
+                                                FAKE_HELPER_CAPS=str(HELLO_CAP_WRITE_HOLD))
+        await asyncio.sleep(1.5)
+        # 推送请求等待响应的超时为 0.5 秒，响应被阻塞时管理器会清理退出
+        assert manager.running and not manager.closed
+        assert manager.push_stats()["skipped"] == 0 and module.register_file_table["counter"].count > 10
+
+        slow = module.register_file_table["slow"]
+        await wait_writes(slow, count * WRITE_SIZE)
+        stats = manager.write_stats()
+        assert stats["pending"] == 0 and stats["held"] == 0 and stats["holds"] > 0 and stats["merged"] == 0
+        assert peak_backlog[0] <= MAX_QUEUED_WRITES
+        assert slow.writes == [(index * WRITE_SIZE, WRITE_SIZE) for index in range(count)]
+        assert bytes(slow.content) == expected_content(count)
+
+        await stop(manager, run)
+
+    asyncio.run(main())
+
+
+def test_slow_writes_pause_reading_without_hold(start_manager, peak_backlog):
+    """FUSE 模块不支持暂停写入时停止读取写入通知，排队的写入同样不超过上限且不丢失"""
+    count = 12
+
+    async def main():
+        manager, module, run = await run_writes(start_manager, count, ["slow"])
+        slow = module.register_file_table["slow"]
+        await wait_writes(slow, count * WRITE_SIZE)
+        stats = manager.write_stats()
+        assert stats["pending"] == 0 and stats["holds"] > 0 and manager.write_room.is_set()
+        assert peak_backlog[0] <= MAX_QUEUED_WRITES
+        assert slow.writes == [(index * WRITE_SIZE, WRITE_SIZE) for index in range(count)]
+
+        await stop(manager, run)
+
+    asyncio.run(main())
+
+
+def test_coalesce_writes_when_file_opts_in(start_manager, peak_backlog):
+    """选择合并写入的文件，排队时相接的写入合并为一次 awrite，内容不变"""
+    count = 12
+
+    async def main():
+        manager, module, run = await run_writes(start_manager, count, ["slow"], coalesce=True,
+                                                FAKE_HELPER_CAPS=str(HELLO_CAP_WRITE_HOLD))
+        slow = module.register_file_table["slow"]
+        await wait_writes(slow, count * WRITE_SIZE)
+        assert manager.write_stats()["merged"] > 0 and len(slow.writes) < count
+        assert bytes(slow.content) == expected_content(count)
+
+        await stop(manager, run)
+
+    asyncio.run(main())
+
+
+def test_write_queue_keeps_every_write():
+    """不合并时同一区域的反复写入逐个执行，达到上限时暂停，减少到一半时恢复"""
+    calls = []
+    holds = []
+
+    async def write(buffer, offset):
+        await asyncio.sleep(0.01)
+        calls.append((buffer, offset))
+
+    async def main():
+        queue = WriteQueue(4, write, holds.append)
+        for index in range(10):
+            assert queue.write(bytes([index]), 0)
+        assert await queue.close(5)
+        assert not queue.write(b"x", 0)
+
+    asyncio.run(main())
+    assert calls == [(bytes([index]), 0) for index in range(10)]
+    assert holds == [True, False]